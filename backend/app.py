@@ -1,33 +1,64 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, request, jsonify, send_from_directory, Response, stream_with_context, g, current_app
+from werkzeug.exceptions import NotFound
 from flask_cors import CORS
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 import os
+import time
+import threading
 from datetime import datetime
 import logging
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from rollups import ROLLUP_COLLECTION, record_orders, order_datetime
+from menu_cache import MenuCache, menu_cache_ttl_from_env, META_COLLECTION, bump_menu_version, menu_version
+from indexes import ensure_indexes
+from write_behind import write_behind_from_env
+from chart_scheduler import chart_scheduler_from_env
+from chart_cache import filter_prefix
+from tenants import OutletStore, tenant_registry_from_env, tenant_workers_from_env
+from validation import (
+    validate_menu_item, validate_order, validate_feedback, parse_visualize_filters,
+    format_feedback, FEEDBACK_PROJECTION, FEEDBACK_SORT, FEEDBACK_CURSOR_FIELDS,
+    parse_feedback_search, feedback_search_pipeline, feedback_search_cursor_fields, format_feedback_hit
 )
+from pagination import DEFAULT_PAGE_LIMIT, parse_page_args, after_id, after_field, fetch_page, split_page, ndjson_lines
+import metrics
+import http_cache
+from logging_setup import configure_logging, route_sampler_from_env, request_sampled
+
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
 
-app = Flask(__name__)
+api = Blueprint("api", __name__)
 
-# Configure CORS
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173").split(",")
-CORS(app, resources={r"/*": {
-    "origins": allowed_origins,
-    "methods": ["GET", "POST", "OPTIONS"],
-    "allow_headers": ["Content-Type", "Origin"]
-}})
-logger.info(f"CORS configured for origins: {allowed_origins}")
+
+# MongoDB handles and services, set up by create_app()
+client = None
+db = None
+menu_collection = None
+order_collection = None
+feedback_collection = None
+rollup_collection = None  # Pre-aggregated analytics maintained by place_order
+meta_collection = None  # Small shared counters such as the menu version
+menu_cache = None
+default_store = None  # The collections above as an OutletStore, for routes that take ?tenant=
+write_behind = None
+chart_scheduler = None
+tenant_registry = None  # Other outlets of the chain, see tenants.py
+index_report = []
+indexes_checked = False
+index_lock = threading.Lock()
+route_sampler = None
+
+# Upper bound on the number of orders accepted by /place_orders
+MAX_BATCH_ORDERS = int(os.getenv("MAX_BATCH_ORDERS", 10000))
+
+# Graph directory, created by create_app()
+GRAPH_DIR = os.path.join(os.getcwd(), "graphs")
 
 # Add security headers and ensure CORS
-@app.after_request
+@api.after_app_request
 def add_security_headers(response):
-    logger.info(f"Adding headers to response for request: {request.method} {request.path}")
     origin = request.headers.get('Origin')
     if origin in allowed_origins or '*' in allowed_origins:
         response.headers['Access-Control-Allow-Origin'] = origin if origin else '*'
@@ -39,104 +70,235 @@ def add_security_headers(response):
     return response
 
 # Handle preflight OPTIONS requests
-@app.before_request
+@api.before_app_request
 def handle_preflight():
     if request.method == "OPTIONS":
-        logger.info(f"Handling preflight OPTIONS request from origin: {request.headers.get('Origin')}")
+        logger.info("Handling preflight OPTIONS request from origin: %s", request.headers.get('Origin'))
         response = jsonify({"message": "Preflight request successful"})
         response.status_code = 200
         return response
 
-# MongoDB Connection
-try:
-    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    client.admin.command("ping")
-    logger.info("Connected to MongoDB successfully")
-except ConnectionFailure as e:
-    logger.error(f"Failed to connect to MongoDB: {e}", exc_info=True)
-    raise SystemExit("MongoDB connection failed")
-
-db = client["restaurant"]
-menu_collection = db["restaurant_menu"]
-order_collection = db["food_order"]
-feedback_collection = db["feedback"]  # New collection for feedback
-
-# Ensure graph directory exists
-GRAPH_DIR = os.path.join(os.getcwd(), "graphs")
-os.makedirs(GRAPH_DIR, exist_ok=True)
-logger.info(f"Graph directory ensured at: {GRAPH_DIR}")
-
-# Helper function to validate menu item data
-def validate_menu_item(data):
-    required_fields = ["name", "category", "cuisine", "selling_price", "actual_price"]
-    missing_fields = [field for field in required_fields if field not in data or data[field] is None]
-    if missing_fields:
-        logger.warning(f"Validation failed for menu item: missing fields {missing_fields}")
-        return False, f"Missing required fields: {missing_fields}"
-    
-    # Validate field types
-    if not all(isinstance(data[field], str) for field in ["name", "category", "cuisine"]):
-        logger.warning("Validation failed for menu item: name, category, and cuisine must be strings")
-        return False, "Name, category, and cuisine must be strings"
-    
-    # Validate prices
-    try:
-        selling_price = float(data["selling_price"])
-        actual_price = float(data["actual_price"])
-        if selling_price < 0 or actual_price < 0:
-            logger.warning("Validation failed for menu item: prices must be non-negative")
-            return False, "Selling price and actual price must be non-negative numbers"
-    except (ValueError, TypeError) as e:
-        logger.warning(f"Validation failed for menu item: invalid price format - {str(e)}")
-        return False, "Selling price and actual price must be valid numbers"
-    
-    return True, ""
-
-# Helper function to validate order data
-def validate_order(data):
-    if not isinstance(data.get("items"), list) or not data.get("items"):
-        logger.warning("Validation failed for order: items must be a non-empty list")
-        return False, "Items must be a non-empty list"
-    if not isinstance(data.get("datetime"), str):
-        logger.warning("Validation failed for order: datetime must be a string")
-        return False, "Datetime must be a string"
+# Per-request latency histograms and Server-Timing; only installed when METRICS=True
+def start_request_metrics():
+    g.metrics_state = metrics.start_request()
+
+def finish_request_metrics(response):
+    state = g.pop("metrics_state", None)
+    if state is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        server_timing = metrics.finish_request(state, request.method, route, response.status_code)
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing
+    return response
+
+# gzip/brotli for JSON bodies; see http_cache.py (COMPRESS_RESPONSES, COMPRESS_MIN_SIZE)
+def compress_json(response):
+    return http_cache.compress_response(request, response)
+
+# Helper function to tag a response with a weak ETag that clients must revalidate
+def revalidate(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# Decide whether this request's INFO logs are kept and start timing it for the access log
+def start_request_logging():
+    g.request_started = time.perf_counter()
+    g.log_sample_token = route_sampler.start_request(request.url_rule.rule if request.url_rule else "unmatched")
+
+# One structured access log record per request; server errors are logged even when not sampled
+def log_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        duration_ms = (time.perf_counter() - started) * 1000
+        level = logging.WARNING if response.status_code >= 500 else logging.INFO
+        if (level >= logging.WARNING or request_sampled()) and access_logger.isEnabledFor(level):
+            access_logger.log(
+                level, "%s %s %s %.1fms", request.method, request.path, response.status_code, duration_ms,
+                extra={
+                    "method": request.method,
+                    "route": request.url_rule.rule if request.url_rule else None,
+                    "status": response.status_code,
+                    "duration_ms": round(duration_ms, 1)
+                }
+            )
+    return response
+
+def finish_request_logging(exc):
+    token = g.pop("log_sample_token", None)
+    if token is not None:
+        route_sampler.finish_request(token)
+
+# Rollups for orders written by the write-behind queue are applied when they are flushed
+def record_flushed_orders(orders):
+    record_orders(rollup_collection, orders, menu_cache.index())
+
+# Render an unfiltered chart set for the chart scheduler
+def render_chart_set(source, image_format):
+    from visualize import generate_graphs
+    return generate_graphs(order_collection, menu_collection, rollup_collection, source, None, image_format)
+
+# Helper function to load the plotting stack off the request path
+def warm_up_plotting():
+    started = time.perf_counter()
     try:
-        datetime.fromisoformat(data["datetime"])
-    except ValueError as e:
-        logger.warning(f"Validation failed for order: invalid datetime format - {e}")
-        return False, f"Invalid datetime format: {str(e)}"
-    if not all(isinstance(item, str) for item in data["items"]):
-        logger.warning("Validation failed for order: all items must be strings")
-        return False, "All items must be strings"
-    return True, ""
-
-# Helper function to validate feedback data
-def validate_feedback(data):
-    required_fields = ["name", "email", "feedback"]
-    missing_fields = [field for field in required_fields if field not in data or data[field] is None]
-    if missing_fields:
-        logger.warning(f"Validation failed for feedback: missing fields {missing_fields}")
-        return False, f"Missing required fields: {missing_fields}"
-    
-    # Validate field types
-    if not all(isinstance(data[field], str) for field in required_fields):
-        logger.warning("Validation failed for feedback: name, email, and feedback must be strings")
-        return False, "Name, email, and feedback must be strings"
-    
-    # Validate email format
-    import re
-    email_pattern = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-    if not re.match(email_pattern, data["email"]):
-        logger.warning("Validation failed for feedback: invalid email format")
-        return False, "Invalid email format"
-    
-    return True, ""
+        from visualize import warm_up
+        warm_up()
+        logger.info("Plotting stack warmed up in %.2fs", time.perf_counter() - started)
+    except Exception as e:
+        logger.error("Plotting warm-up failed: %s", e, exc_info=True)
+
+# Application factory. Nothing here waits on MongoDB unless asked to: the client is
+# created with connect=False and connects on the first query. Settings come from the
+# environment and can be overridden with the config argument:
+#   MONGO_URI, MONGO_DB           where to connect
+#   MONGO_PING_ON_STARTUP=True    ping now and fail fast if MongoDB is unreachable
+#   ENSURE_INDEXES=True|False|Skip  build missing indexes, only report them, or skip the check;
+#                                 runs before the first request, not in create_app
+#   WARM_UP_PLOTTING=True         import pandas/matplotlib/seaborn and start the chart
+#                                 workers on a background thread
+#   WRITE_BEHIND=True             queue order and feedback inserts (see write_behind.py)
+#   CHART_SCHEDULER=True          render charts in the background and answer /visualize
+#                                 from the latest render (see chart_scheduler.py)
+#   TENANT_URIS                   outlets of the chain: ?tenant= on menu, order and feedback
+#                                 routes and per-outlet and chain-wide analytics (see tenants.py)
+#   ACCESS_LOG=True               one access log record per request
+# Logging itself is configured from LOG_* variables, see logging_setup.py.
+def create_app(config=None):
+    global client, db, menu_collection, order_collection, feedback_collection, rollup_collection, meta_collection
+    global menu_cache, default_store, write_behind, chart_scheduler, tenant_registry, index_report, indexes_checked, route_sampler
+
+    configure_logging()
+    app = Flask(__name__)
+    app.config.update(
+        MONGO_URI=os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+        MONGO_DB=os.getenv("MONGO_DB", "restaurant"),
+        MONGO_PING_ON_STARTUP=os.getenv("MONGO_PING_ON_STARTUP", "False") == "True",
+        ENSURE_INDEXES=os.getenv("ENSURE_INDEXES", "True"),
+        WARM_UP_PLOTTING=os.getenv("WARM_UP_PLOTTING", "False") == "True",
+        WRITE_BEHIND=os.getenv("WRITE_BEHIND", "False") == "True",
+        CHART_SCHEDULER=os.getenv("CHART_SCHEDULER", "False") == "True",
+        ACCESS_LOG=os.getenv("ACCESS_LOG", "True") == "True"
+    )
+    if config:
+        app.config.update(config)
+
+    # Configure CORS
+    CORS(app, resources={r"/*": {
+        "origins": allowed_origins,
+        "methods": ["GET", "POST", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Origin"]
+    }})
+    logger.info("CORS configured for origins: %s", allowed_origins)
+
+    if metrics.METRICS_ENABLED:
+        app.before_request(start_request_metrics)
+        app.after_request(finish_request_metrics)
+    route_sampler = route_sampler_from_env()
+    app.before_request(start_request_logging)
+    app.teardown_request(finish_request_logging)
+    if app.config["ACCESS_LOG"]:
+        app.after_request(log_request)
+    if http_cache.COMPRESS_RESPONSES:
+        app.after_request(compress_json)
+    app.register_blueprint(api)
+
+    # MongoDB Connection
+    client = MongoClient(
+        app.config["MONGO_URI"], serverSelectionTimeoutMS=5000, connect=False,
+        event_listeners=metrics.command_listeners()
+    )
+    if app.config["MONGO_PING_ON_STARTUP"]:
+        try:
+            client.admin.command("ping")
+            logger.info("Connected to MongoDB successfully")
+        except ConnectionFailure as e:
+            logger.error("Failed to connect to MongoDB: %s", e, exc_info=True)
+            raise SystemExit("MongoDB connection failed")
+
+    db = client[app.config["MONGO_DB"]]
+    menu_collection = db["restaurant_menu"]
+    order_collection = db["food_order"]
+    feedback_collection = db["feedback"]  # New collection for feedback
+    rollup_collection = db[ROLLUP_COLLECTION]
+    meta_collection = db[META_COLLECTION]
+
+    # Ensure indexes exist before the first request (False only reports missing ones, Skip
+    # leaves the check to `python indexes.py`), so startup does not wait on MongoDB
+    index_report = []
+    indexes_checked = False
+    if app.config["ENSURE_INDEXES"] != "Skip":
+        app.before_request(ensure_indexes_once)
+    menu_cache = MenuCache(menu_collection, ttl=menu_cache_ttl_from_env(), meta_collection=meta_collection)
+    default_store = OutletStore(db, menu_cache=menu_cache)
+
+    # Optional write-behind mode: orders and feedback are queued and inserted in batches
+    if write_behind is not None:
+        write_behind.stop()
+        write_behind = None
+    if app.config["WRITE_BEHIND"]:
+        write_behind = write_behind_from_env(db, on_flush={order_collection.name: record_flushed_orders}).start()
+
+    # Ensure graph directory exists
+    os.makedirs(GRAPH_DIR, exist_ok=True)
+    logger.info("Graph directory ensured at: %s", GRAPH_DIR)
+
+    # Outlet databases for ?tenant=...
+    if tenant_registry is not None:
+        tenant_registry.close()
+    tenant_registry = tenant_registry_from_env(
+        app.config["MONGO_DB"], {"serverSelectionTimeoutMS": 5000, "event_listeners": metrics.command_listeners()}
+    )
+
+    # Optional background chart rendering; the default chart set is rendered right away
+    if chart_scheduler is not None:
+        chart_scheduler.stop()
+        chart_scheduler = None
+    if app.config["CHART_SCHEDULER"]:
+        chart_scheduler = chart_scheduler_from_env(render_chart_set, order_collection.estimated_document_count, GRAPH_DIR).start()
+        chart_scheduler.refresh(os.getenv("ANALYTICS_SOURCE", "rollup"), "png")
+
+    if app.config["WARM_UP_PLOTTING"]:
+        threading.Thread(target=warm_up_plotting, name="plotting-warm-up", daemon=True).start()
+    return app
+
+# Check INDEXES on this app's database once, before the first request; a failed check
+# (e.g. MongoDB unreachable) is retried on the next request
+def ensure_indexes_once():
+    global index_report, indexes_checked
+    if indexes_checked:
+        return
+    with index_lock:
+        if indexes_checked:
+            return
+        try:
+            index_report = ensure_indexes(db, create=current_app.config["ENSURE_INDEXES"] == "True")
+            indexes_checked = True
+        except Exception as e:
+            logger.error("Failed to check indexes, retrying on the next request: %s", e, exc_info=True)
+
+# Helper function to pick the database a menu, order or feedback request works on: this
+# app's MONGO_DB, or with ?tenant=<name> that outlet's database from TENANT_URIS, so one
+# app instance serves every outlet. Write-behind only applies to this app's database.
+# Returns (store, error).
+def request_store():
+    name = request.args.get("tenant")
+    if not name:
+        return default_store, ""
+    if tenant_registry is None:
+        return None, "No tenants are configured, set TENANT_URIS"
+    if name not in tenant_registry:
+        logger.warning("Unknown tenant requested: %s", name)
+        return None, f"Unknown tenant: {name}"
+    return tenant_registry.store(name, menu_cache_ttl_from_env(), current_app.config["ENSURE_INDEXES"]), ""
 
 # Add Item
-@app.route("/add_item", methods=["POST"])
+@api.route("/add_item", methods=["POST"])
 def add_item():
     try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
         data = request.get_json()
         if not data:
             logger.warning("No data provided in add_item request")
@@ -145,14 +307,9 @@ def add_item():
         # Validate the menu item data
         is_valid, error_message = validate_menu_item(data)
         if not is_valid:
-            logger.warning(f"Invalid menu item data: {error_message}")
+            logger.warning("Invalid menu item data: %s", error_message)
             return jsonify({"error": error_message}), 400
         
-        # Check if item already exists
-        if menu_collection.find_one({"name": data["name"]}):
-            logger.info(f"Item already exists: {data['name']}")
-            return jsonify({"error": "Item already exists"}), 409
-        
         # Create item
         item = {
             "name": data["name"].strip(),
@@ -162,29 +319,70 @@ def add_item():
             "actual_price": float(data["actual_price"])
         }
         
-        menu_collection.insert_one(item)
-        logger.info(f"Added menu item: {item['name']} with selling_price: {item['selling_price']}, actual_price: {item['actual_price']}")
+        # The unique index on name rejects duplicates atomically
+        try:
+            store.menu_collection.insert_one(item)
+        except DuplicateKeyError:
+            logger.info("Item already exists: %s", item['name'])
+            return jsonify({"error": "Item already exists"}), 409
+        bump_menu_version(store.meta_collection)
+        store.menu_cache.invalidate()
+        logger.info("Added menu item: %s with selling_price: %s, actual_price: %s", item['name'], item['selling_price'], item['actual_price'])
         return jsonify({"message": "Item added successfully"}), 200
     except Exception as e:
-        logger.error(f"Error adding item: {e}", exc_info=True)
+        logger.error("Error adding item: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 # Get Menu Items
-@app.route("/get_items", methods=["GET"])
+# Without limit/cursor the whole menu is returned as before. With them, pages are
+# keyed on _id and include next_cursor. format=ndjson streams items as they arrive;
+# paginated streams end with a {"next_cursor": ...} line.
+# Responses carry an ETag derived from the menu version, so polls with If-None-Match
+# get a 304 without the menu being read.
+@api.route("/get_items", methods=["GET"])
 def get_items():
     try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
         logger.info("Received request for /get_items")
-        items = list(menu_collection.find({}, {"_id": 0}))
-        logger.info(f"Fetched {len(items)} menu items")
-        return jsonify({"items": items}), 200
+        paginate, limit, cursor, error_message = parse_page_args(request.args)
+        if error_message:
+            logger.warning("Invalid pagination for /get_items: %s", error_message)
+            return jsonify({"error": error_message}), 400
+
+        etag = http_cache.versioned_etag("menu", menu_version(store.meta_collection), request.args)
+        if http_cache.not_modified(request, etag):
+            return revalidate(Response(status=304), etag)
+
+        if request.args.get("format") == "ndjson":
+            if paginate:
+                items_cursor = store.menu_collection.find(after_id(cursor), batch_size=500).sort("_id", 1).limit(limit + 1)
+                lines = ndjson_lines(items_cursor, lambda item: {key: value for key, value in item.items() if key != "_id"}, limit, {"id": "_id"})
+            else:
+                lines = ndjson_lines(store.menu_collection.find({}, {"_id": 0}, batch_size=500).sort("_id", 1), lambda item: item)
+            return revalidate(Response(stream_with_context(lines), mimetype="application/x-ndjson"), etag)
+
+        if paginate:
+            items, next_cursor = fetch_page(store.menu_collection, after_id(cursor), None, [("_id", 1)], limit, {"id": "_id"})
+            items = [{key: value for key, value in item.items() if key != "_id"} for item in items]
+            logger.info("Fetched page of %s menu items", len(items))
+            return revalidate(jsonify({"items": items, "next_cursor": next_cursor}), etag), 200
+
+        items = list(store.menu_collection.find({}, {"_id": 0}))
+        logger.info("Fetched %s menu items", len(items))
+        return revalidate(jsonify({"items": items}), etag), 200
     except Exception as e:
-        logger.error(f"Error fetching items: {e}", exc_info=True)
+        logger.error("Error fetching items: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 # Place Order
-@app.route("/place_order", methods=["POST"])
+@api.route("/place_order", methods=["POST"])
 def place_order():
     try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
         data = request.get_json()
         if not data:
             logger.warning("No order data provided in place_order request")
@@ -193,41 +391,116 @@ def place_order():
         # Validate the order data
         is_valid, error_message = validate_order(data)
         if not is_valid:
-            logger.warning(f"Invalid order data: {error_message}")
+            logger.warning("Invalid order data: %s", error_message)
             return jsonify({"error": error_message}), 400
         
         # Check for invalid items
-        invalid_items = [item for item in data["items"] if not menu_collection.find_one({"name": item})]
+        menu = store.menu_cache.index()
+        invalid_items = [item for item in data["items"] if item not in menu]
         if invalid_items:
-            logger.info(f"Invalid items in order: {invalid_items}")
+            logger.info("Invalid items in order: %s", invalid_items)
             return jsonify({"error": f"Invalid items: {invalid_items}"}), 400
         
         # Calculate total cost and loss
-        total_cost = 0
-        total_loss = 0
-        for item_name in data["items"]:
-            item = menu_collection.find_one({"name": item_name})
-            total_cost += item["selling_price"]
-            if item["actual_price"] > item["selling_price"]:
-                total_loss += item["actual_price"] - item["selling_price"]
+        total_cost, total_loss = menu.order_totals(data["items"])
         
         order = {
             "items": data["items"],
-            "datetime": data["datetime"],
+            "lines": menu.snapshot_lines(data["items"]),  # Prices and cuisine at order time, for analytics
+            "datetime": order_datetime(data["datetime"]),  # Stored as a UTC date so range queries can use the index
             "total_cost": total_cost,
             "total_loss": total_loss
         }
-        order_collection.insert_one(order)
-        logger.info(f"Placed order with {len(data['items'])} items, total_cost: {total_cost}, total_loss: {total_loss}")
+        if write_behind is not None and store is default_store:
+            if not write_behind.submit(store.order_collection.name, order):
+                logger.warning("Write-behind queue full, rejecting order")
+                return jsonify({"error": "Server busy, retry later"}), 503, {"Retry-After": "1"}
+            logger.info("Queued order with %s items, total_cost: %s, total_loss: %s", len(data['items']), total_cost, total_loss)
+            return jsonify({"message": "Order accepted"}), 202
+
+        store.order_collection.insert_one(order)
+        try:
+            record_orders(store.rollup_collection, [order], menu)
+        except Exception as e:
+            logger.error("Failed to update order rollups, run `python rollups.py rebuild`: %s", e, exc_info=True)
+        logger.info("Placed order with %s items, total_cost: %s, total_loss: %s", len(data['items']), total_cost, total_loss)
         return jsonify({"message": "Order placed successfully"}), 200
     except Exception as e:
-        logger.error(f"Error placing order: {e}", exc_info=True)
+        logger.error("Error placing order: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Place many orders in one request
+@api.route("/place_orders", methods=["POST"])
+def place_orders():
+    try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        # Imported here so numpy is only loaded by workers that ingest batches
+        from bulk_orders import insert_orders
+        data = request.get_json()
+        orders = data.get("orders") if isinstance(data, dict) else None
+        if not isinstance(orders, list) or not orders:
+            logger.warning("No orders provided in place_orders request")
+            return jsonify({"error": "Orders must be a non-empty list"}), 400
+        if len(orders) > MAX_BATCH_ORDERS:
+            logger.warning("Rejected batch of %s orders (limit %s)", len(orders), MAX_BATCH_ORDERS)
+            return jsonify({"error": f"At most {MAX_BATCH_ORDERS} orders per request"}), 413
+
+        # Validate every order, collecting errors instead of failing the batch
+        errors = []
+        valid_positions = []
+        for index, order in enumerate(orders):
+            is_valid, error_message = validate_order(order) if isinstance(order, dict) else (False, "Order must be an object")
+            if is_valid:
+                valid_positions.append(index)
+            else:
+                errors.append({"index": index, "error": error_message})
+
+        menu = store.menu_cache.index()
+        priced_positions = []
+        for index in valid_positions:
+            invalid_items = [item for item in orders[index]["items"] if item not in menu]
+            if invalid_items:
+                errors.append({"index": index, "error": f"Invalid items: {invalid_items}"})
+            else:
+                priced_positions.append(index)
+
+        # Calculate total cost and loss for all orders in one pass
+        item_lists = [orders[i]["items"] for i in priced_positions]
+        total_costs, total_losses = menu.price(item_lists)
+        docs = [
+            {
+                "items": orders[index]["items"],
+                "lines": menu.snapshot_lines(orders[index]["items"]),
+                "datetime": order_datetime(orders[index]["datetime"]),
+                "total_cost": float(total_cost),
+                "total_loss": float(total_loss)
+            }
+            for index, total_cost, total_loss in zip(priced_positions, total_costs, total_losses)
+        ]
+
+        written, write_errors = insert_orders(store.order_collection, docs)
+        errors.extend({"index": priced_positions[error["index"]], "error": error["error"]} for error in write_errors)
+        try:
+            record_orders(store.rollup_collection, [docs[i] for i in written], menu)
+        except Exception as e:
+            logger.error("Failed to update order rollups, run `python rollups.py rebuild`: %s", e, exc_info=True)
+
+        errors.sort(key=lambda error: error["index"])
+        logger.info("Placed %s of %s orders in batch, %s rejected", len(written), len(orders), len(errors))
+        return jsonify({"inserted": len(written), "failed": len(errors), "errors": errors}), 200
+    except Exception as e:
+        logger.error("Error placing orders: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 # Add Feedback
-@app.route("/api/feedback", methods=["POST"])
+@api.route("/api/feedback", methods=["POST"])
 def add_feedback():
     try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
         data = request.get_json()
         if not data:
             logger.warning("No data provided in add_feedback request")
@@ -236,7 +509,7 @@ def add_feedback():
         # Validate the feedback data
         is_valid, error_message = validate_feedback(data)
         if not is_valid:
-            logger.warning(f"Invalid feedback data: {error_message}")
+            logger.warning("Invalid feedback data: %s", error_message)
             return jsonify({"error": error_message}), 400
         
         # Create feedback entry
@@ -247,94 +520,402 @@ def add_feedback():
             "created_at": datetime.utcnow().isoformat()  # Store timestamp
         }
         
-        result = feedback_collection.insert_one(feedback)
+        if write_behind is not None and store is default_store:
+            if not write_behind.submit(store.feedback_collection.name, feedback):
+                logger.warning("Write-behind queue full, rejecting feedback")
+                return jsonify({"error": "Server busy, retry later"}), 503, {"Retry-After": "1"}
+            logger.info("Queued feedback from %s (email: %s)", feedback['name'], feedback['email'])
+            return jsonify({"message": "Feedback accepted"}), 202
+
+        result = store.feedback_collection.insert_one(feedback)
         feedback["id"] = str(result.inserted_id)  # Add the MongoDB ObjectID as 'id'
-        logger.info(f"Added feedback from {feedback['name']} (email: {feedback['email']})")
+        logger.info("Added feedback from %s (email: %s)", feedback['name'], feedback['email'])
         return jsonify({"message": "Feedback added successfully"}), 201
     except Exception as e:
-        logger.error(f"Error adding feedback: {e}", exc_info=True)
+        logger.error("Error adding feedback: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 # Get Feedback
-@app.route("/api/feedback", methods=["GET"])
+# Without limit/cursor all feedback is returned as before. With them, pages are keyed
+# on (created_at, _id) and wrapped with next_cursor. format=ndjson streams entries,
+# ending with a {"next_cursor": ...} line when paginated.
+@api.route("/api/feedback", methods=["GET"])
 def get_feedback():
     try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
         logger.info("Received request for /api/feedback")
-        feedback_list = list(feedback_collection.find({}, {"_id": 1, "name": 1, "email": 1, "feedback": 1, "created_at": 1}))
+        paginate, limit, cursor, error_message = parse_page_args(request.args, FEEDBACK_CURSOR_FIELDS)
+        if error_message:
+            logger.warning("Invalid pagination for /api/feedback: %s", error_message)
+            return jsonify({"error": error_message}), 400
+
+        if request.args.get("format") == "ndjson":
+            feedback_cursor = store.feedback_collection.find(after_field("created_at", cursor), FEEDBACK_PROJECTION, batch_size=500).sort(FEEDBACK_SORT)
+            if paginate:
+                lines = ndjson_lines(feedback_cursor.limit(limit + 1), format_feedback, limit, FEEDBACK_CURSOR_FIELDS)
+            else:
+                lines = ndjson_lines(feedback_cursor, format_feedback)
+            return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+        if paginate:
+            feedback_list, next_cursor = fetch_page(
+                store.feedback_collection, after_field("created_at", cursor), FEEDBACK_PROJECTION, FEEDBACK_SORT, limit,
+                FEEDBACK_CURSOR_FIELDS
+            )
+            logger.info("Fetched page of %s feedback entries", len(feedback_list))
+            return jsonify({"feedback": [format_feedback(fb) for fb in feedback_list], "next_cursor": next_cursor}), 200
+
+        feedback_list = list(store.feedback_collection.find({}, FEEDBACK_PROJECTION))
         # Convert ObjectID to string and exclude '_id' from the response
-        formatted_feedback = [
-            {
-                "id": str(fb["_id"]),
-                "name": fb["name"],
-                "email": fb["email"],
-                "feedback": fb["feedback"],
-                "created_at": fb["created_at"]
-            }
-            for fb in feedback_list
-        ]
-        logger.info(f"Fetched {len(formatted_feedback)} feedback entries")
+        formatted_feedback = [format_feedback(fb) for fb in feedback_list]
+        logger.info("Fetched %s feedback entries", len(formatted_feedback))
         return jsonify(formatted_feedback), 200
     except Exception as e:
-        logger.error(f"Error fetching feedback: {e}", exc_info=True)
+        logger.error("Error fetching feedback: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Search feedback. q matches words in the feedback text and name through the feedback
+# text index and ranks hits by relevance (each hit carries its score); email and
+# start/end (created_at, end exclusive) filter. Results always come in pages of
+# limit (default 100) with next_cursor, as /api/feedback?limit=.
+@api.route("/api/feedback/search", methods=["GET"])
+def search_feedback():
+    try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        search, error_message = parse_feedback_search(request.args)
+        if error_message:
+            logger.warning("Invalid feedback search: %s", error_message)
+            return jsonify({"error": error_message}), 400
+        _, limit, cursor, error_message = parse_page_args(request.args)
+        if error_message:
+            logger.warning("Invalid pagination for /api/feedback/search: %s", error_message)
+            return jsonify({"error": error_message}), 400
+        cursor_fields = feedback_search_cursor_fields(search)
+        if cursor and any(key not in cursor for key in cursor_fields):
+            return jsonify({"error": "Invalid cursor"}), 400
+        limit = limit or DEFAULT_PAGE_LIMIT
+
+        pipeline = feedback_search_pipeline(search, limit, cursor)
+        feedback_list, next_cursor = split_page(list(store.feedback_collection.aggregate(pipeline)), limit, cursor_fields)
+        logger.info("Found %s feedback entries for search %s", len(feedback_list), search)
+        return jsonify({"feedback": [format_feedback_hit(fb) for fb in feedback_list], "next_cursor": next_cursor}), 200
+    except Exception as e:
+        logger.error("Error searching feedback: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Export order history joined with the menu as CSV (default) or Parquet, streamed in
+# chunks. Takes the same start/end/cuisine/category filters as /visualize.
+# Large imports go through `python order_io.py import`.
+@api.route("/export/orders", methods=["GET"])
+def export_orders():
+    try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        # Imported here so pandas/pyarrow are only loaded by workers that export
+        from order_io import export_stream, parquet_available, EXPORT_FORMATS
+        export_format = request.args.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+        if export_format == "parquet" and not parquet_available():
+            return jsonify({"error": "Parquet export is not available, install pyarrow"}), 400
+        filters, error_message = parse_visualize_filters(request.args)
+        if error_message:
+            logger.warning("Invalid export filters: %s", error_message)
+            return jsonify({"error": error_message}), 400
+        logger.info("Exporting orders as %s with filters: %s", export_format, filters)
+        mimetype = "text/csv" if export_format == "csv" else "application/vnd.apache.parquet"
+        return Response(
+            stream_with_context(export_stream(store.order_collection, store.menu_collection, export_format, filters)),
+            mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename=orders.{export_format}"}
+        )
+    except Exception as e:
+        logger.error("Error exporting orders: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-# Visualization route
-@app.route("/visualize", methods=["GET"])
+# Helper function to read the source and filters shared by /visualize and /visualize/data
+def visualize_args(sources):
+    source = request.args.get("source", os.getenv("ANALYTICS_SOURCE", "rollup"))
+    if source not in sources:
+        logger.warning("Invalid analytics source requested: %s", source)
+        return None, None, f"source must be one of: {', '.join(sources)}"
+    filters, error_message = parse_visualize_filters(request.args)
+    if error_message:
+        logger.warning("Invalid visualization filters: %s", error_message)
+        return None, None, error_message
+    return source, filters, ""
+
+# Helper function to read the tenant parameter: an outlet name, a comma-separated list
+# or "all". Returns (names, error); names is None when no tenant was requested.
+def visualize_tenants():
+    value = request.args.get("tenant")
+    if not value:
+        return None, ""
+    if tenant_registry is None:
+        return None, "No tenants are configured, set TENANT_URIS"
+    names = tenant_registry.names() if value == "all" else [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in tenant_registry]
+    if unknown or not names:
+        logger.warning("Unknown tenants requested: %s", unknown)
+        return None, f"Unknown tenants: {unknown}"
+    return names, ""
+
+# Aggregates for one outlet, or merged across several outlets in parallel.
+# Returns (aggregates, graph file name prefix).
+def tenant_aggregates(names, source, filters):
+    from visualize import load_aggregates, load_chain_aggregates
+    if len(names) == 1:
+        tenant_db = tenant_registry.database(names[0])
+        aggregates = load_aggregates(tenant_db["food_order"], tenant_db["restaurant_menu"], tenant_db[ROLLUP_COLLECTION], source, filters)
+        return aggregates, f"{names[0]}-"
+    databases = tenant_registry.databases(names)
+    return load_chain_aggregates(databases, source, filters, tenant_workers_from_env(len(names))), "chain-"
+
+# Helper function to read mode=exact (default) or mode=preview for /visualize and
+# /visualize/data. Preview reads a sample of this database's orders, so it cannot be
+# combined with tenant. Returns (mode, error).
+def visualize_mode(modes, tenants):
+    mode = request.args.get("mode", "exact")
+    if mode not in modes:
+        logger.warning("Invalid visualization mode requested: %s", mode)
+        return None, f"mode must be one of: {', '.join(modes)}"
+    if mode == "preview" and tenants:
+        return None, "mode=preview does not support tenant"
+    return mode, ""
+
+# Outlets available for ?tenant=
+@api.route("/tenants", methods=["GET"])
+def list_tenants():
+    return jsonify({"tenants": tenant_registry.names() if tenant_registry is not None else []}), 200
+
+# Helper function to turn graph file names into URLs
+def graph_urls(image_urls):
+    base_url = os.getenv("GRAPH_BASE_URL", "http://127.0.0.1:5001/graphs/")
+    return [url if url.startswith('http') else f"{base_url}{url.split('/')[-1]}" for url in image_urls]
+
+# Visualization route; format=png (default), svg, or thumb for low-DPI PNG thumbnails.
+# With the chart scheduler enabled, unfiltered requests get the latest background render
+# with its generated_at time; a stale render is returned as is and refreshed.
+# tenant=<name>, tenant=a,b or tenant=all draws one outlet or merges several.
+# mode=preview draws approximate charts from a sample of orders (see visualize.load_preview_aggregates).
+@api.route("/visualize", methods=["GET"])
 def visualize():
     try:
         try:
-            from visualize import generate_graphs
+            from visualize import generate_graphs, graphs_from_aggregates, load_preview_aggregates, ANALYTICS_SOURCES, IMAGE_FORMATS, VISUALIZE_MODES
         except ImportError as e:
-            logger.error(f"Failed to import visualize module: {e}")
+            logger.error("Failed to import visualize module: %s", e)
             return jsonify({"error": "Visualization module not available"}), 500
-        image_urls = generate_graphs(order_collection, menu_collection)
+        source, filters, error_message = visualize_args(ANALYTICS_SOURCES)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        image_format = request.args.get("format", "png")
+        if image_format not in IMAGE_FORMATS:
+            logger.warning("Invalid image format requested: %s", image_format)
+            return jsonify({"error": f"format must be one of: {', '.join(IMAGE_FORMATS)}"}), 400
+        tenants, error_message = visualize_tenants()
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        mode, error_message = visualize_mode(VISUALIZE_MODES, tenants)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+
+        if mode == "preview":
+            aggregates, _, preview = load_preview_aggregates(order_collection, menu_collection, rollup_collection, filters)
+            image_urls = graphs_from_aggregates(aggregates, image_format, "preview-" + filter_prefix(filters))
+            if not image_urls:
+                logger.info("No preview visualizations generated due to empty data")
+                return jsonify({"message": "No visualizations generated (empty data)", "mode": mode, "preview": preview}), 200
+            logger.info("Generated %s preview visualizations from %s sampled orders", len(image_urls), preview["sampled_orders"])
+            return jsonify({"images": graph_urls(image_urls), "mode": mode, "preview": preview}), 200
+
+        if tenants:
+            aggregates, name_prefix = tenant_aggregates(tenants, source, filters)
+            image_urls = graphs_from_aggregates(aggregates, image_format, name_prefix + filter_prefix(filters))
+            if not image_urls:
+                logger.info("No visualizations generated for tenants %s due to empty data", tenants)
+                return jsonify({"message": "No visualizations generated (empty data)", "tenants": tenants}), 200
+            logger.info("Generated %s visualizations for tenants %s", len(image_urls), tenants)
+            return jsonify({"images": graph_urls(image_urls), "tenants": tenants}), 200
+
+        if chart_scheduler is not None and not filters:
+            state, stale = chart_scheduler.get(source, image_format)
+            if state is None:
+                return jsonify({"error": "Visualization error: chart rendering failed"}), 500
+            if not state["images"]:
+                logger.info("No visualizations generated due to empty data")
+                return jsonify({"message": "No visualizations generated (empty data)", "generated_at": state["generated_at"]}), 200
+            logger.info("Returned %s visualizations generated at %s (stale: %s)", len(state["images"]), state["generated_at"], stale)
+            return jsonify({"images": graph_urls(state["images"]), "generated_at": state["generated_at"], "stale": stale}), 200
+
+        image_urls = generate_graphs(order_collection, menu_collection, rollup_collection, source, filters, image_format)
         if not image_urls:
             logger.info("No visualizations generated due to empty data")
             return jsonify({"message": "No visualizations generated (empty data)"}), 200
-        base_url = os.getenv("GRAPH_BASE_URL", "http://127.0.0.1:5001/graphs/")
-        absolute_urls = [url if url.startswith('http') else f"{base_url}{url.split('/')[-1]}" for url in image_urls]
-        logger.info(f"Generated {len(absolute_urls)} visualizations: {absolute_urls}")
+        absolute_urls = graph_urls(image_urls)
+        logger.info("Generated %s visualizations: %s", len(absolute_urls), absolute_urls)
         return jsonify({"images": absolute_urls}), 200
     except Exception as e:
-        logger.error(f"Visualization error: {e}", exc_info=True)
+        logger.error("Visualization error: %s", e, exc_info=True)
         return jsonify({"error": f"Visualization error: {str(e)}"}), 500
 
-# Serve image files
-@app.route("/graphs/<path:filename>")
+# Queue a background refresh of a chart set (source and format as for /visualize)
+@api.route("/visualize/refresh", methods=["POST"])
+def visualize_refresh():
+    if chart_scheduler is None:
+        return jsonify({"error": "Chart scheduler is disabled, set CHART_SCHEDULER=True to enable it"}), 404
+    try:
+        from visualize import ANALYTICS_SOURCES, IMAGE_FORMATS
+        source, filters, error_message = visualize_args(ANALYTICS_SOURCES)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        if filters:
+            return jsonify({"error": "Only unfiltered chart sets are rendered in the background"}), 400
+        image_format = request.args.get("format", "png")
+        if image_format not in IMAGE_FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(IMAGE_FORMATS)}"}), 400
+        chart_scheduler.refresh(source, image_format, force=True)
+        logger.info("Queued chart refresh for %s/%s", source, image_format)
+        return jsonify({"message": "Refresh queued", "source": source, "format": image_format}), 202
+    except Exception as e:
+        logger.error("Error queueing chart refresh: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Chart data for client-side rendering: the series behind each chart, no images.
+# With mode=preview every series carries "margins" of error next to its values.
+@api.route("/visualize/data", methods=["GET"])
+def visualize_data():
+    try:
+        try:
+            from visualize import generate_chart_data, generate_preview_data, chart_data_from_aggregates, ANALYTICS_SOURCES, VISUALIZE_MODES
+        except ImportError as e:
+            logger.error("Failed to import visualize module: %s", e)
+            return jsonify({"error": "Visualization module not available"}), 500
+        source, filters, error_message = visualize_args(ANALYTICS_SOURCES)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        tenants, error_message = visualize_tenants()
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        mode, error_message = visualize_mode(VISUALIZE_MODES, tenants)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        if mode == "preview":
+            charts, preview = generate_preview_data(order_collection, menu_collection, rollup_collection, filters)
+            logger.info("Returned preview data for %s charts", len(charts))
+            return jsonify({"mode": mode, "charts": charts, "preview": preview}), 200
+        if tenants:
+            charts = chart_data_from_aggregates(tenant_aggregates(tenants, source, filters)[0])
+            logger.info("Returned data for %s charts for tenants %s", len(charts), tenants)
+            return jsonify({"source": source, "tenants": tenants, "charts": charts}), 200
+        charts = generate_chart_data(order_collection, menu_collection, rollup_collection, source, filters)
+        logger.info("Returned data for %s charts", len(charts))
+        return jsonify({"source": source, "charts": charts}), 200
+    except Exception as e:
+        logger.error("Visualization data error: %s", e, exc_info=True)
+        return jsonify({"error": f"Visualization error: {str(e)}"}), 500
+
+# Serve image files. Content-addressed charts never change, so they are cached for a
+# year and their content key is the ETag; other files get Flask's mtime-based ETag.
+@api.route("/graphs/<path:filename>")
 def serve_graph(filename):
     try:
-        logger.info(f"Serving graph file: {filename}")
-        return send_from_directory(GRAPH_DIR, filename)
-    except FileNotFoundError:
-        logger.warning(f"Graph file not found: {filename}")
+        logger.info("Serving graph file: %s", filename)
+        key = http_cache.content_key(filename)
+        if key is None:
+            return send_from_directory(GRAPH_DIR, filename)
+        if http_cache.not_modified(request, key):
+            response = Response(status=304)
+            response.set_etag(key)
+        else:
+            response = send_from_directory(GRAPH_DIR, filename, etag=key)
+        response.headers["Cache-Control"] = http_cache.IMMUTABLE_CACHE_CONTROL
+        return response
+    except (FileNotFoundError, NotFound):
+        # Pruned chart versions (see chart_cache.prune_versions) end up here
+        logger.warning("Graph file not found: %s", filename)
         return jsonify({"error": "Graph not found"}), 404
     except Exception as e:
-        logger.error(f"Error serving graph: {e}", exc_info=True)
+        logger.error("Error serving graph: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 # Delete items
-@app.route("/delete_items", methods=["POST"])
+@api.route("/delete_items", methods=["POST"])
 def delete_items():
     try:
+        store, error_message = request_store()
+        if error_message:
+            return jsonify({"error": error_message}), 400
         data = request.get_json()
         items_to_delete = data.get("items", [])
         if not items_to_delete or not isinstance(items_to_delete, list):
             logger.warning("No valid items provided to delete")
             return jsonify({"error": "No valid items provided to delete"}), 400
-        result = menu_collection.delete_many({"name": {"$in": items_to_delete}})
-        logger.info(f"Deleted {result.deleted_count} menu items")
+        result = store.menu_collection.delete_many({"name": {"$in": items_to_delete}})
+        if result.deleted_count:
+            bump_menu_version(store.meta_collection)
+        store.menu_cache.invalidate()
+        logger.info("Deleted %s menu items", result.deleted_count)
         return jsonify({"message": f"{result.deleted_count} items deleted"}), 200
     except Exception as e:
-        logger.error(f"Error deleting items: {e}", exc_info=True)
+        logger.error("Error deleting items: %s", e, exc_info=True)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+# Menu cache statistics
+@api.route("/menu_cache/stats", methods=["GET"])
+def menu_cache_stats():
+    store, error_message = request_store()
+    if error_message:
+        return jsonify({"error": error_message}), 400
+    return jsonify(store.menu_cache.stats()), 200
+
+# Write-behind queue statistics
+@api.route("/write_behind/stats", methods=["GET"])
+def write_behind_stats():
+    if write_behind is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **write_behind.stats()}), 200
+
+# Chart scheduler statistics
+@api.route("/chart_scheduler/stats", methods=["GET"])
+def chart_scheduler_stats():
+    if chart_scheduler is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **chart_scheduler.stats()}), 200
+
+# Prometheus metrics
+@api.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled, set METRICS=True to enable them"}), 404
+    return Response(metrics.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+# `app:app` for servers that expect a module-level application (e.g. `waitress-serve app:app`).
+# It is built on first access so importing this module stays cheap; prefer
+# `waitress-serve --call app:create_app`.
+_app = None
+_app_lock = threading.Lock()
+
+def __getattr__(name):
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
+
 # Run Flask App
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5001))
     debug = os.getenv("FLASK_DEBUG", "True") == "True"
-    logger.info(f"Starting Flask app on port {port} with debug={debug}")
+    logger.info("Starting Flask app on port %s with debug=%s", port, debug)
     try:
-        app.run(debug=debug, host="127.0.0.1", port=port)
+        create_app().run(debug=debug, host="127.0.0.1", port=port)
     except Exception as e:
-        logger.error(f"Failed to start Flask server: {e}", exc_info=True)
+        logger.error("Failed to start Flask server: %s", e, exc_info=True)
         raise
@@ -0,0 +1,406 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, Response, request, jsonify, send_from_directory
+from quart_cors import cors
+from werkzeug.exceptions import NotFound
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
+from indexes import ensure_indexes
+from logging_setup import configure_logging
+from menu_cache import META_COLLECTION, MENU_VERSION_FILTER, MENU_VERSION_BUMP
+import http_cache
+from rollups import ROLLUP_COLLECTION, rollup_operations, order_datetime
+from menu_index import MenuIndex
+from pagination import DEFAULT_PAGE_LIMIT, parse_page_args, after_id, after_field, split_page, page_cursor, next_cursor_line
+from validation import (
+    validate_menu_item, validate_order, validate_feedback, parse_visualize_filters,
+    format_feedback, FEEDBACK_PROJECTION, FEEDBACK_SORT, FEEDBACK_CURSOR_FIELDS,
+    parse_feedback_search, feedback_search_pipeline, feedback_search_cursor_fields, format_feedback_hit
+)
+
+# asyncio serving mode for the same API as app.py. Requests wait on MongoDB through
+# Motor without holding a thread, and chart rendering runs on an executor.
+#
+#   hypercorn asgi_app:app --bind 127.0.0.1:5001 --workers 2
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173").split(",")
+app = cors(Quart(__name__), allow_origin=allowed_origins, allow_methods=["GET", "POST", "OPTIONS"], allow_headers=["Content-Type", "Origin"])
+logger.info("CORS configured for origins: %s", allowed_origins)
+
+# Ensure graph directory exists
+GRAPH_DIR = os.path.join(os.getcwd(), "graphs")
+os.makedirs(GRAPH_DIR, exist_ok=True)
+
+# Populated at startup
+mongo = {}
+visualize_executor = ThreadPoolExecutor(max_workers=int(os.getenv("VISUALIZE_THREADS", 2)), thread_name_prefix="visualize")
+
+# Add security headers
+@app.after_request
+async def add_security_headers(response):
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['X-Frame-Options'] = 'DENY'
+    response.headers['X-XSS-Protection'] = '1; mode=block'
+    return response
+
+# MongoDB Connection
+@app.before_serving
+async def connect_to_mongo():
+    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000, maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 200)))
+    await client.admin.command("ping")
+    db_name = os.getenv("MONGO_DB", "restaurant")
+    db = client[db_name]
+    mongo["client"] = client
+    mongo["menu"] = db["restaurant_menu"]
+    mongo["orders"] = db["food_order"]
+    mongo["feedback"] = db["feedback"]
+    mongo["rollups"] = db[ROLLUP_COLLECTION]
+    mongo["meta"] = db[META_COLLECTION]
+    # Chart generation is synchronous pandas/matplotlib code, so it gets a regular client
+    mongo["sync_client"] = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    mongo["sync_db"] = mongo["sync_client"][db_name]
+    logger.info("Connected to MongoDB successfully")
+    if os.getenv("ENSURE_INDEXES", "True") == "True":
+        await asyncio.get_running_loop().run_in_executor(None, ensure_indexes, mongo["sync_db"])
+
+@app.after_serving
+async def disconnect_from_mongo():
+    mongo["client"].close()
+    mongo["sync_client"].close()
+    visualize_executor.shutdown(wait=False)
+
+# Add Item
+@app.route("/add_item", methods=["POST"])
+async def add_item():
+    try:
+        data = await request.get_json()
+        if not data:
+            logger.warning("No data provided in add_item request")
+            return jsonify({"error": "No data provided"}), 400
+
+        is_valid, error_message = validate_menu_item(data)
+        if not is_valid:
+            logger.warning("Invalid menu item data: %s", error_message)
+            return jsonify({"error": error_message}), 400
+
+        item = {
+            "name": data["name"].strip(),
+            "category": data["category"],
+            "cuisine": data["cuisine"].strip(),
+            "selling_price": float(data["selling_price"]),
+            "actual_price": float(data["actual_price"])
+        }
+        try:
+            await mongo["menu"].insert_one(item)
+        except DuplicateKeyError:
+            logger.info("Item already exists: %s", item['name'])
+            return jsonify({"error": "Item already exists"}), 409
+        await mongo["meta"].update_one(MENU_VERSION_FILTER, MENU_VERSION_BUMP, upsert=True)
+        logger.info("Added menu item: %s", item['name'])
+        return jsonify({"message": "Item added successfully"}), 200
+    except Exception as e:
+        logger.error("Error adding item: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Stream documents from a Motor cursor as newline-delimited JSON, ending paginated
+# streams with a {"next_cursor": ...} line (see pagination.ndjson_lines)
+async def ndjson_stream(cursor, formatter, limit=None, cursor_fields=None):
+    last = None
+    position = 0
+    async for doc in cursor:
+        if limit is not None and position == limit:
+            yield next_cursor_line(page_cursor(last, cursor_fields))
+            return
+        last = doc
+        position += 1
+        yield json.dumps(formatter(doc), default=str) + "\n"
+    if limit is not None:
+        yield next_cursor_line(None)
+
+# Fetch one keyset page with limit + 1 to learn whether another page exists
+async def fetch_page(collection, query, projection, sort, limit, cursor_fields):
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    return split_page(docs, limit, cursor_fields)
+
+# Helper function to tag a response with a weak ETag that clients must revalidate
+def revalidate(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# Get Menu Items; the ETag follows the menu version shared with app.py
+@app.route("/get_items", methods=["GET"])
+async def get_items():
+    try:
+        paginate, limit, cursor, error_message = parse_page_args(request.args)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+
+        version = await mongo["meta"].find_one(MENU_VERSION_FILTER, {"version": 1})
+        etag = http_cache.versioned_etag("menu", version["version"] if version else 0, request.args)
+        if http_cache.not_modified(request, etag):
+            return revalidate(Response("", status=304), etag)
+
+        if request.args.get("format") == "ndjson":
+            if paginate:
+                items_cursor = mongo["menu"].find(after_id(cursor), batch_size=500).sort("_id", 1).limit(limit + 1)
+                lines = ndjson_stream(items_cursor, lambda item: {key: value for key, value in item.items() if key != "_id"}, limit, {"id": "_id"})
+            else:
+                lines = ndjson_stream(mongo["menu"].find({}, {"_id": 0}, batch_size=500).sort("_id", 1), lambda item: item)
+            return lines, 200, {
+                "Content-Type": "application/x-ndjson", "ETag": f'W/"{etag}"', "Cache-Control": "no-cache"
+            }
+
+        if paginate:
+            items, next_cursor = await fetch_page(mongo["menu"], after_id(cursor), None, [("_id", 1)], limit, {"id": "_id"})
+            items = [{key: value for key, value in item.items() if key != "_id"} for item in items]
+            return revalidate(jsonify({"items": items, "next_cursor": next_cursor}), etag), 200
+
+        items = await mongo["menu"].find({}, {"_id": 0}).to_list(None)
+        logger.info("Fetched %s menu items", len(items))
+        return revalidate(jsonify({"items": items}), etag), 200
+    except Exception as e:
+        logger.error("Error fetching items: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Place Order
+@app.route("/place_order", methods=["POST"])
+async def place_order():
+    try:
+        data = await request.get_json()
+        if not data:
+            logger.warning("No order data provided in place_order request")
+            return jsonify({"error": "No order data provided"}), 400
+
+        is_valid, error_message = validate_order(data)
+        if not is_valid:
+            logger.warning("Invalid order data: %s", error_message)
+            return jsonify({"error": error_message}), 400
+
+        # Resolve every item with a single query
+        menu_docs = await mongo["menu"].find({"name": {"$in": list(set(data["items"]))}}).to_list(None)
+        menu = MenuIndex.from_items(menu_docs)
+        invalid_items = [item for item in data["items"] if item not in menu]
+        if invalid_items:
+            logger.info("Invalid items in order: %s", invalid_items)
+            return jsonify({"error": f"Invalid items: {invalid_items}"}), 400
+
+        total_cost, total_loss = menu.order_totals(data["items"])
+
+        order = {
+            "items": data["items"],
+            "lines": menu.snapshot_lines(data["items"]),
+            "datetime": order_datetime(data["datetime"]),
+            "total_cost": total_cost,
+            "total_loss": total_loss
+        }
+        await mongo["orders"].insert_one(order)
+        try:
+            operations = rollup_operations([order], menu)
+            if operations:
+                await mongo["rollups"].bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error("Failed to update order rollups, run `python rollups.py rebuild`: %s", e, exc_info=True)
+        logger.info("Placed order with %s items, total_cost: %s, total_loss: %s", len(data['items']), total_cost, total_loss)
+        return jsonify({"message": "Order placed successfully"}), 200
+    except Exception as e:
+        logger.error("Error placing order: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Add Feedback
+@app.route("/api/feedback", methods=["POST"])
+async def add_feedback():
+    try:
+        data = await request.get_json()
+        if not data:
+            logger.warning("No data provided in add_feedback request")
+            return jsonify({"error": "No data provided"}), 400
+
+        is_valid, error_message = validate_feedback(data)
+        if not is_valid:
+            logger.warning("Invalid feedback data: %s", error_message)
+            return jsonify({"error": error_message}), 400
+
+        feedback = {
+            "name": data["name"].strip(),
+            "email": data["email"].strip(),
+            "feedback": data["feedback"].strip(),
+            "created_at": datetime.utcnow().isoformat()
+        }
+        await mongo["feedback"].insert_one(feedback)
+        logger.info("Added feedback from %s (email: %s)", feedback['name'], feedback['email'])
+        return jsonify({"message": "Feedback added successfully"}), 201
+    except Exception as e:
+        logger.error("Error adding feedback: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Get Feedback
+@app.route("/api/feedback", methods=["GET"])
+async def get_feedback():
+    try:
+        paginate, limit, cursor, error_message = parse_page_args(request.args, FEEDBACK_CURSOR_FIELDS)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+
+        if request.args.get("format") == "ndjson":
+            feedback_cursor = mongo["feedback"].find(after_field("created_at", cursor), FEEDBACK_PROJECTION, batch_size=500).sort(FEEDBACK_SORT)
+            if paginate:
+                lines = ndjson_stream(feedback_cursor.limit(limit + 1), format_feedback, limit, FEEDBACK_CURSOR_FIELDS)
+            else:
+                lines = ndjson_stream(feedback_cursor, format_feedback)
+            return lines, 200, {"Content-Type": "application/x-ndjson"}
+
+        if paginate:
+            feedback_list, next_cursor = await fetch_page(
+                mongo["feedback"], after_field("created_at", cursor), FEEDBACK_PROJECTION, FEEDBACK_SORT, limit,
+                FEEDBACK_CURSOR_FIELDS
+            )
+            return jsonify({"feedback": [format_feedback(fb) for fb in feedback_list], "next_cursor": next_cursor}), 200
+
+        feedback_list = await mongo["feedback"].find({}, FEEDBACK_PROJECTION).to_list(None)
+        logger.info("Fetched %s feedback entries", len(feedback_list))
+        return jsonify([format_feedback(fb) for fb in feedback_list]), 200
+    except Exception as e:
+        logger.error("Error fetching feedback: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Search feedback. q matches words in the feedback text and name through the feedback
+# text index and ranks hits by relevance (each hit carries its score); email and
+# start/end (created_at, end exclusive) filter. Results always come in pages of
+# limit (default 100) with next_cursor, as /api/feedback?limit=.
+@app.route("/api/feedback/search", methods=["GET"])
+async def search_feedback():
+    try:
+        search, error_message = parse_feedback_search(request.args)
+        if error_message:
+            logger.warning("Invalid feedback search: %s", error_message)
+            return jsonify({"error": error_message}), 400
+        _, limit, cursor, error_message = parse_page_args(request.args)
+        if error_message:
+            logger.warning("Invalid pagination for /api/feedback/search: %s", error_message)
+            return jsonify({"error": error_message}), 400
+        cursor_fields = feedback_search_cursor_fields(search)
+        if cursor and any(key not in cursor for key in cursor_fields):
+            return jsonify({"error": "Invalid cursor"}), 400
+        limit = limit or DEFAULT_PAGE_LIMIT
+
+        pipeline = feedback_search_pipeline(search, limit, cursor)
+        feedback_list, next_cursor = split_page(await mongo["feedback"].aggregate(pipeline).to_list(None), limit, cursor_fields)
+        logger.info("Found %s feedback entries for search %s", len(feedback_list), search)
+        return jsonify({"feedback": [format_feedback_hit(fb) for fb in feedback_list], "next_cursor": next_cursor}), 200
+    except Exception as e:
+        logger.error("Error searching feedback: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Visualization route; chart generation runs on the executor so the event loop stays free
+@app.route("/visualize", methods=["GET"])
+async def visualize():
+    try:
+        try:
+            from visualize import generate_graphs, ANALYTICS_SOURCES, IMAGE_FORMATS
+        except ImportError as e:
+            logger.error("Failed to import visualize module: %s", e)
+            return jsonify({"error": "Visualization module not available"}), 500
+        source = request.args.get("source", os.getenv("ANALYTICS_SOURCE", "rollup"))
+        if source not in ANALYTICS_SOURCES:
+            return jsonify({"error": f"source must be one of: {', '.join(ANALYTICS_SOURCES)}"}), 400
+        filters, error_message = parse_visualize_filters(request.args)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+        image_format = request.args.get("format", "png")
+        if image_format not in IMAGE_FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(IMAGE_FORMATS)}"}), 400
+
+        db = mongo["sync_db"]
+        loop = asyncio.get_running_loop()
+        image_urls = await loop.run_in_executor(
+            visualize_executor, generate_graphs,
+            db["food_order"], db["restaurant_menu"], db[ROLLUP_COLLECTION], source, filters, image_format
+        )
+        if not image_urls:
+            return jsonify({"message": "No visualizations generated (empty data)"}), 200
+        base_url = os.getenv("GRAPH_BASE_URL", "http://127.0.0.1:5001/graphs/")
+        absolute_urls = [url if url.startswith('http') else f"{base_url}{url.split('/')[-1]}" for url in image_urls]
+        return jsonify({"images": absolute_urls}), 200
+    except Exception as e:
+        logger.error("Visualization error: %s", e, exc_info=True)
+        return jsonify({"error": f"Visualization error: {str(e)}"}), 500
+
+# Chart data for client-side rendering
+@app.route("/visualize/data", methods=["GET"])
+async def visualize_data():
+    try:
+        try:
+            from visualize import generate_chart_data, ANALYTICS_SOURCES
+        except ImportError as e:
+            logger.error("Failed to import visualize module: %s", e)
+            return jsonify({"error": "Visualization module not available"}), 500
+        source = request.args.get("source", os.getenv("ANALYTICS_SOURCE", "rollup"))
+        if source not in ANALYTICS_SOURCES:
+            return jsonify({"error": f"source must be one of: {', '.join(ANALYTICS_SOURCES)}"}), 400
+        filters, error_message = parse_visualize_filters(request.args)
+        if error_message:
+            return jsonify({"error": error_message}), 400
+
+        db = mongo["sync_db"]
+        charts = await asyncio.get_running_loop().run_in_executor(
+            visualize_executor, generate_chart_data,
+            db["food_order"], db["restaurant_menu"], db[ROLLUP_COLLECTION], source, filters
+        )
+        return jsonify({"source": source, "charts": charts}), 200
+    except Exception as e:
+        logger.error("Visualization data error: %s", e, exc_info=True)
+        return jsonify({"error": f"Visualization error: {str(e)}"}), 500
+
+# Serve image files; content-addressed charts are immutable (see app.py)
+@app.route("/graphs/<path:filename>")
+async def serve_graph(filename):
+    try:
+        key = http_cache.content_key(filename)
+        if key is None:
+            return await send_from_directory(GRAPH_DIR, filename)
+        if http_cache.not_modified(request, key):
+            response = Response("", status=304)
+        else:
+            response = await send_from_directory(GRAPH_DIR, filename)
+        response.set_etag(key)
+        response.headers["Cache-Control"] = http_cache.IMMUTABLE_CACHE_CONTROL
+        return response
+    except (FileNotFoundError, NotFound):
+        # Pruned chart versions (see chart_cache.prune_versions) end up here
+        logger.warning("Graph file not found: %s", filename)
+        return jsonify({"error": "Graph not found"}), 404
+
+# Delete items
+@app.route("/delete_items", methods=["POST"])
+async def delete_items():
+    try:
+        data = await request.get_json()
+        items_to_delete = data.get("items", [])
+        if not items_to_delete or not isinstance(items_to_delete, list):
+            logger.warning("No valid items provided to delete")
+            return jsonify({"error": "No valid items provided to delete"}), 400
+        result = await mongo["menu"].delete_many({"name": {"$in": items_to_delete}})
+        if result.deleted_count:
+            await mongo["meta"].update_one(MENU_VERSION_FILTER, MENU_VERSION_BUMP, upsert=True)
+        logger.info("Deleted %s menu items", result.deleted_count)
+        return jsonify({"message": f"{result.deleted_count} items deleted"}), 200
+    except Exception as e:
+        logger.error("Error deleting items: %s", e, exc_info=True)
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# Run with Quart's development server; use hypercorn in production
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 5001))
+    logger.info("Starting async app on port %s", port)
+    app.run(host="127.0.0.1", port=port)
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from visualize import load_scan_aggregates, load_pipeline_aggregates
+
+# Compare the client-side pandas scan with the server-side aggregation pipeline
+# as the number of orders grows. Needs a running MongoDB; data is seeded into a
+# throwaway database that is dropped afterwards.
+#
+#   python benchmarks/bench_aggregation.py --orders 1000 10000 100000
+
+CUISINES = ["Indian", "Italian", "Chinese", "Mexican", "Japanese", "Thai"]
+
+def seed_menu(menu_collection, menu_size):
+    menu_collection.drop()
+    menu_collection.insert_many([
+        {
+            "name": f"Item {i}",
+            "category": "Dinner",
+            "cuisine": CUISINES[i % len(CUISINES)],
+            "selling_price": float(random.randint(50, 500)),
+            "actual_price": float(random.randint(40, 450))
+        }
+        for i in range(menu_size)
+    ])
+    menu_collection.create_index("name", unique=True)
+
+def seed_orders(order_collection, order_count, menu_size, start, chunk_size=10000):
+    order_collection.drop()
+    names = [f"Item {i}" for i in range(menu_size)]
+    for offset in range(0, order_count, chunk_size):
+        order_collection.insert_many([
+            {
+                "items": random.choices(names, k=random.randint(1, 5)),
+                "datetime": (start + timedelta(minutes=random.randint(0, 60 * 24 * 365))).isoformat(),
+                "total_cost": 0,
+                "total_loss": 0
+            }
+            for _ in range(min(chunk_size, order_count - offset))
+        ])
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scan vs pipeline analytics aggregation")
+    parser.add_argument("--orders", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--menu-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database", default="restaurant_bench")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(42)
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"), serverSelectionTimeoutMS=5000)
+    db = client[args.database]
+    menu_collection = db["restaurant_menu"]
+    order_collection = db["food_order"]
+
+    try:
+        seed_menu(menu_collection, args.menu_size)
+        print(f"{'orders':>10} {'scan (s)':>10} {'pipeline (s)':>13} {'speedup':>8}")
+        for order_count in args.orders:
+            seed_orders(order_collection, order_count, args.menu_size, datetime(2024, 1, 1))
+            scan = best_of(args.repeat, lambda: load_scan_aggregates(order_collection, menu_collection))
+            pipeline = best_of(args.repeat, lambda: load_pipeline_aggregates(order_collection, menu_collection))
+            print(f"{order_count:>10} {scan:>10.3f} {pipeline:>13.3f} {scan / pipeline:>7.1f}x")
+    finally:
+        client.drop_database(args.database)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Drive the Flask app through its test client against seeded data and report
+# throughput, p50/p99 latency and peak RSS per endpoint, per analytics stage and
+# per chart. Results are written as JSON so two runs can be compared.
+#
+#   python benchmarks/bench_endpoints.py --line-items 100000 --output before.json
+#   python benchmarks/bench_endpoints.py --line-items 100000 --compare before.json
+#
+# --backend mongomock (default) needs no server; --backend mongo seeds a throwaway
+# database on MONGO_URI that is dropped afterwards. mongomock has no aggregation
+# operators for the pipeline source, so pipeline scenarios only run against mongo.
+
+CUISINES = ["Indian", "Italian", "Chinese", "Mexican", "Japanese", "Thai"]
+CATEGORIES = ["Breakfast", "Lunch", "Dinner"]
+
+# Resident set size of this process in bytes
+def current_rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs (e.g. macOS): fall back to the lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+# Sample RSS on a background thread while a scenario runs and keep the peak
+class PeakRSS:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+def summarize(timings, wall, rss, errors=0):
+    timings_ms = np.array(timings) * 1000
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "throughput_rps": round(len(timings) / wall, 2) if wall else 0.0,
+        "p50_ms": round(float(np.percentile(timings_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(timings_ms, 99)), 3),
+        "mean_ms": round(float(timings_ms.mean()), 3),
+        "max_ms": round(float(timings_ms.max()), 3),
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+        "rss_growth_mb": round((rss.peak - rss.baseline) / 2 ** 20, 1)
+    }
+
+# Call func repeat times and summarize; func returns False to count an error
+def measure(func, repeat):
+    timings = []
+    errors = 0
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            call_started = time.perf_counter()
+            if func() is False:
+                errors += 1
+            timings.append(time.perf_counter() - call_started)
+        wall = time.perf_counter() - started
+    return summarize(timings, wall, rss, errors)
+
+# Seed a menu, orders adding up to roughly line_items order lines, and feedback
+def seed(db, menu_size, line_items, feedback_count, chunk_size=20000):
+    from menu_index import MenuIndex
+    from rollups import rebuild_rollups
+
+    rng = np.random.default_rng(42)
+    menu = [
+        {
+            "name": f"Item {i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "cuisine": CUISINES[i % len(CUISINES)],
+            "selling_price": float(rng.integers(50, 500)),
+            "actual_price": float(rng.integers(40, 450))
+        }
+        for i in range(menu_size)
+    ]
+    db["restaurant_menu"].insert_many([dict(item) for item in menu])
+    menu_index = MenuIndex.from_items(db["restaurant_menu"].find())
+    names = np.array(menu_index.names, dtype=object)
+
+    start = datetime(2024, 1, 1)
+    seeded_lines = 0
+    seeded_orders = 0
+    while seeded_lines < line_items:
+        remaining = line_items - seeded_lines
+        lengths = rng.integers(1, 6, size=chunk_size)
+        lengths = lengths[np.cumsum(lengths) <= remaining]
+        if lengths.size == 0:
+            lengths = np.array([remaining])
+        flat = names[rng.integers(0, len(names), size=int(lengths.sum()))]
+        item_lists = [list(items) for items in np.split(flat, np.cumsum(lengths)[:-1])]
+        total_cost, total_loss = menu_index.price(item_lists)
+        minutes = rng.integers(0, 60 * 24 * 365, size=len(item_lists))
+        db["food_order"].insert_many([
+            {
+                "items": items,
+                "lines": menu_index.snapshot_lines(items),
+                "datetime": start + timedelta(minutes=int(offset)),
+                "total_cost": float(cost),
+                "total_loss": float(loss)
+            }
+            for items, offset, cost, loss in zip(item_lists, minutes, total_cost, total_loss)
+        ])
+        seeded_lines += int(lengths.sum())
+        seeded_orders += len(item_lists)
+
+    for offset in range(0, feedback_count, chunk_size):
+        db["feedback"].insert_many([
+            {
+                "name": "Guest",
+                "email": "guest@example.com",
+                "feedback": "Great food",
+                "created_at": (start + timedelta(seconds=offset + i)).isoformat()
+            }
+            for i in range(min(chunk_size, feedback_count - offset))
+        ])
+    rebuild_rollups(db)
+    return list(menu_index.names), seeded_orders, seeded_lines
+
+# Endpoint scenarios: name -> function building (method, path, json body) for one request
+def endpoint_scenarios(names, backend, batch_size):
+    def order(k=3):
+        return {"items": random.choices(names, k=k), "datetime": datetime.now().isoformat()}
+
+    scenarios = {
+        "GET /get_items": lambda: ("GET", "/get_items", None),
+        "GET /get_items?limit=100": lambda: ("GET", "/get_items?limit=100", None),
+        "GET /api/feedback?limit=100": lambda: ("GET", "/api/feedback?limit=100", None),
+        "GET /visualize?source=rollup": lambda: ("GET", "/visualize?source=rollup", None),
+        "GET /visualize?source=scan": lambda: ("GET", "/visualize?source=scan", None)
+    }
+    if backend == "mongo":
+        scenarios["GET /visualize?source=pipeline"] = lambda: ("GET", "/visualize?source=pipeline", None)
+    # Writes run last so the read scenarios see the seeded data only
+    scenarios.update({
+        "POST /place_order": lambda: ("POST", "/place_order", order()),
+        f"POST /place_orders (x{batch_size})": lambda: ("POST", "/place_orders", {"orders": [order() for _ in range(batch_size)]}),
+        "POST /api/feedback": lambda: ("POST", "/api/feedback", {"name": "Bench", "email": "bench@example.com", "feedback": "Benchmark feedback"})
+    })
+    return scenarios
+
+def bench_endpoints(app, names, backend, repeat, visualize_repeat, batch_size):
+    client = app.test_client()
+    results = {}
+    for name, build in endpoint_scenarios(names, backend, batch_size).items():
+        def call():
+            method, path, body = build()
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            return response.status_code < 400
+        results[name] = measure(call, visualize_repeat if "/visualize" in name else repeat)
+        print(f"  {name}: p50 {results[name]['p50_ms']:.1f} ms", flush=True)
+    return results
+
+# Time each analytics stage and each chart render on its own, bypassing the chart cache
+def bench_stages(db, backend, repeat, graph_dir):
+    from visualize import build_order_frame, compute_aggregates, load_rollup_aggregates, load_pipeline_aggregates, render_chart, CHARTS
+    from rollups import ROLLUP_COLLECTION
+
+    orders = db["food_order"]
+    menu = db["restaurant_menu"]
+    menu_items = list(menu.find())
+    results = {
+        "stage: build_order_frame": measure(lambda: build_order_frame(orders, menu_items), repeat),
+        "stage: load_rollup_aggregates": measure(lambda: load_rollup_aggregates(db[ROLLUP_COLLECTION]), repeat)
+    }
+    df = build_order_frame(orders, menu_items)
+    results["stage: compute_aggregates"] = measure(lambda: compute_aggregates(df), repeat)
+    if backend == "mongo":
+        results["stage: load_pipeline_aggregates"] = measure(lambda: load_pipeline_aggregates(orders, menu), repeat)
+
+    aggregates = compute_aggregates(df)
+    os.makedirs(graph_dir, exist_ok=True)
+    for filename, _, _, key in CHARTS:
+        graph_path = os.path.join(graph_dir, filename)
+        results[f"chart: {filename}"] = measure(lambda: render_chart(filename, aggregates[key], graph_path) is not None, repeat)
+        print(f"  chart {filename}: p50 {results[f'chart: {filename}']['p50_ms']:.1f} ms", flush=True)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+# Print per-scenario changes against a previous run and return the regressed scenarios
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'scenario':<40} {'p50 (ms)':>18} {'p99 (ms)':>18} {'req/s':>18}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        p50 = current["p50_ms"] / max(previous["p50_ms"], 1e-9) - 1
+        p99 = current["p99_ms"] / max(previous["p99_ms"], 1e-9) - 1
+        rps = current["throughput_rps"] / max(previous["throughput_rps"], 1e-9) - 1
+        regressed = p50 > threshold or p99 > threshold or rps < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<40} {current['p50_ms']:>9.1f} ({p50:+6.1%}) {current['p99_ms']:>9.1f} ({p99:+6.1%}) "
+              f"{current['throughput_rps']:>9.1f} ({rps:+6.1%}){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend endpoints, analytics stages and charts")
+    parser.add_argument("--backend", choices=["mongomock", "mongo"], default="mongomock")
+    parser.add_argument("--database", default="restaurant_bench")
+    parser.add_argument("--menu-size", type=int, default=200)
+    parser.add_argument("--line-items", type=int, default=10000, help="total order lines to seed (1k to 10M)")
+    parser.add_argument("--feedback", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint scenario")
+    parser.add_argument("--visualize-requests", type=int, default=10)
+    parser.add_argument("--stage-repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=100, help="orders per /place_orders request")
+    parser.add_argument("--graph-workers", type=int, default=1, help="1 renders in-process so RSS includes rendering")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON from a previous run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change treated as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(42)
+    output_path = os.path.abspath(args.output) if args.output else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    os.environ["MONGO_DB"] = args.database
+    os.environ["GRAPH_WORKERS"] = str(args.graph_workers)
+    # The app writes charts under the working directory
+    workdir = tempfile.mkdtemp(prefix="bench_endpoints_")
+    os.chdir(workdir)
+
+    patcher = None
+    if args.backend == "mongomock":
+        import mongomock
+        patcher = mongomock.patch(servers=(("localhost", 27017),))
+        patcher.start()
+    else:
+        from pymongo import MongoClient
+        MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"), serverSelectionTimeoutMS=5000).drop_database(args.database)
+
+    import app as backend_app
+    flask_app = backend_app.create_app()
+    logging.getLogger().setLevel(logging.WARNING)
+    db = backend_app.db
+
+    try:
+        print(f"Seeding {args.line_items} order lines ({args.backend})...", flush=True)
+        started = time.perf_counter()
+        names, order_count, line_count = seed(db, args.menu_size, args.line_items, args.feedback)
+        print(f"Seeded {order_count} orders / {line_count} lines in {time.perf_counter() - started:.1f}s", flush=True)
+
+        results = bench_stages(db, args.backend, args.stage_repeat, os.path.join(workdir, "stage_graphs"))
+        results.update(bench_endpoints(flask_app, names, args.backend, args.requests, args.visualize_requests, args.batch_size))
+    finally:
+        if args.backend == "mongo":
+            backend_app.client.drop_database(args.database)
+        if patcher is not None:
+            patcher.stop()
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "menu_size": args.menu_size,
+            "orders": order_count,
+            "line_items": line_count,
+            "requests": args.requests,
+            "graph_workers": args.graph_workers
+        },
+        "results": results
+    }
+
+    print(f"\n{'scenario':<40} {'n':>5} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'peak RSS (MB)':>14}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['requests']:>5} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {result['peak_rss_mb']:>14.1f}{'  errors: ' + str(result['errors']) if result['errors'] else ''}")
+
+    if output_path:
+        with open(output_path, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if compare_path:
+        with open(compare_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["meta"].get("line_items") != line_count or baseline["meta"].get("backend") != args.backend:
+            print("\nWarning: baseline was recorded with a different dataset size or backend")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(f"{len(regressions)} scenarios regressed by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
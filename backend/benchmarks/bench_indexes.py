@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indexes import ensure_indexes, INDEXES
+
+# Measure the queries issued by the API before and after ensure_indexes() on
+# seeded data. Needs a running MongoDB; data is seeded into a throwaway database
+# that is dropped afterwards.
+#
+#   python benchmarks/bench_indexes.py --menu-size 20000 --orders 200000 --feedback 100000
+
+def seed(db, menu_size, order_count, feedback_count, chunk_size=10000):
+    start = datetime(2024, 1, 1)
+    names = [f"Item {i}" for i in range(menu_size)]
+    db["restaurant_menu"].insert_many([
+        {"name": name, "category": "Dinner", "cuisine": "Indian", "selling_price": 100.0, "actual_price": 80.0}
+        for name in names
+    ])
+    for offset in range(0, order_count, chunk_size):
+        db["food_order"].insert_many([
+            {
+                "items": random.choices(names, k=3),
+                "datetime": start + timedelta(minutes=random.randint(0, 60 * 24 * 365)),
+                "total_cost": 300.0,
+                "total_loss": 0.0
+            }
+            for _ in range(min(chunk_size, order_count - offset))
+        ])
+    for offset in range(0, feedback_count, chunk_size):
+        db["feedback"].insert_many([
+            {
+                "name": "Guest",
+                "email": "guest@example.com",
+                "feedback": "Great food",
+                "created_at": (start + timedelta(seconds=offset + i)).isoformat()
+            }
+            for i in range(min(chunk_size, feedback_count - offset))
+        ])
+    return names
+
+# The query shapes used by add_item/place_order, delete_items, /visualize filters and get_feedback
+def queries(db, names):
+    menu = db["restaurant_menu"]
+    orders = db["food_order"]
+    feedback = db["feedback"]
+    week_start = datetime(2024, 6, 1)
+    return {
+        "menu find_one by name": lambda: menu.find_one({"name": random.choice(names)}),
+        "menu $in (20 names)": lambda: list(menu.find({"name": {"$in": random.sample(names, 20)}})),
+        "orders last week": lambda: orders.count_documents({"datetime": {"$gte": week_start, "$lt": week_start + timedelta(days=7)}}),
+        "orders containing item": lambda: orders.count_documents({"items": random.choice(names)}),
+        "feedback newest 50": lambda: list(feedback.find().sort("created_at", -1).limit(50))
+    }
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API queries with and without indexes")
+    parser.add_argument("--menu-size", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--feedback", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=25)
+    parser.add_argument("--database", default="restaurant_bench")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(42)
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"), serverSelectionTimeoutMS=5000)
+    client.drop_database(args.database)
+    db = client[args.database]
+
+    try:
+        names = seed(db, args.menu_size, args.orders, args.feedback)
+        for collection_name in INDEXES:
+            db[collection_name].drop_indexes()
+        before = {label: median_ms(query, args.repeat) for label, query in queries(db, names).items()}
+        ensure_indexes(db)
+        after = {label: median_ms(query, args.repeat) for label, query in queries(db, names).items()}
+
+        print(f"{'query':<26} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+        for label in before:
+            print(f"{label:<26} {before[label]:>12.2f} {after[label]:>11.2f} {before[label] / max(after[label], 1e-6):>7.1f}x")
+    finally:
+        client.drop_database(args.database)
+
+if __name__ == "__main__":
+    main()
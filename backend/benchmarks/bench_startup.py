@@ -0,0 +1,70 @@
+import os
+import sys
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Measure worker startup in fresh interpreters and check it against a budget:
+#   import app          what every worker pays before serving anything
+#   create_app()        Flask app, blueprint and MongoClient(connect=False); no MongoDB needed
+#   plotting warm-up    importing visualize and rendering a first figure, i.e. what the
+#                       first /visualize request pays unless WARM_UP_PLOTTING=True
+#
+#   python benchmarks/bench_startup.py --budget-ms 400
+
+def run_python(code, env=None, args=()):
+    result = subprocess.run(
+        [sys.executable, *args, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, **(env or {})}
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Subprocess failed:\n{result.stderr}")
+    return result
+
+# Parse `python -X importtime` output into (module, self_us, cumulative_us) rows
+def import_times(module):
+    rows = []
+    for line in run_python(f"import {module}", args=("-X", "importtime")).stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def timed(code, env=None):
+    return float(run_python(f"import time; started = time.perf_counter(); {code}; print(time.perf_counter() - started)", env).stdout.split()[-1]) * 1000
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import and startup time")
+    parser.add_argument("--budget-ms", type=float, default=400.0, help="import budget for `import app`")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest top-level packages to list")
+    args = parser.parse_args()
+
+    env = {"ENSURE_INDEXES": "Skip", "METRICS": "False"}
+    import_ms = median([timed("import app", env) for _ in range(args.repeat)])
+    create_ms = median([timed("import app; app.create_app()", env) for _ in range(args.repeat)])
+    warm_up_ms = median([timed("import visualize; visualize.warm_up(1)", env) for _ in range(max(1, args.repeat // 2))])
+
+    # Group by top-level package so e.g. numpy's submodules show up as one line
+    packages = {}
+    for name, _, cumulative_us in import_times("app"):
+        top = name.split(".")[0]
+        if name == top and name != "app":
+            packages[top] = max(packages.get(top, 0), cumulative_us)
+    print(f"{'package':<20} {'cumulative import (ms)':>23}")
+    for name, cumulative_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<20} {cumulative_us / 1000:>23.1f}")
+
+    print(f"\n{'import app':<28} {import_ms:>8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"{'import app + create_app()':<28} {create_ms:>8.1f} ms")
+    print(f"{'plotting warm-up':<28} {warm_up_ms:>8.1f} ms")
+    if import_ms > args.budget_ms:
+        raise SystemExit(f"`import app` took {import_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+import httpx
+
+# Drive the same concurrent mix of reads and writes against two running servers
+# and compare throughput and latency percentiles. Start both against the same
+# MongoDB first, e.g.
+#
+#   waitress-serve --port 5001 --threads 16 app:app
+#   hypercorn asgi_app:app --bind 127.0.0.1:5002
+#   python benchmarks/load_compare.py http://127.0.0.1:5001 http://127.0.0.1:5002 --concurrency 200
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+# One request from the mix: mostly menu and feedback reads, some order writes
+def pick_request(names):
+    roll = random.random()
+    if roll < 0.5:
+        return "GET /get_items", "GET", "/get_items?limit=50", None
+    if roll < 0.7:
+        return "GET /api/feedback", "GET", "/api/feedback?limit=50", None
+    return "POST /place_order", "POST", "/place_order", {
+        "items": random.sample(names, min(3, len(names))),
+        "datetime": datetime.now().isoformat()
+    }
+
+async def worker(client, names, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        label, method, path, body = pick_request(names)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            latencies.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+        else:
+            errors[label] = errors.get(label, 0) + 1
+
+async def run_load(base_url, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        response = await client.get("/get_items")
+        response.raise_for_status()
+        names = [item["name"] for item in response.json()["items"]]
+        if not names:
+            raise SystemExit(f"{base_url} has no menu items; add some before running the load test")
+
+        latencies = {}
+        errors = {}
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, names, deadline, latencies, errors) for _ in range(concurrency)))
+    return latencies, errors
+
+def report(base_url, latencies, errors, duration):
+    print(f"\n{base_url}")
+    print(f"{'request':<20} {'ok':>7} {'errors':>7} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for label in sorted(set(latencies) | set(errors)):
+        timings = sorted(latencies.get(label, []))
+        print(f"{label:<20} {len(timings):>7} {errors.get(label, 0):>7} {len(timings) / duration:>8.1f} "
+              f"{percentile(timings, 0.5):>9.1f} {percentile(timings, 0.99):>9.1f}")
+    total = sum(len(timings) for timings in latencies.values())
+    print(f"{'total':<20} {total:>7} {sum(errors.values()):>7} {total / duration:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the WSGI and ASGI servers under concurrent load")
+    parser.add_argument("base_urls", nargs="+", help="servers to compare, e.g. http://127.0.0.1:5001")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per server")
+    args = parser.parse_args()
+
+    random.seed(42)
+    for base_url in args.base_urls:
+        latencies, errors = asyncio.run(run_load(base_url, args.concurrency, args.duration))
+        report(base_url, latencies, errors, args.duration)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import logging
+from itertools import chain
+from pymongo.errors import BulkWriteError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fetch every menu item referenced by a batch of orders with a single $in query
+def fetch_menu_items(menu_collection, item_lists):
+    names = set(chain.from_iterable(item_lists))
+    if not names:
+        return {}
+    return {item["name"]: item for item in menu_collection.find({"name": {"$in": list(names)}})}
+
+# Insert orders without stopping at the first failure.
+# Returns the positions (into docs) that were written and a list of per-document errors.
+def insert_orders(order_collection, docs):
+    if not docs:
+        return [], []
+    try:
+        order_collection.insert_many(docs, ordered=False)
+        return list(range(len(docs))), []
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        failed = {error["index"] for error in write_errors}
+        errors = [{"index": error["index"], "error": error.get("errmsg", "Write failed")} for error in write_errors]
+        logger.warning("Bulk order insert finished with %s write errors", len(errors))
+        return [i for i in range(len(docs)) if i not in failed], errors
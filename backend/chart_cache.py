@@ -0,0 +1,82 @@
+import os
+import glob
+import json
+import hashlib
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when plot code changes in a way that should invalidate every cached chart
+CHART_RENDER_VERSION = "1"
+
+# Key a chart on the aggregate it is drawn from plus everything that affects how it is drawn
+def chart_key(filename, data, params=None):
+    digest = hashlib.sha256()
+    digest.update(f"{CHART_RENDER_VERSION}|{filename}|{sorted((params or {}).items())}|".encode())
+    digest.update(data.to_json(orient="split", date_format="iso").encode())
+    return digest.hexdigest()[:16]
+
+# Content-addressed file name, e.g. top_items.png -> top_items-1a2b3c4d5e6f7a8b.png
+def cached_filename(filename, key):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{key}{ext}"
+
+# File name prefix for charts drawn from filtered data, e.g. "f1a2b3c4d-", so every filter
+# set keeps (and prunes) its own versions instead of evicting the unfiltered charts
+def filter_prefix(filters):
+    if not filters:
+        return ""
+    values = sorted((field, str(value)) for field, value in filters.items())
+    return "f" + hashlib.sha256(repr(values).encode()).hexdigest()[:8] + "-"
+
+# Chart files of the latest background renders, as recorded in the chart scheduler's
+# .charts-<source>-<format>.json state files; /visualize keeps handing them out
+def scheduled_files(graph_dir):
+    files = set()
+    for path in glob.glob(os.path.join(graph_dir, ".charts-*.json")):
+        try:
+            with open(path) as f:
+                files.update(json.load(f).get("images", []))
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to read chart state %s: %s", path, e)
+    return files
+
+# Keep only the newest versions of a chart so the graph directory does not grow forever.
+# A few old versions are kept so URLs handed out moments ago keep working, and versions
+# the chart scheduler still serves are never removed.
+def prune_versions(graph_dir, filename, keep):
+    stem, ext = os.path.splitext(filename)
+    versions = glob.glob(os.path.join(graph_dir, f"{stem}-" + "?" * 16 + ext))
+    versions.sort(key=lambda path: os.path.getmtime(path), reverse=True)
+    pinned = scheduled_files(graph_dir) if len(versions) > keep else set()
+    for path in versions[keep:]:
+        if os.path.basename(path) in pinned:
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning("Failed to prune cached chart %s: %s", path, e)
+
+# Collapse concurrent requests for the same key onto one in-flight future
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    # start() must return a concurrent.futures.Future; it is only called by the first caller
+    def submit(self, key, start):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future
+            future = start()
+            self._calls[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from chart_cache import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are only deduplicated within a process
+    fcntl = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Keeps pre-rendered chart sets fresh in the background so /visualize can answer
+# from the most recent completed render instead of rendering inside the request.
+#
+# A chart set is keyed by (source, image format). The latest render of each set is
+# recorded in a small JSON state file in the graph directory, so every Flask worker
+# serves the same render. A set is stale once it is older than `interval` seconds or
+# at least `order_threshold` orders were placed since it was rendered. A background
+# thread checks the tracked sets every `check_interval` seconds and queues refreshes;
+# requests that see a stale set queue one too.
+#
+# Refreshes are deduplicated within a process (one in-flight job per set) and across
+# processes with an exclusive lock file per set: a worker that cannot take the lock
+# skips the refresh, because another worker is already rendering the same set.
+class ChartScheduler:
+    def __init__(self, render, count_orders, state_dir, interval=300.0, order_threshold=100, check_interval=10.0):
+        self.render = render  # callable(source, image_format) -> list of graph file names
+        self.count_orders = count_orders  # callable() -> current number of orders
+        self.state_dir = state_dir
+        self.interval = interval
+        self.order_threshold = order_threshold
+        self.check_interval = check_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart-refresh")
+        self._flights = SingleFlight()
+        self._tracked = set()
+        self._tracked_lock = threading.Lock()
+        self._states = {}  # key -> (state file mtime, state)
+        self._order_count = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "refreshes": 0,
+            "failed": 0,
+            "skipped_fresh": 0,
+            "skipped_locked": 0,
+            "last_refresh_ms": 0.0
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chart-scheduler", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            logger.info(
+                "Chart scheduler started (interval %ss, order threshold %s, check every %ss)",
+                self.interval, self.order_threshold, self.check_interval
+            )
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(self.check_interval + 1)
+        self._executor.shutdown(wait=False)
+        self._thread = None
+
+    # Keep a chart set fresh from now on
+    def track(self, source, image_format):
+        with self._tracked_lock:
+            self._tracked.add((source, image_format))
+
+    # Most recent completed render of a chart set, or None if it was never rendered
+    def latest(self, source, image_format):
+        path = self._state_path(source, image_format)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._states.get((source, image_format))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to read chart state %s: %s", path, e)
+            return None
+        self._states[(source, image_format)] = (mtime, state)
+        return state
+
+    # Chart files of a render that are gone from the graph directory
+    def missing_images(self, state):
+        return [name for name in state["images"] if not os.path.exists(os.path.join(self.state_dir, name))]
+
+    def is_stale(self, state):
+        if self.missing_images(state):
+            return True
+        if time.time() - state["generated_ts"] >= self.interval:
+            return True
+        return bool(
+            self.order_threshold and self._order_count is not None
+            and self._order_count - state["order_count"] >= self.order_threshold
+        )
+
+    # Queue a refresh of a chart set and return its future; a refresh that is already
+    # queued or running is shared. force=True renders even if the set is still fresh.
+    def refresh(self, source, image_format, force=False):
+        self.track(source, image_format)
+        return self._flights.submit(
+            (source, image_format, force), lambda: self._executor.submit(self._refresh, source, image_format, force)
+        )
+
+    # Return (state, stale) for a chart set. Stale sets are returned as they are and
+    # refreshed in the background; a set that was never rendered, or whose files were
+    # removed from the graph directory, is rendered first.
+    def get(self, source, image_format):
+        self.track(source, image_format)
+        state = self.latest(source, image_format)
+        if state is not None and self.missing_images(state):
+            logger.warning("Chart set %s/%s is missing files, rendering it again", source, image_format)
+            state = None
+        if state is None:
+            state = self.refresh(source, image_format).result()
+            return state, False
+        stale = self.is_stale(state)
+        if stale:
+            self.refresh(source, image_format)
+        return state, stale
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._tracked_lock:
+            tracked = sorted(self._tracked)
+        stats["tracked"] = [
+            {"source": source, "format": image_format, "generated_at": (self.latest(source, image_format) or {}).get("generated_at")}
+            for source, image_format in tracked
+        ]
+        stats["order_count"] = self._order_count
+        return stats
+
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _state_path(self, source, image_format):
+        return os.path.join(self.state_dir, f".charts-{source}-{image_format}.json")
+
+    # Exclusive lock shared by every process using the same graph directory.
+    # Yields False when blocking=False and another process holds it.
+    @contextmanager
+    def _lock_file(self, source, image_format, blocking):
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.state_dir, f".charts-{source}-{image_format}.lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # Render a chart set unless another worker is already doing it or just did.
+    # Without any render to fall back on, wait for the other worker instead of skipping.
+    def _refresh(self, source, image_format, force):
+        with self._lock_file(source, image_format, blocking=self.latest(source, image_format) is None) as locked:
+            if not locked:
+                self._bump("skipped_locked")
+                logger.info("Chart set %s/%s is being refreshed by another worker", source, image_format)
+                return self.latest(source, image_format)
+            state = self.latest(source, image_format)
+            if state is not None and not force and not self.is_stale(state):
+                self._bump("skipped_fresh")
+                return state
+
+            started = time.perf_counter()
+            try:
+                order_count = self.count_orders()
+                images = self.render(source, image_format)
+            except Exception as e:
+                self._bump("failed")
+                logger.error("Chart refresh for %s/%s failed: %s", source, image_format, e, exc_info=True)
+                return state
+            now = datetime.now(timezone.utc)
+            state = {
+                "source": source,
+                "format": image_format,
+                "images": images,
+                "generated_at": now.isoformat(),
+                "generated_ts": now.timestamp(),
+                "order_count": order_count,
+                "render_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            # Write then rename so other workers never read a partial file
+            path = self._state_path(source, image_format)
+            with open(path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(path + ".tmp", path)
+            with self._stats_lock:
+                self._stats["refreshes"] += 1
+                self._stats["last_refresh_ms"] = state["render_ms"]
+            logger.info("Refreshed chart set %s/%s in %sms", source, image_format, state["render_ms"])
+            return state
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                if self.order_threshold:
+                    self._order_count = self.count_orders()
+                with self._tracked_lock:
+                    tracked = list(self._tracked)
+                for source, image_format in tracked:
+                    state = self.latest(source, image_format)
+                    if state is None or self.is_stale(state):
+                        self.refresh(source, image_format)
+            except Exception as e:
+                logger.error("Chart scheduler check failed: %s", e, exc_info=True)
+
+# Helper function to build a scheduler from CHART_REFRESH_* environment variables
+def chart_scheduler_from_env(render, count_orders, state_dir):
+    return ChartScheduler(
+        render, count_orders, state_dir,
+        interval=float(os.getenv("CHART_REFRESH_INTERVAL", 300)),
+        order_threshold=int(os.getenv("CHART_REFRESH_ORDERS", 100)),
+        check_interval=float(os.getenv("CHART_REFRESH_CHECK_INTERVAL", 10))
+    )
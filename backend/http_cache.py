@@ -0,0 +1,69 @@
+import os
+import re
+import gzip
+import hashlib
+import logging
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Compress JSON responses of at least COMPRESS_MIN_SIZE bytes (COMPRESS_RESPONSES=False disables it)
+COMPRESS_RESPONSES = os.getenv("COMPRESS_RESPONSES", "True") == "True"
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_MIMETYPES = ("application/json",)
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+# Chart files named by chart_cache.cached_filename never change once written
+CONTENT_ADDRESSED = re.compile(r"-([0-9a-f]{16})\.[A-Za-z0-9.]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# The content key of a content-addressed chart file name, or None
+def content_key(filename):
+    match = CONTENT_ADDRESSED.search(filename)
+    return match.group(1) if match else None
+
+# Weak ETag for a JSON view of a versioned resource: the version plus the query arguments.
+# Weak because the same JSON may be sent with different content encodings.
+def versioned_etag(name, version, args):
+    digest = hashlib.sha1(repr(sorted(args.items(multi=True))).encode()).hexdigest()[:8]
+    return f"{name}-{version}-{digest}"
+
+# Helper function to check If-None-Match before doing any work for the response
+def not_modified(request, etag):
+    return request.if_none_match.contains_weak(etag)
+
+# Pick the best encoding the client accepts: brotli when available, then gzip
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+# after_request hook compressing buffered JSON bodies; streamed responses are left alone
+def compress_response(request, response):
+    if response.mimetype not in COMPRESS_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
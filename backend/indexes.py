@@ -0,0 +1,100 @@
+import argparse
+import logging
+from pymongo import ASCENDING, TEXT
+from pymongo.errors import OperationFailure
+from rollups import ROLLUP_COLLECTION
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Indexes the backend relies on: collection -> [(keys, options)].
+# Text index fields are listed in name order, as they are read back from MongoDB.
+INDEXES = {
+    "restaurant_menu": [
+        ([("name", ASCENDING)], {"unique": True})  # add_item duplicate check, order validation, delete_items $in
+    ],
+    "food_order": [
+        ([("datetime", ASCENDING)], {}),  # /visualize time range filters
+        ([("items", ASCENDING)], {})  # /visualize cuisine and category filters
+    ],
+    "feedback": [
+        ([("created_at", ASCENDING), ("_id", ASCENDING)], {}),  # /api/feedback keyset pagination
+        ([("email", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], {}),  # /api/feedback/search email filter
+        ([("feedback", TEXT), ("name", TEXT)], {"name": "feedback_text", "weights": {"feedback": 3, "name": 1}})  # /api/feedback/search q
+    ],
+    ROLLUP_COLLECTION: [
+        ([("dimension", ASCENDING), ("key", ASCENDING)], {"unique": True})  # rollup upserts
+    ]
+}
+
+# Helper function to turn an index's key into the form used in INDEXES. MongoDB stores
+# text indexes under _fts/_ftsx with the indexed fields in weights.
+def _index_keys(index):
+    keys = []
+    for field, direction in index["key"]:
+        if field == "_fts":
+            keys.extend((name, TEXT) for name in sorted(index.get("weights", {})))
+        elif field != "_ftsx":
+            keys.append((field, direction if isinstance(direction, str) else int(direction)))
+    return keys
+
+# Helper function to list the key patterns already indexed on a collection with
+# whether each index is unique
+def _existing_indexes(collection):
+    return [(_index_keys(index), index.get("unique", False)) for index in collection.index_information().values()]
+
+# Make sure every index in INDEXES exists. Safe to call repeatedly: indexes that are
+# already present are left alone. With create=False nothing is built and the report
+# only says which indexes are missing. An index on the right keys with a different
+# unique option is a conflict: MongoDB will not build a second one, and it is not
+# dropped here because a non-unique menu name index means add_item allows duplicates.
+def ensure_indexes(db, create=True):
+    report = []
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = _existing_indexes(collection)
+        for keys, options in indexes:
+            unique = options.get("unique", False)
+            entry = {"collection": collection_name, "keys": keys, "unique": unique}
+            matches = [existing_unique for existing_keys, existing_unique in existing if existing_keys == keys]
+            if unique in matches:
+                entry["status"] = "present"
+            elif matches:
+                entry["status"] = "conflict"
+                entry["error"] = f"existing index has unique={matches[0]}, expected unique={unique}"
+            elif not create:
+                entry["status"] = "missing"
+            else:
+                try:
+                    entry["name"] = collection.create_index(keys, **options)
+                    entry["status"] = "created"
+                except OperationFailure as e:
+                    # e.g. duplicate menu names prevent the unique index from being built
+                    entry["status"] = "failed"
+                    entry["error"] = str(e)
+            report.append(entry)
+
+    for entry in report:
+        if entry["status"] == "created":
+            logger.info("Created index on %s: %s", entry['collection'], entry['keys'])
+        elif entry["status"] == "missing":
+            logger.warning("Missing index on %s: %s", entry['collection'], entry['keys'])
+        elif entry["status"] == "conflict":
+            logger.error("Conflicting index on %s: %s - %s", entry['collection'], entry['keys'], entry['error'])
+        elif entry["status"] == "failed":
+            logger.error("Failed to create index on %s: %s - %s", entry['collection'], entry['keys'], entry['error'])
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    from tenants import cli_database
+    parser = argparse.ArgumentParser(description="Create the indexes the API queries rely on")
+    parser.add_argument("--check", action="store_true", help="only report missing indexes")
+    parser.add_argument("--tenant", help="outlet name from TENANT_URIS or a MongoDB URI; defaults to MONGO_URI/MONGO_DB")
+    args = parser.parse_args()
+    results = ensure_indexes(cli_database(args.tenant), create=not args.check)
+    for entry in results:
+        print(f"{entry['status']:>8}  {entry['collection']}  {entry['keys']}")
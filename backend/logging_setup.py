@@ -0,0 +1,120 @@
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed with extra= and is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+# Whether INFO/DEBUG records of the current request are kept (see RouteSampler)
+_request_sampled = contextvars.ContextVar("log_request_sampled", default=True)
+
+_listener = None
+_configured = False
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+# One JSON object per line: time, level, logger, message and any extra= fields
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+# The usual text format with extra= fields appended as key=value pairs
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+# Whether the current request's INFO logs are kept; lets callers skip building records
+def request_sampled():
+    return _request_sampled.get()
+
+# Drops INFO and DEBUG records of requests that were not sampled; warnings and errors always pass
+class SampledRequestFilter(logging.Filter):
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or _request_sampled.get()
+
+# Decides per request whether its INFO logs are kept, with a rate per route.
+# Rates come from LOG_SAMPLE_RATES, e.g. "/get_items=0.01,/graphs/<path:filename>=0",
+# keyed by Flask URL rule; other routes use LOG_SAMPLE_RATE (default 1.0).
+class RouteSampler:
+    def __init__(self, default_rate=1.0, rates=None):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+
+    def start_request(self, route):
+        rate = self.rates.get(route, self.default_rate)
+        sampled = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+        return _request_sampled.set(sampled)
+
+    def finish_request(self, token):
+        _request_sampled.reset(token)
+
+# Helper function to parse "route=rate,route=rate"
+def parse_sample_rates(value):
+    rates = {}
+    for entry in filter(None, (part.strip() for part in (value or "").split(","))):
+        route, _, rate = entry.rpartition("=")
+        try:
+            rates[route] = float(rate)
+        except ValueError:
+            logging.getLogger(__name__).warning("Ignoring invalid log sample rate: %s", entry)
+    return rates
+
+def route_sampler_from_env():
+    return RouteSampler(
+        default_rate=float(os.getenv("LOG_SAMPLE_RATE", 1.0)),
+        rates=parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+    )
+
+# Configure the root logger from the environment:
+#   LOG_LEVEL=INFO       root level
+#   LOG_FORMAT=text      or json for one JSON object per line
+#   LOG_QUEUE=False      True hands records to a background thread that formats and writes
+#                        them, so request threads never block on a slow log sink (a pipe to
+#                        a container log driver, a network filesystem). It costs some CPU
+#                        per record, so leave it off when stderr is a fast local file.
+# Safe to call more than once; only the first call configures logging.
+def configure_logging():
+    global _listener, _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    if os.getenv("LOG_QUEUE", "False") == "True":
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        handler = QueueHandler(log_queue)
+    # Sampled-out records are dropped before they are formatted or queued
+    handler.addFilter(SampledRequestFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
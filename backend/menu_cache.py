@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# In-process cache of the restaurant menu as an immutable MenuIndex.
+# The whole menu is loaded with a single query on first use and dropped by
+# invalidate() whenever the menu changes in this process. MENU_CACHE_TTL
+# (seconds) bounds how stale the cache can get when other workers edit the menu.
+# Callers keep using the index they were handed even if it is replaced meanwhile.
+class MenuCache:
+    def __init__(self, menu_collection, ttl=None, meta_collection=None):
+        self.menu_collection = menu_collection
+        self.meta_collection = meta_collection  # Source of the menu version stamped on each index
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def _expired(self):
+        return self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+
+    # Must be called with the lock held
+    def _ensure_loaded(self):
+        if self._index is not None and not self._expired():
+            return True
+        # Imported here so numpy is loaded on first use rather than at startup
+        from menu_index import MenuIndex
+        # Read the version first so the index is never stamped newer than its contents
+        version = menu_version(self.meta_collection) if self.meta_collection is not None else self.loads + 1
+        self._index = MenuIndex.from_items(self.menu_collection.find(), version)
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        logger.info("Loaded %s menu items into cache (version %s)", len(self._index), version)
+        return False
+
+    # The current MenuIndex
+    def index(self):
+        with self._lock:
+            if self._ensure_loaded():
+                self.hits += 1
+            else:
+                self.misses += 1
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+            self.invalidations += 1
+        logger.info("Menu cache invalidated")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "invalidations": self.invalidations,
+                "size": len(self._index) if self._index is not None else 0,
+                "version": self._index.version if self._index is not None else None,
+                "ttl": self.ttl
+            }
+
+# Helper function to read the cache TTL from the environment (unset or 0 disables expiry)
+def menu_cache_ttl_from_env():
+    ttl = float(os.getenv("MENU_CACHE_TTL", "0"))
+    return ttl if ttl > 0 else None
+
+# Menu version counter shared by all workers. add_item and delete_items bump it after
+# changing the menu, so a version read before the menu always tags a menu at least
+# that new. /get_items uses it as its ETag and answers unchanged polls without a menu query.
+META_COLLECTION = "app_meta"
+MENU_VERSION_FILTER = {"_id": "menu_version"}
+MENU_VERSION_BUMP = {"$inc": {"version": 1}}
+
+def bump_menu_version(meta_collection):
+    meta_collection.update_one(MENU_VERSION_FILTER, MENU_VERSION_BUMP, upsert=True)
+
+def menu_version(meta_collection):
+    doc = meta_collection.find_one(MENU_VERSION_FILTER, {"version": 1})
+    return doc["version"] if doc else 0
@@ -0,0 +1,129 @@
+import logging
+from itertools import chain
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Immutable, array-backed view of the menu shared by order pricing, the rollups and the
+# analytics frame. Item names are interned to codes 0..n-1 and prices, per-unit loss and
+# profit and cuisine codes are parallel NumPy arrays, so pricing a batch of orders is a
+# gather plus a bincount. A new index is built whenever the menu changes (see MenuCache);
+# version is the menu version it was built from. ids are the menu documents' _id values.
+class MenuIndex:
+    __slots__ = (
+        "version", "ids", "names", "codes", "cuisines", "cuisine_codes", "selling_prices", "actual_prices",
+        "unit_losses", "unit_profits", "_cuisine_of", "_profit_of", "_price_of", "_actual_of", "_loss_of"
+    )
+
+    def __init__(self, names, cuisines, selling_prices, actual_prices, version=None, ids=None):
+        self.version = version
+        self.names = tuple(names)
+        self.ids = tuple(ids) if ids is not None else (None,) * len(self.names)
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        cuisine_names, cuisine_codes = np.unique(np.array(cuisines, dtype=object), return_inverse=True)
+        self.cuisines = tuple(cuisine_names)
+        self.cuisine_codes = _frozen(cuisine_codes.astype(np.int32))
+        self.selling_prices = _frozen(np.array(selling_prices, dtype=np.float64))
+        self.actual_prices = _frozen(np.array(actual_prices, dtype=np.float64))
+        self.unit_losses = _frozen(np.clip(self.actual_prices - self.selling_prices, 0, None))
+        self.unit_profits = _frozen(self.selling_prices - self.actual_prices)
+        # Plain tuples for per-line lookups, where indexing a NumPy array is slower. Single
+        # orders (order_totals, snapshot_lines) loop over these rather than gathering by a
+        # code array: at order sizes the gather and tolist() cost more than they save
+        # (about 7us vs 0.6us for three items, and 8ms vs 4ms snapshotting 2000 orders).
+        # Batches are priced with one gather plus a bincount in price().
+        self._cuisine_of = tuple(cuisines)
+        self._profit_of = tuple(self.unit_profits.tolist())
+        self._price_of = tuple(self.selling_prices.tolist())
+        self._actual_of = tuple(self.actual_prices.tolist())
+        self._loss_of = tuple(self.unit_losses.tolist())
+
+    # Build an index from menu documents, skipping items with missing or invalid fields
+    @classmethod
+    def from_items(cls, menu_items, version=None):
+        ids, names, cuisines, selling_prices, actual_prices = [], [], [], [], []
+        seen = set()
+        for item in menu_items:
+            if "name" not in item or "cuisine" not in item or "selling_price" not in item or "actual_price" not in item:
+                logger.warning("Skipping menu item with missing fields: %s", item)
+                continue
+            if not isinstance(item["name"], str) or not isinstance(item["cuisine"], str):
+                logger.warning("Skipping menu item with invalid name or cuisine type: %s", item)
+                continue
+            try:
+                selling_price = float(item["selling_price"])
+                actual_price = float(item["actual_price"])
+            except (ValueError, TypeError) as e:
+                logger.warning("Skipping menu item with invalid prices: %s - %s", item, e)
+                continue
+            if item["name"] in seen:
+                continue
+            seen.add(item["name"])
+            ids.append(item.get("_id"))
+            names.append(item["name"])
+            cuisines.append(item["cuisine"])
+            selling_prices.append(selling_price)
+            actual_prices.append(actual_price)
+        return cls(names, cuisines, selling_prices, actual_prices, version, ids)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.codes
+
+    def code(self, name):
+        return self.codes.get(name, -1)
+
+    # Codes for a sequence of names, -1 for names not on the menu
+    def encode(self, names):
+        return np.fromiter((self.codes.get(name, -1) for name in names), dtype=np.int32, count=len(names))
+
+    def cuisine(self, code):
+        return self._cuisine_of[code]
+
+    def unit_profit(self, code):
+        return self._profit_of[code]
+
+    # (total_cost, total_loss) of one order, summed over the per-line tuples; every name
+    # must be on the menu
+    def order_totals(self, names):
+        total_cost = 0.0
+        total_loss = 0.0
+        for name in names:
+            code = self.codes[name]
+            total_cost += self._price_of[code]
+            total_loss += self._loss_of[code]
+        return total_cost, total_loss
+
+    # Per-line price snapshots stored on an order next to its items, so analytics keep the
+    # prices and cuisine the order was placed at; every name must be on the menu
+    def snapshot_lines(self, names):
+        lines = []
+        for name in names:
+            code = self.codes[name]
+            lines.append({
+                "item_id": self.ids[code],
+                "selling_price": self._price_of[code],
+                "actual_price": self._actual_of[code],
+                "cuisine": self._cuisine_of[code]
+            })
+        return lines
+
+    # total_cost and total_loss arrays for many orders at once; every name must be on the menu
+    def price(self, item_lists):
+        lengths = np.fromiter((len(items) for items in item_lists), dtype=np.int64, count=len(item_lists))
+        total_items = int(lengths.sum())
+        if total_items == 0:
+            zeros = np.zeros(len(item_lists))
+            return zeros, zeros
+        codes = np.fromiter((self.codes[name] for name in chain.from_iterable(item_lists)), dtype=np.int32, count=total_items)
+        order_index = np.repeat(np.arange(len(item_lists)), lengths)
+        total_cost = np.bincount(order_index, weights=self.selling_prices[codes], minlength=len(item_lists))
+        total_loss = np.bincount(order_index, weights=self.unit_losses[codes], minlength=len(item_lists))
+        return total_cost, total_loss
+
+def _frozen(values):
+    values.setflags(write=False)
+    return values
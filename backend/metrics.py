@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import bisect
+import threading
+import contextvars
+from pymongo import monitoring
+
+# In-process metrics exposed in the Prometheus text format on /metrics.
+# Disabled unless METRICS=True; when disabled stage() hands back a shared no-op
+# timer, no MongoDB listener is registered and the request hooks are not installed.
+METRICS_ENABLED = os.getenv("METRICS", "False") == "True"
+# Also report the timings of each request in a Server-Timing response header
+SERVER_TIMING = METRICS_ENABLED and os.getenv("SERVER_TIMING", "False") == "True"
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _label_text(label_names, labels):
+    if not label_names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, labels)) + "}"
+
+class Counter:
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labels, list(counts), total) for labels, (counts, total) in self._values.items())
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _label_text(self.label_names + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, labels)} {cumulative}")
+        return lines
+
+REQUEST_SECONDS = Histogram("restaurant_request_seconds", "Request handling time by route", ("method", "route", "status"))
+STAGE_SECONDS = Histogram("restaurant_stage_seconds", "Time spent in each analytics stage", ("stage",))
+CHART_SECONDS = Histogram("restaurant_chart_seconds", "Chart render time by chart and phase (plot or savefig)", ("chart", "phase"))
+CHART_CACHE = Counter("restaurant_chart_cache_total", "Chart cache lookups by result", ("result",))
+MONGO_COMMANDS = Counter("restaurant_mongo_commands_total", "MongoDB commands by name and outcome", ("command", "status"))
+MONGO_SECONDS = Histogram("restaurant_mongo_command_seconds", "MongoDB command round-trip time", ("command",))
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, CHART_SECONDS, CHART_CACHE, MONGO_COMMANDS, MONGO_SECONDS]
+
+# (name, seconds) pairs collected for the Server-Timing header of the current request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# Helper function to add a timing to the current request, if one is being collected
+def record_timing(name, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe((self.name,), elapsed)
+        record_timing(self.name, elapsed)
+        return False
+
+# Time a block as an analytics stage: `with stage("fetch_rollups"): ...`
+def stage(name):
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(name)
+
+# Record the plot/savefig split reported by a chart render (once per render)
+def observe_chart(filename, timings):
+    for phase, seconds in timings.items():
+        CHART_SECONDS.observe((filename, phase), seconds)
+
+# Add a chart's render phases to the current request's timings
+def record_chart_timings(filename, timings):
+    for phase, seconds in timings.items():
+        record_timing(f"chart_{os.path.splitext(filename)[0]}_{phase}", seconds)
+
+# Counts and times every MongoDB command. pymongo calls the listener on the thread
+# that issued the command, so the per-request totals land on the right request.
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, status):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.inc((event.command_name, status))
+        MONGO_SECONDS.observe((event.command_name,), seconds)
+        record_timing("mongo", seconds)
+
+# Listeners to pass to MongoClient(event_listeners=...)
+def command_listeners():
+    return [MongoCommandMetrics()] if METRICS_ENABLED else []
+
+# Start collecting timings for a request; returns the token for finish_request()
+def start_request():
+    return _request_timings.set([]), time.perf_counter()
+
+# Record the request latency and return the Server-Timing header value (or None)
+def finish_request(state, method, route, status):
+    token, started = state
+    elapsed = time.perf_counter() - started
+    timings = _request_timings.get()
+    _request_timings.reset(token)
+    REQUEST_SECONDS.observe((method, route, str(status)), elapsed)
+    if not SERVER_TIMING:
+        return None
+    return server_timing_header(timings, elapsed)
+
+# Collapse repeated names (e.g. one entry per MongoDB command) into a total and a count
+def server_timing_header(timings, total):
+    totals = {}
+    for name, seconds in timings or []:
+        entry = totals.setdefault(re.sub(r"[^A-Za-z0-9_-]", "_", name), [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    parts = [
+        f'{name};dur={seconds * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else "")
+        for name, (seconds, count) in totals.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
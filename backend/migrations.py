@@ -0,0 +1,65 @@
+import argparse
+import logging
+from pymongo import UpdateOne
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Convert food_order.datetime values stored as ISO strings into BSON dates so
+# range queries can use the datetime index. Runs server-side in one update;
+# strings MongoDB cannot parse are left untouched and reported.
+def migrate_order_datetimes(order_collection):
+    result = order_collection.update_many(
+        {"datetime": {"$type": "string"}},
+        [{"$set": {"datetime": {"$dateFromString": {"dateString": "$datetime", "onError": "$datetime"}}}}]
+    )
+    remaining = order_collection.count_documents({"datetime": {"$type": "string"}})
+    logger.info("Converted %s order datetimes to dates, %s unparseable strings left", result.modified_count, remaining)
+    if remaining:
+        logger.warning("%s orders still have unparseable datetime strings", remaining)
+    return result.modified_count, remaining
+
+# Store per-line price snapshots (see MenuIndex.snapshot_lines) on orders written before
+# orders carried them, so analytics stop joining those orders to the menu. Earlier prices
+# are not recorded anywhere, so they are snapshotted at the current menu prices, which is
+# what analytics already used. Orders with items no longer on the menu are left as they
+# are. Safe to rerun: only orders without snapshots are updated.
+def migrate_order_snapshots(db, batch_size=1000):
+    from menu_index import MenuIndex
+    menu = MenuIndex.from_items(db["restaurant_menu"].find())
+    order_collection = db["food_order"]
+    migrated = 0
+    skipped = 0
+    operations = []
+    for order in order_collection.find({"lines": {"$exists": False}}, {"items": 1}, batch_size=batch_size):
+        items = order.get("items")
+        if not isinstance(items, list) or not all(isinstance(item, str) and item in menu for item in items):
+            skipped += 1
+            continue
+        operations.append(UpdateOne({"_id": order["_id"], "lines": {"$exists": False}}, {"$set": {"lines": menu.snapshot_lines(items)}}))
+        if len(operations) >= batch_size:
+            migrated += order_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        migrated += order_collection.bulk_write(operations, ordered=False).modified_count
+    logger.info("Stored price snapshots on %s orders", migrated)
+    if skipped:
+        logger.warning("%s orders reference items no longer on the menu and were left without snapshots", skipped)
+    return migrated, skipped
+
+MIGRATIONS = {
+    "datetimes": lambda db: migrate_order_datetimes(db["food_order"]),
+    "snapshots": migrate_order_snapshots
+}
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    from tenants import cli_database
+    parser = argparse.ArgumentParser(description="Run a one-off data migration")
+    parser.add_argument("migration", choices=list(MIGRATIONS))
+    parser.add_argument("--tenant", help="outlet name from TENANT_URIS or a MongoDB URI; defaults to MONGO_URI/MONGO_DB")
+    args = parser.parse_args()
+    MIGRATIONS[args.migration](cli_database(args.tenant))
@@ -0,0 +1,361 @@
+import io
+import os
+import csv
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo import MongoClient
+from bulk_orders import fetch_menu_items, insert_orders
+from menu_index import MenuIndex
+from rollups import ROLLUP_COLLECTION, record_orders, order_datetime, order_lines
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet is optional: pip install pyarrow
+    pa = None
+    pq = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Export and import of order history, one row per order line:
+#   order_id, datetime, item              the order (rows of one order are adjacent)
+#   category, cuisine, selling_price,     cuisine and prices from the line's price snapshot,
+#   actual_price                          the rest from the menu at export time (empty when
+#                                         the item is no longer on the menu)
+#   order_total_cost, order_total_loss    the stored order totals
+#
+#   python order_io.py export orders.csv [--format parquet] [--start ISO] [--end ISO]
+#   python order_io.py import orders.parquet [--chunk-size 100000] [--no-rollups]
+EXPORT_COLUMNS = [
+    "order_id", "datetime", "item", "category", "cuisine",
+    "selling_price", "actual_price", "order_total_cost", "order_total_loss"
+]
+EXPORT_FORMATS = ("csv", "parquet")
+IMPORT_COLUMNS = ["order_id", "datetime", "item"]
+# Optional import columns: a line with both prices keeps them as its price snapshot
+SNAPSHOT_COLUMNS = ["selling_price", "actual_price", "cuisine"]
+DEFAULT_CHUNK_SIZE = 50000
+MAX_IMPORT_ERRORS = 100
+
+def parquet_available():
+    return pa is not None
+
+# Build the order query and the item names in scope from /visualize-style filters.
+# With cuisine or category filters only lines for matching items are exported.
+def export_query(menu_collection, filters=None):
+    filters = filters or {}
+    query = {}
+    if filters.get("start") or filters.get("end"):
+        query["datetime"] = {}
+        if filters.get("start"):
+            query["datetime"]["$gte"] = filters["start"]
+        if filters.get("end"):
+            query["datetime"]["$lt"] = filters["end"]
+    item_names = None
+    menu_query = {field: filters[field] for field in ("cuisine", "category") if filters.get(field)}
+    if menu_query:
+        item_names = {item["name"] for item in menu_collection.find(menu_query, {"name": 1})}
+        query["items"] = {"$in": list(item_names)}
+    return query, item_names
+
+# Stream orders joined with the menu as column dicts of about chunk_size rows each.
+# Only one chunk and the menu are held in memory at a time.
+def export_chunks(order_collection, menu_collection, filters=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    query, item_names = export_query(menu_collection, filters)
+    menu = {item["name"]: item for item in menu_collection.find({}, {"_id": 0})}
+    cursor = order_collection.find(query, {"items": 1, "lines": 1, "datetime": 1, "total_cost": 1, "total_loss": 1}, batch_size=min(chunk_size, 10000))
+
+    columns = {name: [] for name in EXPORT_COLUMNS}
+    for order in cursor:
+        try:
+            when = order_datetime(order.get("datetime"))
+        except ValueError:
+            when = None
+        order_id = str(order["_id"])
+        lines = order_lines(order)
+        for position, name in enumerate(order.get("items", [])):
+            if item_names is not None and name not in item_names:
+                continue
+            item = menu.get(name, {})
+            priced = lines[position] if lines is not None else item
+            columns["order_id"].append(order_id)
+            columns["datetime"].append(when)
+            columns["item"].append(name)
+            columns["category"].append(item.get("category"))
+            columns["cuisine"].append(priced.get("cuisine"))
+            columns["selling_price"].append(priced.get("selling_price"))
+            columns["actual_price"].append(priced.get("actual_price"))
+            columns["order_total_cost"].append(order.get("total_cost"))
+            columns["order_total_loss"].append(order.get("total_loss"))
+        if len(columns["order_id"]) >= chunk_size:
+            yield columns
+            columns = {name: [] for name in EXPORT_COLUMNS}
+    if columns["order_id"]:
+        yield columns
+
+def csv_stream(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for columns in chunks:
+        columns["datetime"] = [when.isoformat() if when else None for when in columns["datetime"]]
+        writer.writerows(zip(*(columns[name] for name in EXPORT_COLUMNS)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# File-like object the Parquet writer writes into; drain() hands back what was written so far
+class _ParquetSink:
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+def _parquet_schema():
+    return pa.schema([
+        ("order_id", pa.string()), ("datetime", pa.timestamp("ms")), ("item", pa.string()),
+        ("category", pa.string()), ("cuisine", pa.string()),
+        ("selling_price", pa.float64()), ("actual_price", pa.float64()),
+        ("order_total_cost", pa.float64()), ("order_total_loss", pa.float64())
+    ])
+
+# One Parquet row group per chunk, yielded as soon as it is encoded
+def parquet_stream(chunks):
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = _parquet_schema()
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for columns in chunks:
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def export_stream(order_collection, menu_collection, export_format="csv", filters=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    chunks = export_chunks(order_collection, menu_collection, filters, chunk_size)
+    if export_format == "parquet":
+        return parquet_stream(chunks)
+    return csv_stream(chunks)
+
+# Read the order_id, datetime and item columns of a CSV or Parquet file in chunks, plus
+# the snapshot columns the file has
+def read_import_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    wanted = IMPORT_COLUMNS + SNAPSHOT_COLUMNS
+    if path.endswith(".parquet"):
+        if pq is None:
+            raise RuntimeError("Parquet import needs pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in wanted if name in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            frame = batch.to_pandas()
+            frame["order_id"] = frame["order_id"].astype(str)
+            yield frame
+    else:
+        yield from pd.read_csv(
+            path, chunksize=chunk_size, usecols=lambda name: name in wanted,
+            dtype={"order_id": str, "item": str, "datetime": str, "cuisine": str}
+        )
+
+# Snapshot lines and totals of one order from its rows' prices and cuisine; rows without
+# both prices are priced from menu, and a missing cuisine is taken from it
+def _file_snapshot(items, snapshotted, selling_prices, actual_prices, cuisines, menu):
+    lines = []
+    for name, snapshot, selling_price, actual_price, cuisine in zip(items, snapshotted, selling_prices, actual_prices, cuisines):
+        menu_line = menu.snapshot_lines([name])[0] if name in menu.codes else None
+        if not snapshot:
+            lines.append(menu_line)
+            continue
+        lines.append({
+            "item_id": menu_line["item_id"] if menu_line else None,
+            "selling_price": selling_price,
+            "actual_price": actual_price,
+            "cuisine": cuisine if isinstance(cuisine, str) else (menu_line["cuisine"] if menu_line else None)
+        })
+    total_cost = sum(line["selling_price"] for line in lines)
+    total_loss = sum(max(0.0, line["actual_price"] - line["selling_price"]) for line in lines)
+    return lines, total_cost, total_loss
+
+# Regroup chunks so an order split across a chunk boundary is handled as a whole
+def _whole_orders(chunks):
+    carry = None
+    for frame in chunks:
+        if carry is not None:
+            frame = pd.concat([carry, frame], ignore_index=True)
+        if frame.empty:
+            continue
+        last = frame["order_id"].iat[-1]
+        tail = frame["order_id"] == last
+        carry = frame[tail]
+        if not tail.all():
+            yield frame[~tail]
+    if carry is not None and not carry.empty:
+        yield carry
+
+# Validate and price the orders in one chunk. Lines with prices in the file (as written by
+# export) keep them as their snapshot, even for items no longer on the menu; the other
+# lines must be on the menu and are priced from it.
+# Returns (docs, errors, MenuIndex of the chunk's items).
+def _orders_from_frame(frame, menu_collection):
+    errors = []
+    missing = frame["order_id"].isna() | frame["item"].isna()
+    for order_id in frame.loc[missing, "order_id"].dropna().unique():
+        errors.append({"order_id": order_id, "error": "Missing item"})
+    frame = frame[~frame["order_id"].isin(frame.loc[missing, "order_id"]) & ~missing]
+
+    menu = MenuIndex.from_items(fetch_menu_items(menu_collection, [frame["item"].unique().tolist()]).values())
+    has_snapshots = "selling_price" in frame.columns and "actual_price" in frame.columns
+    snapshotted = (frame["selling_price"].notna() & frame["actual_price"].notna()) if has_snapshots else pd.Series(False, index=frame.index)
+    unknown = ~frame["item"].isin(menu.codes.keys()) & ~snapshotted
+    for order_id, names in frame[unknown].groupby("order_id", sort=False)["item"]:
+        errors.append({"order_id": order_id, "error": f"Invalid items: {sorted(set(names))}"})
+    frame = frame[~frame["order_id"].isin(frame.loc[unknown, "order_id"])]
+
+    # Group lines into orders by sorting rows on the order and slicing one flat list;
+    # a per-group pandas aggregation costs tens of microseconds per order
+    codes, order_ids = pd.factorize(frame["order_id"], sort=False)
+    rows = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(order_ids))
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    flat_items = frame["item"].to_numpy(dtype=object)[rows].tolist()
+    # Naive datetimes are taken as UTC and aware ones converted, like order_datetime()
+    when = pd.to_datetime(frame["datetime"].iloc[rows[starts]], utc=True, errors="coerce", format="ISO8601").dt.tz_localize(None)
+    valid = when.notna().to_numpy()
+    for position in np.flatnonzero(~valid):
+        errors.append({"order_id": order_ids[position], "error": "Invalid datetime format"})
+    item_lists = [flat_items[start:end] for start, end, ok in zip(starts.tolist(), ends.tolist(), valid) if ok]
+    order_ids = order_ids[valid]
+    when = pd.DatetimeIndex(when[valid]).to_pydatetime()
+
+    if has_snapshots and snapshotted.any():
+        flat_columns = [snapshotted.to_numpy()[rows].tolist()] + [
+            frame[name].to_numpy(dtype=object)[rows].tolist() if name in frame.columns else [None] * len(rows)
+            for name in SNAPSHOT_COLUMNS
+        ]
+        priced = [
+            _file_snapshot(flat_items[start:end], *(column[start:end] for column in flat_columns), menu)
+            for start, end, ok in zip(starts.tolist(), ends.tolist(), valid) if ok
+        ]
+        snapshot_lists = [lines for lines, _, _ in priced]
+        total_costs = [total_cost for _, total_cost, _ in priced]
+        total_losses = [total_loss for _, _, total_loss in priced]
+    else:
+        total_costs, total_losses = menu.price(item_lists)
+        total_costs, total_losses = total_costs.tolist(), total_losses.tolist()
+        snapshot_lists = [menu.snapshot_lines(items) for items in item_lists]
+    # Exported ids are kept, so importing the same file twice does not duplicate orders
+    keep_ids = order_ids.str.fullmatch(r"[0-9a-fA-F]{24}").tolist()
+    docs = []
+    for order_id, keep_id, items, lines, order_time, total_cost, total_loss in zip(order_ids, keep_ids, item_lists, snapshot_lists, when, total_costs, total_losses):
+        doc = {"items": items, "lines": lines, "datetime": order_time, "total_cost": total_cost, "total_loss": total_loss}
+        if keep_id:
+            doc["_id"] = ObjectId(order_id)
+        docs.append(doc)
+    return docs, errors, menu
+
+# Import a CSV or Parquet file written by export (or any file with order_id, datetime and
+# item columns and the rows of each order adjacent). Lines keep the file's selling_price,
+# actual_price and cuisine when it has them; other lines are validated against the menu
+# and priced from it. Orders are written in chunks with insert_many; rollups are updated per batch unless
+# update_rollups is False (then run `python rollups.py rebuild` afterwards).
+def import_orders(db, path, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=10000, update_rollups=True):
+    order_collection = db["food_order"]
+    menu_collection = db["restaurant_menu"]
+    rollup_collection = db[ROLLUP_COLLECTION]
+    stats = {"rows": 0, "orders": 0, "inserted": 0, "failed": 0, "errors": []}
+    started = time.perf_counter()
+
+    for frame in _whole_orders(read_import_chunks(path, chunk_size)):
+        stats["rows"] += len(frame)
+        stats["orders"] += frame["order_id"].nunique()
+        docs, errors, menu = _orders_from_frame(frame, menu_collection)
+        for offset in range(0, len(docs), batch_size):
+            batch = docs[offset:offset + batch_size]
+            written, write_errors = insert_orders(order_collection, batch)
+            errors.extend({"order_id": str(batch[error["index"]].get("_id", "")), "error": error["error"]} for error in write_errors)
+            stats["inserted"] += len(written)
+            if update_rollups and written:
+                try:
+                    record_orders(rollup_collection, [batch[i] for i in written], menu)
+                except Exception as e:
+                    logger.error("Failed to update order rollups, run `python rollups.py rebuild`: %s", e, exc_info=True)
+        stats["failed"] += len(errors)
+        stats["errors"].extend(errors[:max(0, MAX_IMPORT_ERRORS - len(stats["errors"]))])
+        logger.info(
+            "Imported %s orders (%s rows, %s failed) in %.1fs",
+            stats["inserted"], stats["rows"], stats["failed"], time.perf_counter() - started
+        )
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import order history as CSV or Parquet")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write orders joined with the menu to a file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, help="defaults to the file extension")
+    export_parser.add_argument("--start", help="ISO datetime, inclusive")
+    export_parser.add_argument("--end", help="ISO datetime, exclusive")
+    export_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    import_parser = commands.add_parser("import", help="load orders from a CSV or Parquet file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    import_parser.add_argument("--batch-size", type=int, default=10000)
+    import_parser.add_argument("--no-rollups", action="store_true", help="skip rollup updates; rebuild them afterwards")
+    args = parser.parse_args()
+
+    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    db = client[os.getenv("MONGO_DB", "restaurant")]
+
+    if args.command == "export":
+        export_format = args.format or ("parquet" if args.path.endswith(".parquet") else "csv")
+        filters = {key: order_datetime(value) for key, value in (("start", args.start), ("end", args.end)) if value}
+        started = time.perf_counter()
+        with open(args.path, "w" if export_format == "csv" else "wb") as f:
+            for data in export_stream(db["food_order"], db["restaurant_menu"], export_format, filters, args.chunk_size):
+                f.write(data)
+        logger.info("Exported orders to %s in %.1fs", args.path, time.perf_counter() - started)
+    else:
+        stats = import_orders(db, args.path, args.chunk_size, args.batch_size, not args.no_rollups)
+        print(f"{stats['inserted']} of {stats['orders']} orders imported, {stats['failed']} failed")
+        for error in stats["errors"][:20]:
+            print(f"  {error['order_id']}: {error['error']}")
+        if stats["failed"]:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -0,0 +1,90 @@
+import json
+import base64
+import binascii
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+# Cursors are opaque to clients: urlsafe base64 of the last document's sort key
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values["id"] = ObjectId(values["id"])
+        return values
+    except (binascii.Error, ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+# Helper function to parse the limit/cursor query parameters. cursor_keys are the keys a
+# cursor for this listing carries, so a cursor from another listing is rejected.
+# Returns (paginate, limit, cursor, error); paginate is False when neither was given.
+def parse_page_args(args, cursor_keys=("id",)):
+    if "limit" not in args and "cursor" not in args:
+        return False, None, None, ""
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_LIMIT))
+    except ValueError:
+        return True, None, None, "limit must be an integer"
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        return True, None, None, f"limit must be between 1 and {MAX_PAGE_LIMIT}"
+    cursor = None
+    if args.get("cursor"):
+        try:
+            cursor = decode_cursor(args["cursor"])
+        except ValueError as e:
+            return True, None, None, str(e)
+        if any(key not in cursor for key in cursor_keys):
+            return True, None, None, "Invalid cursor"
+    return True, limit, cursor, ""
+
+# Keyset filter for documents after the cursor when sorting by _id
+def after_id(cursor):
+    return {"_id": {"$gt": cursor["id"]}} if cursor else {}
+
+# Keyset filter for documents after the cursor when sorting by (field, _id)
+def after_field(field, cursor):
+    if not cursor:
+        return {}
+    return {"$or": [
+        {field: {"$gt": cursor[field]}},
+        {field: cursor[field], "_id": {"$gt": cursor["id"]}}
+    ]}
+
+# Fetch one page with limit + 1 to learn whether another page exists.
+# cursor_fields maps cursor keys to document fields for the last document.
+def fetch_page(collection, query, projection, sort, limit, cursor_fields):
+    return split_page(list(collection.find(query, projection).sort(sort).limit(limit + 1)), limit, cursor_fields)
+
+# Cursor for the page after the given last document
+def page_cursor(last, cursor_fields):
+    return encode_cursor({key: (str(last[field]) if field == "_id" else last[field]) for key, field in cursor_fields.items()})
+
+# Trim a limit + 1 result down to one page and build the cursor for the next one
+def split_page(docs, limit, cursor_fields):
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = page_cursor(docs[-1], cursor_fields)
+    return docs, next_cursor
+
+# Final line of a paginated NDJSON stream
+def next_cursor_line(next_cursor):
+    return json.dumps({"next_cursor": next_cursor}) + "\n"
+
+# Write documents from a cursor as newline-delimited JSON without materializing them.
+# With limit, the cursor is read with limit + 1: at most limit documents are written and
+# a final {"next_cursor": ...} line (null on the last page) says where the next page starts.
+def ndjson_lines(cursor, formatter, limit=None, cursor_fields=None):
+    last = None
+    for position, doc in enumerate(cursor):
+        if limit is not None and position == limit:
+            yield next_cursor_line(page_cursor(last, cursor_fields))
+            return
+        last = doc
+        yield json.dumps(formatter(doc), default=str) + "\n"
+    if limit is not None:
+        yield next_cursor_line(None)
@@ -0,0 +1,93 @@
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Order line fields grouped by the analytics pipeline, keyed by rollup dimension
+PIPELINE_DIMENSIONS = {
+    "item": "$item",
+    "cuisine": "$cuisine",
+    "hour": "$hour",
+    "weekday": "$weekday",
+    "month": "$month",
+    "category": "$category",
+    "month_category": {"$concat": ["$month", "|", "$category"]}
+}
+
+# Meal category boundaries, kept in sync with rollups.meal_category
+def _meal_category_expression(hour):
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$and": [{"$gte": [hour, 6]}, {"$lt": [hour, 11]}]}, "then": "Breakfast"},
+                {"case": {"$and": [{"$gte": [hour, 11]}, {"$lt": [hour, 16]}]}, "then": "Lunch"},
+                {"case": {"$and": [{"$gte": [hour, 16]}, {"$lt": [hour, 22]}]}, "then": "Dinner"}
+            ],
+            "default": "Other"
+        }
+    }
+
+# Build the pipeline that unwinds order lines and groups them by every chart dimension
+# inside MongoDB. Lines are read from the order's price snapshots; only lines of orders
+# stored before snapshots (see rollups.order_lines) are joined to the menu, and dropped
+# when their item is no longer on it. An optional match runs first so it can use
+# indexes, and item_names restricts which order lines are counted.
+def analytics_pipeline(menu_collection_name="restaurant_menu", match=None, item_names=None):
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$project": {"_id": 0, "items": 1, "datetime": 1, "lines": {
+            "$cond": [
+                {"$and": [{"$isArray": "$lines"}, {"$isArray": "$items"}]},
+                {"$cond": [{"$eq": [{"$size": "$lines"}, {"$size": "$items"}]}, "$lines", "$$REMOVE"]},
+                "$$REMOVE"
+            ]
+        }}},
+        {"$addFields": {"datetime": {
+            "$cond": [
+                {"$eq": [{"$type": "$datetime"}, "string"]},
+                {"$dateFromString": {"dateString": "$datetime", "onError": None, "onNull": None}},
+                "$datetime"
+            ]
+        }}},
+        {"$match": {"datetime": {"$type": "date"}}},
+        {"$unwind": {"path": "$items", "includeArrayIndex": "position"}}
+    ]
+    if item_names is not None:
+        pipeline.append({"$match": {"items": {"$in": list(item_names)}}})
+    pipeline += [
+        {"$addFields": {"line": {"$arrayElemAt": ["$lines", "$position"]}}},
+        {"$addFields": {"menu_item": {"$cond": [{"$ifNull": ["$line", False]}, "$$REMOVE", "$items"]}}},
+        {"$lookup": {"from": menu_collection_name, "localField": "menu_item", "foreignField": "name", "as": "menu"}},
+        {"$match": {"$or": [{"line": {"$type": "object"}}, {"menu.0": {"$exists": True}}]}},
+        # Menu documents carry the same cuisine and price fields as a snapshot
+        {"$addFields": {"line": {"$ifNull": ["$line", {"$arrayElemAt": ["$menu", 0]}]}}},
+        {"$project": {
+            "item": "$items",
+            "cuisine": "$line.cuisine",
+            "profit_loss": {"$subtract": [{"$toDouble": "$line.selling_price"}, {"$toDouble": "$line.actual_price"}]},
+            "hour": {"$hour": "$datetime"},
+            "weekday": {"$subtract": [{"$isoDayOfWeek": "$datetime"}, 1]},
+            "month": {"$dateToString": {"format": "%Y-%m", "date": "$datetime"}}
+        }},
+        {"$addFields": {"category": _meal_category_expression("$hour")}},
+        {"$facet": {
+            dimension: [{"$group": {"_id": key, "count": {"$sum": 1}, "profit_loss": {"$sum": "$profit_loss"}}}]
+            for dimension, key in PIPELINE_DIMENSIONS.items()
+        }}
+    ]
+    return pipeline
+
+# Run the analytics pipeline and return grouped rows shaped like rollup documents
+def run_analytics_pipeline(order_collection, menu_collection_name="restaurant_menu", match=None, item_names=None):
+    pipeline = analytics_pipeline(menu_collection_name, match, item_names)
+    results = list(order_collection.aggregate(pipeline, allowDiskUse=True))
+    if not results:
+        return []
+    grouped = []
+    for dimension, rows in results[0].items():
+        grouped.extend(
+            {"dimension": dimension, "key": row["_id"], "count": row["count"], "profit_loss": row["profit_loss"]}
+            for row in rows
+        )
+    logger.info("Aggregation pipeline returned %s grouped rows", len(grouped))
+    return grouped
@@ -0,0 +1,217 @@
+import sys
+import argparse
+import logging
+from datetime import datetime, timezone
+from pymongo import UpdateOne, ASCENDING
+from sketches import CountMinSketch, HyperLogLog
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "order_rollups"
+ROLLUP_DIMENSIONS = ("item", "cuisine", "hour", "weekday", "month", "category", "month_category")
+META_DIMENSION = "_meta"
+# Per-month count-min and HyperLogLog sketches of ordered items, keyed by month, for
+# approximate top items and distinct item counts over month ranges (/visualize?mode=preview)
+SKETCH_DIMENSION = "_sketch"
+
+# Helper function to bucket an order hour into a meal category
+# Breakfast: 6:00 AM - 10:59 AM
+# Lunch: 11:00 AM - 3:59 PM
+# Dinner: 4:00 PM - 9:59 PM
+# Other: All other times (e.g., late-night orders)
+def meal_category(hour):
+    if 6 <= hour < 11:
+        return "Breakfast"
+    elif 11 <= hour < 16:
+        return "Lunch"
+    elif 16 <= hour < 22:
+        return "Dinner"
+    return "Other"
+
+# Helper function to turn a stored order datetime into a timezone-naive UTC datetime
+def order_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        raise ValueError(f"Unsupported datetime value: {value!r}")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Helper function to return an order's per-line price snapshots (see MenuIndex.snapshot_lines),
+# or None for orders stored before snapshots were added, which are priced from the menu
+def order_lines(order):
+    lines = order.get("lines")
+    if isinstance(lines, list) and isinstance(order.get("items"), list) and len(lines) == len(order["items"]):
+        return lines
+    return None
+
+def ensure_rollup_indexes(rollup_collection):
+    rollup_collection.create_index([("dimension", ASCENDING), ("key", ASCENDING)], unique=True)
+
+# Accumulate the rollup increments and per-month item sketches for a batch of orders in
+# memory. Lines are counted at their snapshot prices; orders without snapshots are priced
+# from menu, a MenuIndex, and their items that are not on it are skipped.
+def _collect_increments(orders, menu):
+    increments = {}
+    sketches = {}
+
+    def bump(dimension, key, profit_loss):
+        entry = increments.setdefault((dimension, key), [0, 0.0])
+        entry[0] += 1
+        entry[1] += profit_loss
+
+    for order in orders:
+        try:
+            dt = order_datetime(order.get("datetime"))
+        except (ValueError, TypeError) as e:
+            logger.warning("Skipping order with invalid datetime in rollups: %s - %s", order.get('datetime'), e)
+            continue
+        month = dt.strftime("%Y-%m")
+        category = meal_category(dt.hour)
+        lines = order_lines(order)
+        for position, item in enumerate(order.get("items", [])):
+            if lines is not None:
+                line = lines[position]
+                profit_loss = line["selling_price"] - line["actual_price"]
+                cuisine = line["cuisine"]
+            else:
+                code = menu.code(item) if isinstance(item, str) else -1
+                if code < 0:
+                    logger.warning("Skipping item not found in menu for rollups: %s", item)
+                    continue
+                profit_loss = menu.unit_profit(code)
+                cuisine = menu.cuisine(code)
+            bump("item", item, profit_loss)
+            bump("cuisine", cuisine, profit_loss)
+            bump("hour", dt.hour, profit_loss)
+            bump("weekday", dt.weekday(), profit_loss)
+            bump("month", month, profit_loss)
+            bump("category", category, profit_loss)
+            bump("month_category", f"{month}|{category}", profit_loss)
+            if month not in sketches:
+                sketches[month] = (CountMinSketch(), HyperLogLog())
+            sketches[month][0].add(item)
+            sketches[month][1].add(item)
+    return increments, sketches
+
+# Build the upserts that apply the rollup increments for newly inserted orders.
+# Sketch cells are merged in place: counters with $inc and HyperLogLog registers with $max.
+def rollup_operations(orders, menu):
+    increments, sketches = _collect_increments(orders, menu)
+    operations = [
+        UpdateOne(
+            {"dimension": dimension, "key": key},
+            {"$inc": {"count": count, "profit_loss": profit_loss}},
+            upsert=True
+        )
+        for (dimension, key), (count, profit_loss) in increments.items()
+    ]
+    for month, (cms, hll) in sketches.items():
+        counters = {f"cms.{row}.{column}": count for (row, column), count in cms.counts.items()}
+        counters["lines"] = cms.total
+        operations.append(UpdateOne(
+            {"dimension": SKETCH_DIMENSION, "key": month},
+            {"$inc": counters, "$max": {f"hll.{register}": rank for register, rank in hll.registers.items()}},
+            upsert=True
+        ))
+    return operations
+
+# Apply the rollup increments for newly inserted orders
+def record_orders(rollup_collection, orders, menu):
+    operations = rollup_operations(orders, menu)
+    if operations:
+        rollup_collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+def is_backfilled(rollup_collection):
+    return rollup_collection.find_one({"dimension": META_DIMENSION, "key": "backfilled"}) is not None
+
+def fetch_rollups(rollup_collection):
+    return list(rollup_collection.find({"dimension": {"$nin": [META_DIMENSION, SKETCH_DIMENSION]}}, {"_id": 0}))
+
+# Item sketches cover all history once rollups were rebuilt with them
+def has_sketches(rollup_collection):
+    return rollup_collection.find_one({"dimension": META_DIMENSION, "key": "backfilled", "sketches": True}) is not None
+
+# Merge the item sketches of the months from start_month up to (not including) end_month,
+# both "YYYY-MM" or None for no bound. Returns (CountMinSketch, HyperLogLog, months found).
+def fetch_item_sketches(rollup_collection, start_month=None, end_month=None):
+    query = {"dimension": SKETCH_DIMENSION}
+    if start_month or end_month:
+        query["key"] = {}
+        if start_month:
+            query["key"]["$gte"] = start_month
+        if end_month:
+            query["key"]["$lt"] = end_month
+    cms = CountMinSketch()
+    hll = HyperLogLog()
+    months = []
+    for doc in rollup_collection.find(query, {"_id": 0}):
+        cms.merge(CountMinSketch.from_doc(doc.get("cms"), doc.get("lines", 0)))
+        hll.merge(HyperLogLog.from_doc(doc.get("hll")))
+        months.append(doc["key"])
+    return cms, hll, sorted(months)
+
+# Replay every stored order into a fresh rollup collection and swap it in.
+# The menu is only used for orders without price snapshots.
+# Stop order writes (place_order, place_orders, imports, write-behind flushes) while this
+# runs: increments applied to the live collection during the rebuild are dropped by the
+# swap, and orders stored after the scan passed them are not replayed. A changed order
+# count aborts the rebuild before the swap with a RuntimeError; rebuild again with writes stopped.
+def rebuild_rollups(db, batch_size=5000):
+    from menu_index import MenuIndex
+    menu = MenuIndex.from_items(db["restaurant_menu"].find())
+    orders_before = db["food_order"].count_documents({})
+    staging = db[f"{ROLLUP_COLLECTION}_rebuild"]
+    staging.drop()
+    ensure_rollup_indexes(staging)
+
+    batch = []
+    replayed = 0
+    for order in db["food_order"].find({}, {"items": 1, "lines": 1, "datetime": 1}, batch_size=batch_size):
+        batch.append(order)
+        if len(batch) >= batch_size:
+            record_orders(staging, batch, menu)
+            replayed += len(batch)
+            batch = []
+    if batch:
+        record_orders(staging, batch, menu)
+        replayed += len(batch)
+
+    staging.insert_one({
+        "dimension": META_DIMENSION,
+        "key": "backfilled",
+        "orders": replayed,
+        "sketches": True,
+        "rebuilt_at": datetime.utcnow().isoformat()
+    })
+    # Orders written during the scan may be missing from staging and would be lost from
+    # the rollups by the swap, so keep the live collection and leave staging for inspection
+    orders_after = db["food_order"].count_documents({})
+    if orders_after != orders_before or replayed != orders_before:
+        raise RuntimeError(
+            f"Orders changed during the rollup rebuild ({orders_before} before, {replayed} replayed, "
+            f"{orders_after} after); {ROLLUP_COLLECTION} was left as it was and the rebuilt rollups "
+            f"are in {staging.name}. Stop order writes and run the rebuild again."
+        )
+    staging.rename(ROLLUP_COLLECTION, dropTarget=True)
+    logger.info("Rebuilt rollups from %s orders", replayed)
+    return replayed
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    from tenants import cli_database
+    parser = argparse.ArgumentParser(description="Rebuild order rollups from food_order (stop order writes first)")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--tenant", help="outlet name from TENANT_URIS or a MongoDB URI; defaults to MONGO_URI/MONGO_DB")
+    args = parser.parse_args()
+    try:
+        rebuild_rollups(cli_database(args.tenant))
+    except RuntimeError as e:
+        logger.error("%s", e)
+        sys.exit(1)
@@ -0,0 +1,118 @@
+import math
+import hashlib
+from functools import lru_cache
+
+# Mergeable probabilistic sketches kept per month next to the order rollups (see
+# rollups.SKETCH_DIMENSION). Both are stored sparsely as {cell: value} so they can be
+# maintained with atomic $inc/$max upserts and stay small when few cells are touched.
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+HLL_PRECISION = 12
+
+# Stable 64-bit hash of a key; Python's hash() is salted per process
+@lru_cache(maxsize=65536)
+def hash64(key):
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "little")
+
+# Count-min sketch: estimate(key) never undercounts and overcounts by at most
+# epsilon * total with probability 1 - delta, where epsilon = e / width and
+# delta = e ** -depth. Rows are derived from one hash by double hashing.
+class CountMinSketch:
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, counts=None, total=0):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else {}  # (row, column) -> count
+        self.total = total
+
+    def cells(self, key):
+        hashed = hash64(key)
+        low, high = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return [(row, (low + row * high) % self.width) for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        for cell in self.cells(key):
+            self.counts[cell] = self.counts.get(cell, 0) + count
+        self.total += count
+
+    def estimate(self, key):
+        return min(self.counts.get(cell, 0) for cell in self.cells(key))
+
+    def merge(self, other):
+        for cell, count in other.counts.items():
+            self.counts[cell] = self.counts.get(cell, 0) + count
+        self.total += other.total
+        return self
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+    # Largest overcount of any estimate at the sketch's confidence
+    def error_bound(self):
+        return self.epsilon * self.total
+
+    # Nested {"row": {"column": count}} as stored in MongoDB
+    def to_doc(self):
+        doc = {}
+        for (row, column), count in self.counts.items():
+            doc.setdefault(str(row), {})[str(column)] = count
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc, total=0, width=CMS_WIDTH, depth=CMS_DEPTH):
+        counts = {
+            (int(row), int(column)): count
+            for row, columns in (doc or {}).items() for column, count in columns.items()
+        }
+        return cls(width, depth, counts, total)
+
+# HyperLogLog distinct counter with 2 ** precision registers; the estimate has a
+# relative standard error of about 1.04 / sqrt(2 ** precision)
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else {}  # register -> rank
+
+    # Register index and rank (position of the first 1 bit) of a key
+    def cell(self, key):
+        hashed = hash64(key)
+        register = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        return register, (64 - self.precision) - rest.bit_length() + 1
+
+    def add(self, key):
+        register, rank = self.cell(key)
+        if rank > self.registers.get(register, 0):
+            self.registers[register] = rank
+
+    def merge(self, other):
+        for register, rank in other.registers.items():
+            if rank > self.registers.get(register, 0):
+                self.registers[register] = rank
+        return self
+
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        zeros = m - len(self.registers)
+        estimate = alpha * m * m / (zeros + sum(2.0 ** -rank for rank in self.registers.values()))
+        # Small cardinalities are counted from the empty registers (linear counting)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.size)
+
+    def to_doc(self):
+        return {str(register): rank for register, rank in self.registers.items()}
+
+    @classmethod
+    def from_doc(cls, doc, precision=HLL_PRECISION):
+        return cls(precision, {int(register): rank for register, rank in (doc or {}).items()})
@@ -0,0 +1,119 @@
+import os
+import logging
+import threading
+from pymongo import MongoClient
+from pymongo.uri_parser import parse_uri
+from rollups import ROLLUP_COLLECTION
+from menu_cache import MenuCache, META_COLLECTION
+from indexes import ensure_indexes
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Outlets of the chain, each with its own database holding the usual restaurant_menu,
+# food_order and order_rollups collections. Configured with TENANT_URIS as
+# name=uri pairs; the database comes from the URI path (default MONGO_DB):
+#   TENANT_URIS="downtown=mongodb://localhost:27017/downtown,airport=mongodb://localhost:27018/restaurant"
+# Outlets on the same mongod share one MongoClient and its connection pool.
+TENANT_NAME_CHARS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+# Helper function to parse "name=uri,name=uri" into {name: (uri, database name)}
+def parse_tenant_uris(value, default_db="restaurant"):
+    tenants = {}
+    for entry in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, uri = entry.partition("=")
+        name = name.strip()
+        if not name or not uri or not set(name) <= TENANT_NAME_CHARS:
+            raise ValueError(f"Invalid TENANT_URIS entry: {entry}")
+        tenants[name] = (uri.strip(), parse_uri(uri.strip())["database"] or default_db)
+    return tenants
+
+# The collections and menu cache the menu, order and feedback routes work on, for the
+# app's own database or one outlet's
+class OutletStore:
+    def __init__(self, db, menu_cache=None, menu_cache_ttl=None):
+        self.db = db
+        self.menu_collection = db["restaurant_menu"]
+        self.order_collection = db["food_order"]
+        self.feedback_collection = db["feedback"]
+        self.rollup_collection = db[ROLLUP_COLLECTION]
+        self.meta_collection = db[META_COLLECTION]
+        self.menu_cache = menu_cache or MenuCache(self.menu_collection, ttl=menu_cache_ttl, meta_collection=self.meta_collection)
+
+class TenantRegistry:
+    def __init__(self, tenants, client_kwargs=None):
+        self.tenants = tenants  # name -> (uri, database name)
+        self.client_kwargs = client_kwargs or {}
+        self._clients = {}
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return list(self.tenants)
+
+    def __contains__(self, name):
+        return name in self.tenants
+
+    # One client per mongod (host list, credentials and options), created on first use
+    def _client(self, uri):
+        parsed = parse_uri(uri)
+        key = (tuple(sorted(parsed["nodelist"])), parsed["username"], tuple(sorted(parsed["options"].items())))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = MongoClient(uri, connect=False, **self.client_kwargs)
+            return client
+
+    def database(self, name):
+        uri, db_name = self.tenants[name]
+        return self._client(uri)[db_name]
+
+    def databases(self, names=None):
+        return {name: self.database(name) for name in (names or self.names())}
+
+    # An outlet's OutletStore, created on its first write or read with its own menu cache.
+    # Its indexes are checked then too (add_item relies on the unique menu name index),
+    # with the app's ENSURE_INDEXES mode: "True" builds them, "False" reports them, "Skip".
+    def store(self, name, menu_cache_ttl=None, index_mode="True"):
+        with self._lock:
+            store = self._stores.get(name)
+        if store is not None:
+            return store
+        db = self.database(name)
+        if index_mode != "Skip":
+            ensure_indexes(db, create=index_mode == "True")
+        with self._lock:
+            return self._stores.setdefault(name, OutletStore(db, menu_cache_ttl=menu_cache_ttl))
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients = {}
+            self._stores = {}
+
+# Helper function to build the registry from TENANT_URIS; None when no outlets are configured
+def tenant_registry_from_env(default_db="restaurant", client_kwargs=None):
+    tenants = parse_tenant_uris(os.getenv("TENANT_URIS", ""), default_db)
+    if not tenants:
+        return None
+    logger.info("Configured %s tenants: %s", len(tenants), ", ".join(tenants))
+    return TenantRegistry(tenants, client_kwargs)
+
+# Helper function to read the number of outlets aggregated at once
+def tenant_workers_from_env(tenant_count):
+    return max(1, min(int(os.getenv("TENANT_WORKERS", 16)), tenant_count))
+
+# Helper function for the maintenance scripts: the database of --tenant, an outlet
+# name from TENANT_URIS or a MongoDB URI, else the one from MONGO_URI and MONGO_DB
+def cli_database(tenant=None):
+    default_db = os.getenv("MONGO_DB", "restaurant")
+    client_kwargs = {"serverSelectionTimeoutMS": 5000}
+    if tenant is None:
+        return MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"), **client_kwargs)[default_db]
+    if "://" in tenant:
+        return TenantRegistry({"cli": (tenant, parse_uri(tenant)["database"] or default_db)}, client_kwargs).database("cli")
+    registry = tenant_registry_from_env(default_db, client_kwargs)
+    if registry is None or tenant not in registry:
+        raise SystemExit(f"Unknown tenant {tenant!r}; set TENANT_URIS or pass a MongoDB URI")
+    return registry.database(tenant)
@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+# Backend modules are flat files next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# In-memory MongoDB for tests that need one; skipped when mongomock is not installed
+@pytest.fixture
+def mongo():
+    mongomock = pytest.importorskip("mongomock")
+    with mongomock.patch(servers=(("localhost", 27017),)):
+        from pymongo import MongoClient
+        yield MongoClient("mongodb://localhost:27017/")
+
+@pytest.fixture
+def db(mongo):
+    return mongo["restaurant_test"]
+
+# Flask test client on a fresh in-memory database, with charts written to a temporary directory
+@pytest.fixture
+def client(mongo, monkeypatch, tmp_path):
+    monkeypatch.setenv("WRITE_BEHIND", "False")
+    monkeypatch.setenv("CHART_SCHEDULER", "False")
+    monkeypatch.delenv("TENANT_URIS", raising=False)
+    import app as app_module
+    # app binds MongoClient at first import; point it at this test's store
+    monkeypatch.setattr(app_module, "MongoClient", type(mongo))
+    monkeypatch.setattr(app_module, "GRAPH_DIR", str(tmp_path))
+    flask_app = app_module.create_app({"MONGO_URI": "mongodb://localhost:27017/", "MONGO_DB": "restaurant_test", "TESTING": True})
+    return flask_app.test_client()
@@ -0,0 +1,91 @@
+import os
+import json
+import threading
+
+import pytest
+
+import chart_scheduler
+from chart_cache import cached_filename, filter_prefix, prune_versions
+from chart_scheduler import ChartScheduler
+
+KEYS = ["%016x" % i for i in range(5)]
+
+def _write_versions(graph_dir, filename):
+    paths = []
+    for age, key in enumerate(reversed(KEYS)):
+        path = os.path.join(graph_dir, cached_filename(filename, key))
+        with open(path, "wb") as f:
+            f.write(key.encode())
+        os.utime(path, (1000 + age, 1000 + age))  # KEYS[0] is the newest
+        paths.append(path)
+    return paths
+
+def test_prune_keeps_newest_and_scheduled_versions(tmp_path):
+    _write_versions(tmp_path, "top_items.png")
+    filtered = tmp_path / cached_filename(filter_prefix({"cuisine": "Indian"}) + "top_items.png", KEYS[4])
+    filtered.write_bytes(b"filtered")
+    with open(tmp_path / ".charts-orders-png.json", "w") as f:
+        json.dump({"images": [cached_filename("top_items.png", KEYS[4])]}, f)
+
+    prune_versions(str(tmp_path), "top_items.png", keep=2)
+
+    remaining = sorted(name for name in os.listdir(tmp_path) if name.startswith("top_items-"))
+    assert remaining == sorted(cached_filename("top_items.png", key) for key in (KEYS[0], KEYS[1], KEYS[4]))
+    # Filtered charts have their own prefix and are pruned separately
+    assert filtered.exists()
+
+def _scheduler(tmp_path, render, **kwargs):
+    return ChartScheduler(render, lambda: 0, str(tmp_path), **kwargs)
+
+def test_scheduler_renders_once_and_reuses_state(tmp_path):
+    renders = []
+    def render(source, image_format):
+        renders.append((source, image_format))
+        name = f"chart-{len(renders)}.png"
+        (tmp_path / name).write_bytes(b"png")
+        return [name]
+
+    scheduler = _scheduler(tmp_path, render)
+    state, stale = scheduler.get("orders", "png")
+    assert (state["images"], stale) == (["chart-1.png"], False)
+    assert _scheduler(tmp_path, render).get("orders", "png")[0]["images"] == ["chart-1.png"]
+    assert len(renders) == 1
+
+    # A render whose files were pruned is rendered again before it is served
+    os.remove(tmp_path / "chart-1.png")
+    assert scheduler.get("orders", "png")[0]["images"] == ["chart-2.png"]
+
+@pytest.mark.skipif(chart_scheduler.fcntl is None, reason="cross-process lock needs fcntl")
+def test_scheduler_skips_refresh_while_another_worker_holds_the_lock(tmp_path):
+    render_started, release = threading.Event(), threading.Event()
+    def slow_render(source, image_format):
+        render_started.set()
+        release.wait(5)
+        return []
+
+    first = _scheduler(tmp_path, slow_render, interval=0)
+    second = _scheduler(tmp_path, slow_render, interval=0)
+    (tmp_path / ".charts-orders-png.json").write_text(json.dumps({"images": [], "generated_ts": 0, "order_count": 0}))
+    pending = first.refresh("orders", "png")
+    assert render_started.wait(5)
+    second.refresh("orders", "png").result(5)
+    release.set()
+    pending.result(5)
+
+    assert second.stats()["skipped_locked"] == 1
+    assert first.stats()["refreshes"] == 1
+
+def test_serve_graph_answers_304_for_known_content_key(client):
+    import app as app_module
+    name = cached_filename("top_items.png", KEYS[0])
+    with open(os.path.join(app_module.GRAPH_DIR, name), "wb") as f:
+        f.write(b"png")
+
+    response = client.get(f"/graphs/{name}")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{KEYS[0]}"'
+    assert "immutable" in response.headers["Cache-Control"]
+
+    response = client.get(f"/graphs/{name}", headers={"If-None-Match": f'"{KEYS[0]}"'})
+    assert response.status_code == 304
+    assert client.get("/graphs/" + cached_filename("top_items.png", KEYS[1])).status_code == 404
@@ -0,0 +1,40 @@
+from pagination import encode_cursor
+
+FEEDBACK = {"name": "Asha", "email": "asha@example.com", "feedback": "Great dosa"}
+
+def add_feedback(client, count):
+    for i in range(count):
+        response = client.post("/api/feedback", json={**FEEDBACK, "feedback": f"Great dosa {i}"})
+        assert response.status_code == 201
+
+def test_feedback_pages_follow_next_cursor(client):
+    add_feedback(client, 5)
+    seen = []
+    cursor = None
+    while True:
+        response = client.get("/api/feedback", query_string={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [entry["feedback"] for entry in body["feedback"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"Great dosa {i}" for i in range(5)]
+
+def test_feedback_rejects_cursor_from_another_listing(client):
+    add_feedback(client, 1)
+    client.post("/add_item", json={"name": "Dosa", "category": "Main", "cuisine": "South Indian", "selling_price": 80, "actual_price": 50})
+    client.post("/add_item", json={"name": "Idli", "category": "Main", "cuisine": "South Indian", "selling_price": 40, "actual_price": 20})
+    items_cursor = client.get("/get_items", query_string={"limit": 1}).get_json()["next_cursor"]
+    assert items_cursor
+
+    for params in ({"cursor": items_cursor}, {"cursor": items_cursor, "format": "ndjson"}):
+        response = client.get("/api/feedback", query_string=params)
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid cursor"}
+
+def test_feedback_rejects_malformed_cursor(client):
+    response = client.get("/api/feedback", query_string={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    response = client.get("/api/feedback", query_string={"cursor": encode_cursor({"created_at": "2024-01-01T00:00:00"})})
+    assert response.status_code == 400
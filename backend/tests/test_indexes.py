@@ -0,0 +1,23 @@
+import logging
+
+from pymongo import ASCENDING
+
+from indexes import ensure_indexes
+
+def _menu_name_entry(report):
+    return next(entry for entry in report if entry["collection"] == "restaurant_menu")
+
+def test_non_unique_menu_name_index_is_a_conflict(db, caplog):
+    db["restaurant_menu"].create_index([("name", ASCENDING)])
+    with caplog.at_level(logging.ERROR, logger="indexes"):
+        report = ensure_indexes(db, create=True)
+
+    entry = _menu_name_entry(report)
+    assert entry["status"] == "conflict"
+    assert "unique=False" in entry["error"]
+    assert any("Conflicting index on restaurant_menu" in record.getMessage() for record in caplog.records)
+    assert not db["restaurant_menu"].index_information()["name_1"].get("unique", False)
+
+def test_unique_menu_name_index_is_present(db):
+    db["restaurant_menu"].create_index([("name", ASCENDING)], unique=True)
+    assert _menu_name_entry(ensure_indexes(db, create=False))["status"] == "present"
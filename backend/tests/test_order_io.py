@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from order_io import export_stream, import_orders
+
+MENU = [
+    {"name": "Dal", "category": "Main", "cuisine": "Indian", "selling_price": 10.0, "actual_price": 6.0},
+    {"name": "Pho", "category": "Main", "cuisine": "Vietnamese", "selling_price": 12.0, "actual_price": 14.0}
+]
+
+# Orders whose snapshot prices differ from the current menu, as after a price change
+def _seed(db):
+    db["restaurant_menu"].insert_many([dict(item) for item in MENU])
+    db["food_order"].insert_many([
+        {
+            "items": ["Dal", "Pho"],
+            "lines": [
+                {"item_id": None, "selling_price": 8.0, "actual_price": 5.0, "cuisine": "Indian"},
+                {"item_id": None, "selling_price": 11.0, "actual_price": 13.5, "cuisine": "Vietnamese"}
+            ],
+            "datetime": datetime(2026, 1, day, 12), "total_cost": 19.0, "total_loss": 2.5
+        }
+        for day in (1, 2, 3)
+    ])
+
+def _export(db, path, export_format):
+    with open(path, "w" if export_format == "csv" else "wb") as f:
+        for data in export_stream(db["food_order"], db["restaurant_menu"], export_format, chunk_size=2):
+            f.write(data)
+
+def _line_prices(db):
+    return sorted(
+        (order["datetime"], [(line["selling_price"], line["actual_price"], line["cuisine"]) for line in order["lines"]], order["total_cost"], order["total_loss"])
+        for order in db["food_order"].find()
+    )
+
+@pytest.mark.parametrize("export_format", ["csv", "parquet"])
+def test_export_import_round_trip_keeps_snapshot_prices(db, tmp_path, export_format):
+    if export_format == "parquet":
+        pytest.importorskip("pyarrow")
+    _seed(db)
+    before = _line_prices(db)
+    path = str(tmp_path / f"orders.{export_format}")
+    _export(db, path, export_format)
+
+    db["food_order"].delete_many({})
+    for item in MENU:
+        db["restaurant_menu"].update_one({"name": item["name"]}, {"$set": {"selling_price": item["selling_price"] * 2}})
+    stats = import_orders(db, path, chunk_size=3, update_rollups=False)
+
+    assert (stats["inserted"], stats["failed"]) == (3, 0)
+    assert _line_prices(db) == before
+    # Importing the same file again does not duplicate orders
+    import_orders(db, path, chunk_size=3, update_rollups=False)
+    assert db["food_order"].count_documents({}) == 3
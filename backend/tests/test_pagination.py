@@ -0,0 +1,38 @@
+from bson import ObjectId
+import pytest
+
+from pagination import encode_cursor, decode_cursor, parse_page_args, page_cursor, split_page, ndjson_lines, MAX_PAGE_LIMIT
+
+def test_cursor_round_trip():
+    last = {"_id": ObjectId(), "created_at": "2026-01-01T12:00:00"}
+    cursor = decode_cursor(page_cursor(last, {"created_at": "created_at", "id": "_id"}))
+    assert cursor == {"created_at": "2026-01-01T12:00:00", "id": last["_id"]}
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor({"created_at": "x"}), encode_cursor({"id": "zz"}), encode_cursor([1])])
+def test_decode_rejects_invalid_cursors(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+def test_parse_page_args():
+    assert parse_page_args({}) == (False, None, None, "")
+    assert parse_page_args({"limit": "5"}) == (True, 5, None, "")
+    assert parse_page_args({"limit": "x"})[3] == "limit must be an integer"
+    assert parse_page_args({"limit": str(MAX_PAGE_LIMIT + 1)})[3].startswith("limit must be between")
+    assert parse_page_args({"cursor": "bad"})[3] == "Invalid cursor"
+    # A cursor from an _id-sorted listing lacks the keys of a (created_at, _id) listing
+    last_id = ObjectId()
+    id_cursor = encode_cursor({"id": str(last_id)})
+    assert parse_page_args({"cursor": id_cursor}, ("created_at", "id"))[3] == "Invalid cursor"
+    assert parse_page_args({"cursor": id_cursor}) == (True, 100, {"id": last_id}, "")
+
+def test_split_page_and_ndjson_end_with_next_cursor():
+    docs = [{"_id": ObjectId(), "n": i} for i in range(4)]
+    page, next_cursor = split_page(list(docs), 3, {"id": "_id"})
+    assert page == docs[:3]
+    assert decode_cursor(next_cursor)["id"] == docs[2]["_id"]
+    assert split_page(docs[:2], 3, {"id": "_id"}) == (docs[:2], None)
+
+    lines = list(ndjson_lines(iter(docs), lambda doc: {"n": doc["n"]}, limit=3, cursor_fields={"id": "_id"}))
+    assert lines[:3] == ['{"n": 0}\n', '{"n": 1}\n', '{"n": 2}\n']
+    assert lines[3] == '{"next_cursor": "%s"}\n' % next_cursor
+    assert list(ndjson_lines(iter(docs[:1]), lambda doc: {"n": doc["n"]}, limit=3, cursor_fields={"id": "_id"}))[-1] == '{"next_cursor": null}\n'
@@ -0,0 +1,30 @@
+import pytest
+
+import rollups
+from rollups import ROLLUP_COLLECTION, rebuild_rollups
+
+def _seed(db):
+    db["restaurant_menu"].insert_one({"name": "Dal", "cuisine": "Indian", "selling_price": 10, "actual_price": 6})
+    db["food_order"].insert_many([{"items": ["Dal"], "datetime": "2026-01-0%sT12:00:00" % day} for day in (1, 2)])
+
+def test_rebuild_replays_every_order(db):
+    _seed(db)
+    assert rebuild_rollups(db) == 2
+    meta = db[ROLLUP_COLLECTION].find_one({"key": "backfilled"})
+    assert meta["orders"] == 2
+
+def test_rebuild_refuses_swap_when_orders_change(db, monkeypatch):
+    _seed(db)
+    db[ROLLUP_COLLECTION].insert_one({"dimension": "live", "key": "marker"})
+    record_orders = rollups.record_orders
+
+    # An order placed while the scan runs
+    def record_and_place_order(collection, orders, menu):
+        record_orders(collection, orders, menu)
+        db["food_order"].insert_one({"items": ["Dal"], "datetime": "2026-01-03T12:00:00"})
+
+    monkeypatch.setattr(rollups, "record_orders", record_and_place_order)
+    with pytest.raises(RuntimeError, match="Orders changed"):
+        rebuild_rollups(db)
+    assert db[ROLLUP_COLLECTION].find_one({"key": "marker"}) is not None
+    assert db[f"{ROLLUP_COLLECTION}_rebuild"].find_one({"key": "backfilled"})["orders"] == 2
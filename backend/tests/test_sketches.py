@@ -0,0 +1,50 @@
+import random
+from collections import Counter
+
+from sketches import CountMinSketch, HyperLogLog
+
+def _zipf_stream(keys, length, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return rng.choices([f"item{i}" for i in range(keys)], weights=weights, k=length)
+
+def test_count_min_never_undercounts_and_stays_within_bound():
+    stream = _zipf_stream(5000, 100000)
+    exact = Counter(stream)
+    cms = CountMinSketch(width=2048)
+    for key in stream:
+        cms.add(key)
+
+    bound = cms.error_bound()
+    overcounts = [cms.estimate(key) - count for key, count in exact.items()]
+    assert min(overcounts) >= 0
+    # Each estimate is within the bound with probability 1 - e^-depth
+    within = sum(overcount <= bound for overcount in overcounts) / len(overcounts)
+    assert within >= cms.confidence
+
+def test_count_min_merge_and_round_trip_match_one_sketch():
+    stream = _zipf_stream(500, 20000)
+    whole, first, second = CountMinSketch(), CountMinSketch(), CountMinSketch()
+    for position, key in enumerate(stream):
+        whole.add(key)
+        (first if position % 2 else second).add(key)
+    merged = CountMinSketch.from_doc(first.to_doc(), first.total).merge(second)
+
+    assert merged.total == whole.total == len(stream)
+    assert all(merged.estimate(key) == whole.estimate(key) for key in set(stream))
+
+def test_hyperloglog_within_relative_error():
+    for distinct in (100, 5000, 200000):
+        hll = HyperLogLog()
+        for i in range(distinct):
+            hll.add(f"order{i}")
+        assert abs(hll.count() - distinct) <= 3 * hll.relative_error * distinct
+
+def test_hyperloglog_merge_and_round_trip_match_one_sketch():
+    whole, first, second = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        whole.add(i)
+        (first if i < 20000 else second).add(i)
+    first.add(5)  # duplicates do not change the count
+    merged = HyperLogLog.from_doc(first.to_doc()).merge(second)
+    assert merged.count() == whole.count()
@@ -0,0 +1,23 @@
+import pytest
+
+import tenants
+from tenants import cli_database
+
+@pytest.fixture
+def patched_client(mongo, monkeypatch):
+    monkeypatch.setattr(tenants, "MongoClient", type(mongo))
+    monkeypatch.delenv("TENANT_URIS", raising=False)
+    monkeypatch.delenv("MONGO_URI", raising=False)
+    monkeypatch.delenv("MONGO_DB", raising=False)
+
+def test_cli_database_defaults_to_mongo_db(patched_client, monkeypatch):
+    assert cli_database().name == "restaurant"
+    monkeypatch.setenv("MONGO_DB", "outlet_main")
+    assert cli_database().name == "outlet_main"
+
+def test_cli_database_resolves_tenant_name_and_uri(patched_client, monkeypatch):
+    monkeypatch.setenv("TENANT_URIS", "downtown=mongodb://localhost:27017/downtown")
+    assert cli_database("downtown").name == "downtown"
+    assert cli_database("mongodb://localhost:27017/airport").name == "airport"
+    with pytest.raises(SystemExit):
+        cli_database("uptown")
@@ -0,0 +1,48 @@
+from pymongo.errors import AutoReconnect
+
+from write_behind import WriteBehindWriter
+
+# Writes the first `partial` documents, then fails the first insert_many
+class FlakyCollection:
+    def __init__(self, collection, partial):
+        self.collection = collection
+        self.partial = partial
+        self.calls = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.calls == 1:
+            self.collection.insert_many(docs[:self.partial], ordered=ordered)
+            raise AutoReconnect("connection closed mid-batch")
+        return self.collection.insert_many(docs, ordered=ordered)
+
+class FlakyDb:
+    def __init__(self, db, partial):
+        self.orders = FlakyCollection(db["food_order"], partial)
+
+    def __getitem__(self, name):
+        return self.orders
+
+def test_retry_counts_partial_write_as_written(db, monkeypatch):
+    monkeypatch.setattr("write_behind.time.sleep", lambda seconds: None)
+    flushed = []
+    writer = WriteBehindWriter(FlakyDb(db, partial=2), on_flush={"food_order": flushed.extend})
+    docs = [{"order_id": i} for i in range(5)]
+    writer._flush([("food_order", doc) for doc in docs])
+
+    assert db["food_order"].count_documents({}) == 5
+    assert [doc["order_id"] for doc in flushed] == [0, 1, 2, 3, 4]
+    stats = writer.stats()
+    assert stats["written"] == 5
+    assert stats["failed"] == 0
+
+def test_duplicates_on_first_attempt_still_fail(db):
+    db["food_order"].insert_one({"_id": 1})
+    flushed = []
+    writer = WriteBehindWriter(db, on_flush={"food_order": flushed.extend})
+    writer._flush([("food_order", {"_id": 1}), ("food_order", {"_id": 2})])
+
+    assert [doc["_id"] for doc in flushed] == [2]
+    stats = writer.stats()
+    assert stats["written"] == 1
+    assert stats["failed"] == 1
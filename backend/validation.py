@@ -0,0 +1,169 @@
+import re
+import logging
+from datetime import datetime
+from rollups import order_datetime
+from pagination import after_field
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Request validation and response shaping shared by the Flask app (app.py) and the
+# asyncio app (asgi_app.py)
+
+# Helper function to validate menu item data
+def validate_menu_item(data):
+    required_fields = ["name", "category", "cuisine", "selling_price", "actual_price"]
+    missing_fields = [field for field in required_fields if field not in data or data[field] is None]
+    if missing_fields:
+        logger.warning("Validation failed for menu item: missing fields %s", missing_fields)
+        return False, f"Missing required fields: {missing_fields}"
+    
+    # Validate field types
+    if not all(isinstance(data[field], str) for field in ["name", "category", "cuisine"]):
+        logger.warning("Validation failed for menu item: name, category, and cuisine must be strings")
+        return False, "Name, category, and cuisine must be strings"
+    
+    # Validate prices
+    try:
+        selling_price = float(data["selling_price"])
+        actual_price = float(data["actual_price"])
+        if selling_price < 0 or actual_price < 0:
+            logger.warning("Validation failed for menu item: prices must be non-negative")
+            return False, "Selling price and actual price must be non-negative numbers"
+    except (ValueError, TypeError) as e:
+        logger.warning("Validation failed for menu item: invalid price format - %s", str(e))
+        return False, "Selling price and actual price must be valid numbers"
+    
+    return True, ""
+
+# Helper function to validate order data
+def validate_order(data):
+    if not isinstance(data.get("items"), list) or not data.get("items"):
+        logger.warning("Validation failed for order: items must be a non-empty list")
+        return False, "Items must be a non-empty list"
+    if not isinstance(data.get("datetime"), str):
+        logger.warning("Validation failed for order: datetime must be a string")
+        return False, "Datetime must be a string"
+    try:
+        datetime.fromisoformat(data["datetime"])
+    except ValueError as e:
+        logger.warning("Validation failed for order: invalid datetime format - %s", e)
+        return False, f"Invalid datetime format: {str(e)}"
+    if not all(isinstance(item, str) for item in data["items"]):
+        logger.warning("Validation failed for order: all items must be strings")
+        return False, "All items must be strings"
+    return True, ""
+
+# Helper function to validate feedback data
+def validate_feedback(data):
+    required_fields = ["name", "email", "feedback"]
+    missing_fields = [field for field in required_fields if field not in data or data[field] is None]
+    if missing_fields:
+        logger.warning("Validation failed for feedback: missing fields %s", missing_fields)
+        return False, f"Missing required fields: {missing_fields}"
+    
+    # Validate field types
+    if not all(isinstance(data[field], str) for field in required_fields):
+        logger.warning("Validation failed for feedback: name, email, and feedback must be strings")
+        return False, "Name, email, and feedback must be strings"
+    
+    # Validate email format
+    email_pattern = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+    if not re.match(email_pattern, data["email"]):
+        logger.warning("Validation failed for feedback: invalid email format")
+        return False, "Invalid email format"
+    
+    return True, ""
+
+# Helper function to parse the optional start/end/cuisine/category filters of /visualize
+def parse_visualize_filters(args):
+    filters = {}
+    for field in ("start", "end"):
+        if args.get(field):
+            try:
+                filters[field] = order_datetime(args[field])
+            except ValueError as e:
+                return None, f"Invalid {field} datetime: {str(e)}"
+    if filters.get("start") and filters.get("end") and filters["start"] >= filters["end"]:
+        return None, "start must be before end"
+    for field in ("cuisine", "category"):
+        if args.get(field):
+            filters[field] = args[field].strip()
+    return filters, ""
+
+# Helper function to shape a feedback document for the API
+def format_feedback(fb):
+    return {
+        "id": str(fb["_id"]),
+        "name": fb["name"],
+        "email": fb["email"],
+        "feedback": fb["feedback"],
+        "created_at": fb["created_at"]
+    }
+
+FEEDBACK_PROJECTION = {"_id": 1, "name": 1, "email": 1, "feedback": 1, "created_at": 1}
+FEEDBACK_SORT = [("created_at", 1), ("_id", 1)]
+FEEDBACK_CURSOR_FIELDS = {"created_at": "created_at", "id": "_id"}
+
+# Helper function to parse the q/email/start/end filters of /api/feedback/search.
+# start/end bound created_at (end is exclusive) and are compared as the stored ISO strings.
+def parse_feedback_search(args):
+    search = {}
+    q = args.get("q", "").strip()
+    if q:
+        if len(q) > 200:
+            return None, "q must be at most 200 characters"
+        search["q"] = q
+    if args.get("email"):
+        search["email"] = args["email"].strip()
+    for field in ("start", "end"):
+        if args.get(field):
+            try:
+                search[field] = order_datetime(args[field]).isoformat()
+            except ValueError as e:
+                return None, f"Invalid {field} datetime: {str(e)}"
+    if search.get("start") and search.get("end") and search["start"] >= search["end"]:
+        return None, "start must be before end"
+    return search, ""
+
+# Aggregation pipeline for one page (limit + 1 documents) of a feedback search. With q,
+# matches come from the feedback text index ranked by relevance and keyed on
+# (score, _id) for the next cursor; otherwise pages follow FEEDBACK_SORT like /api/feedback.
+def feedback_search_pipeline(search, limit, cursor=None):
+    match = {}
+    if search.get("q"):
+        match["$text"] = {"$search": search["q"]}
+    if search.get("email"):
+        match["email"] = search["email"]
+    if search.get("start") or search.get("end"):
+        match["created_at"] = {}
+        if search.get("start"):
+            match["created_at"]["$gte"] = search["start"]
+        if search.get("end"):
+            match["created_at"]["$lt"] = search["end"]
+
+    if not search.get("q"):
+        match.update(after_field("created_at", cursor))
+        return [{"$match": match}, {"$sort": dict(FEEDBACK_SORT)}, {"$limit": limit + 1}, {"$project": FEEDBACK_PROJECTION}]
+
+    pipeline = [{"$match": match}, {"$addFields": {"score": {"$meta": "textScore"}}}]
+    if cursor:
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": cursor["score"]}},
+            {"score": cursor["score"], "_id": {"$gt": cursor["id"]}}
+        ]}})
+    pipeline += [{"$sort": {"score": -1, "_id": 1}}, {"$limit": limit + 1}, {"$project": {**FEEDBACK_PROJECTION, "score": 1}}]
+    return pipeline
+
+# Cursor fields of a feedback search page, matching feedback_search_pipeline's sort
+def feedback_search_cursor_fields(search):
+    if search.get("q"):
+        return {"score": "score", "id": "_id"}
+    return FEEDBACK_CURSOR_FIELDS
+
+# Helper function to shape a feedback search hit, with its relevance when ranked
+def format_feedback_hit(fb):
+    hit = format_feedback(fb)
+    if "score" in fb:
+        hit["score"] = round(fb["score"], 4)
+    return hit
@@ -1,343 +1,845 @@
 import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend
+import io
 import os
+import time
 import logging
-from datetime import datetime
-import matplotlib.pyplot as plt
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from array import array
+from itertools import repeat, compress
+from operator import itemgetter
+from matplotlib.figure import Figure
 import seaborn as sns
+import numpy as np
 import pandas as pd
+from rollups import ROLLUP_COLLECTION, is_backfilled, fetch_rollups, has_sketches, fetch_item_sketches
+from pipelines import run_analytics_pipeline
+from menu_index import MenuIndex
+from chart_cache import chart_key, cached_filename, filter_prefix, prune_versions, SingleFlight
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def generate_graphs(order_collection, menu_collection):
-    try:
-        logger.info("Starting generate_graphs function")
-        # Ensure the graphs directory exists
-        graph_dir = os.path.join(os.getcwd(), "graphs")
-        os.makedirs(graph_dir, exist_ok=True)
-        logger.info(f"Graph directory: {graph_dir}")
-
-        # Fetch data from MongoDB
-        orders = list(order_collection.find())
-        menu_items = list(menu_collection.find())
-        logger.info(f"Fetched {len(orders)} orders and {len(menu_items)} menu items")
-        logger.debug(f"Orders: {orders}")
-        logger.debug(f"Menu items: {menu_items}")
-
-        # If no data, return empty list
-        if not orders or not menu_items:
-            logger.info("No data to generate visualizations")
-            return []
-
-        # Create a menu lookup dictionary for quick access to cuisine, prices
-        menu_lookup = {}
-        for item in menu_items:
-            if "name" not in item or "cuisine" not in item or "selling_price" not in item or "actual_price" not in item:
-                logger.warning(f"Skipping menu item with missing fields: {item}")
-                continue
-            if not isinstance(item["name"], str) or not isinstance(item["cuisine"], str):
-                logger.warning(f"Skipping menu item with invalid name or cuisine type: {item}")
-                continue
-            try:
-                selling_price = float(item["selling_price"])
-                actual_price = float(item["actual_price"])
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Skipping menu item with invalid prices: {item} - {e}")
-                continue
-            menu_lookup[item["name"]] = {
-                "cuisine": item["cuisine"],
-                "selling_price": selling_price,
-                "actual_price": actual_price
-            }
-        logger.info(f"Created menu lookup with {len(menu_lookup)} items")
-
-        # Create a list for order data
-        order_data = []
-        for order in orders:
-            if "datetime" not in order or not isinstance(order["datetime"], str):
-                logger.warning(f"Skipping order with missing or invalid datetime: {order}")
-                continue
-            try:
-                order_datetime = datetime.fromisoformat(order["datetime"])
-            except ValueError as e:
-                logger.warning(f"Skipping order with invalid datetime format: {order['datetime']} - {e}")
-                continue
-
-            for item in order.get("items", []):
-                if not isinstance(item, str):
-                    logger.warning(f"Skipping invalid item (not a string): {item}")
-                    continue
-                if item not in menu_lookup:
-                    logger.warning(f"Skipping item not found in menu: {item}")
-                    continue
-                cuisine = menu_lookup[item]["cuisine"]
-                selling_price = menu_lookup[item]["selling_price"]
-                actual_price = menu_lookup[item]["actual_price"]
-                profit_loss = selling_price - actual_price  # Profit per unit
-
-                # Assign category based on order time
-                # Breakfast: 6:00 AM - 10:59 AM
-                # Lunch: 11:00 AM - 3:59 PM
-                # Dinner: 4:00 PM - 9:59 PM
-                # Other: All other times (e.g., late-night orders)
-                hour = order_datetime.hour
-                if 6 <= hour < 11:
-                    category = "Breakfast"
-                elif 11 <= hour < 16:
-                    category = "Lunch"
-                elif 16 <= hour < 22:
-                    category = "Dinner"
-                else:
-                    category = "Other"
-
-                order_data.append({
-                    "item": item,
-                    "datetime": order_datetime,
-                    "cuisine": cuisine,
-                    "profit_loss": profit_loss,
-                    "selling_price": selling_price,
-                    "category": category
-                })
-
-        # Create DataFrame
-        if not order_data:
-            logger.info("No valid order data to generate visualizations")
-            return []
-
-        df = pd.DataFrame(order_data)
-        logger.info(f"Created DataFrame with {len(df)} rows")
-
-        if df.empty:
-            logger.info("DataFrame is empty, no visualizations to generate")
-            return []
-
-        # Convert 'datetime' to timezone-naive datetime64
-        try:
-            df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce', utc=True).dt.tz_localize(None)
-            invalid_datetimes = df['datetime'].isna().sum()
-            if invalid_datetimes > 0:
-                logger.warning(f"Found {invalid_datetimes} invalid datetime values, dropping them")
-                df = df.dropna(subset=['datetime'])
-                logger.info(f"DataFrame after dropping invalid datetimes: {len(df)} rows")
-            logger.info("Converted 'datetime' column to timezone-naive datetime64")
-        except Exception as e:
-            logger.error(f"Failed to convert datetime column: {e}", exc_info=True)
-            return []
-
-        if df.empty:
-            logger.info("DataFrame is empty after datetime processing, no visualizations to generate")
-            return []
-
-        # List to store graph URLs
-        graph_urls = []
+ANALYTICS_SOURCES = ("rollup", "pipeline", "scan")
+
+# mode=preview draws charts from a random sample of PREVIEW_SAMPLE_SIZE orders scaled up
+# to the whole history, with margins of error at PREVIEW_CONFIDENCE (z = PREVIEW_Z)
+VISUALIZE_MODES = ("exact", "preview")
+PREVIEW_SAMPLE_SIZE = int(os.getenv("PREVIEW_SAMPLE_SIZE", 20000))
+PREVIEW_CONFIDENCE = 0.95
+PREVIEW_Z = 1.96
+
+# Meal category boundaries (see rollups.meal_category): hours below 6 or from 22 are "Other"
+MEAL_CATEGORIES = ["Breakfast", "Lunch", "Dinner", "Other"]
+MEAL_HOUR_BINS = np.array([6, 11, 16, 22])
+MEAL_BIN_CODES = np.array([3, 0, 1, 2, 3])
+
+# Order fields read by the scan; snapshot item ids are not needed
+SCAN_PROJECTION = {"_id": 0, "items": 1, "lines.selling_price": 1, "lines.actual_price": 1, "lines.cuisine": 1, "datetime": 1}
+
+# Build a row-per-item DataFrame by streaming orders from the cursor into typed columns.
+# Prices and cuisines come from each order's price snapshots; orders stored before
+# snapshots are priced from the menu by code and their lines for items no longer on it
+# are dropped. Timestamps are parsed once per order in a single vectorized call.
+# menu_items is a MenuIndex or an iterable of menu documents; item_names, when given,
+# restricts which order lines are counted.
+def build_order_frame(order_collection, menu_items, query=None, batch_size=10000, item_names=None):
+    return frame_from_orders(order_collection.find(query or {}, SCAN_PROJECTION, batch_size=batch_size), menu_items, item_names)
+
+# Same as build_order_frame for any iterable of order documents (e.g. a $sample cursor).
+# order_positions adds an "order" column with each line's position in orders.
+def frame_from_orders(orders, menu_items, item_names=None, order_positions=False):
+    menu = menu_items if isinstance(menu_items, MenuIndex) else MenuIndex.from_items(menu_items)
+    logger.info("Created menu index with %s items", len(menu))
+    name_codes = menu.codes
+    # Menu prices shaped like snapshot lines, by code; code -1 (not on the menu) picks the NaN line
+    menu_lines = [
+        {"selling_price": selling_price, "actual_price": actual_price, "cuisine": menu.cuisines[cuisine_code]}
+        for selling_price, actual_price, cuisine_code in zip(menu.selling_prices.tolist(), menu.actual_prices.tolist(), menu.cuisine_codes.tolist())
+    ]
+    menu_lines.append({"selling_price": np.nan, "actual_price": np.nan, "cuisine": None})
+
+    # Stream only the fields we need from MongoDB, collecting one snapshot per line
+    names = []
+    lines = []
+    line_counts = array("i")
+    timestamps = []
+    unsnapshotted = 0
+    for order in orders:
+        items = order.get("items") or []
+        snapshots = order.get("lines")
+        # Same check as rollups.order_lines, inlined in this loop
+        if type(snapshots) is not list or len(snapshots) != len(items):
+            unsnapshotted += 1
+            snapshots = map(menu_lines.__getitem__, map(name_codes.get, items, repeat(-1, len(items))))
+        names.extend(items)
+        lines.extend(snapshots)
+        line_counts.append(len(items))
+        timestamps.append(order.get("datetime"))
+    logger.info("Streamed %s orders with %s line items", len(timestamps), len(names))
+    if unsnapshotted:
+        logger.info("Priced %s orders without price snapshots from the current menu", unsnapshotted)
+    if not timestamps:
+        return pd.DataFrame()
+
+    # Parse every timestamp in one call and convert to timezone-naive UTC
+    order_times = pd.to_datetime(pd.Series(timestamps, dtype=object), errors="coerce", utc=True, format="ISO8601").dt.tz_localize(None)
+    invalid_datetimes = int(order_times.isna().sum())
+    if invalid_datetimes > 0:
+        logger.warning("Found %s orders with invalid datetime values, dropping them", invalid_datetimes)
+
+    selling = np.fromiter(map(itemgetter("selling_price"), lines), dtype=np.float64, count=len(lines))
+    actual = np.fromiter(map(itemgetter("actual_price"), lines), dtype=np.float64, count=len(lines))
+    cuisines = list(map(itemgetter("cuisine"), lines))
+    counts = np.frombuffer(line_counts, dtype=np.int32)
+    line_times = np.repeat(order_times.to_numpy(), counts)
+    priced = ~np.isnan(selling)
+    unknown_items = int((~priced).sum())
+    if unknown_items > 0:
+        logger.warning("Skipping %s line items not found in menu", unknown_items)
+    item_codes, item_categories = _encode(names, menu.names, priced)
+    cuisine_codes, cuisine_categories = _encode(cuisines, menu.cuisines, priced)
+    keep = priced & ~np.isnat(line_times)
+    if item_names is not None:
+        in_scope = set(item_names)
+        keep &= np.isin(item_codes, [code for code, name in enumerate(item_categories) if name in in_scope])
+    if not keep.any():
+        return pd.DataFrame()
+    item_codes = item_codes[keep]
+    cuisine_codes = cuisine_codes[keep]
+    selling = selling[keep]
+    actual = actual[keep]
+    line_times = line_times[keep]
+    positions = np.repeat(np.arange(len(counts), dtype=np.int32), counts)[keep] if order_positions else None
+
+    # Assign meal category based on order time
+    hours = line_times.astype("datetime64[h]").astype(np.int64) % 24
+    meal_codes = MEAL_BIN_CODES[np.searchsorted(MEAL_HOUR_BINS, hours, side="right")]
+
+    df = pd.DataFrame({
+        "item": pd.Categorical.from_codes(item_codes, categories=item_categories),
+        "datetime": line_times,
+        "cuisine": pd.Categorical.from_codes(cuisine_codes, categories=cuisine_categories),
+        "profit_loss": selling - actual,  # Profit per unit
+        "selling_price": selling,
+        "category": pd.Categorical.from_codes(meal_codes, categories=MEAL_CATEGORIES)
+    })
+    if positions is not None:
+        df["order"] = positions
+    logger.info("Created DataFrame with %s rows", len(df))
+    return df
+
+# Helper function to intern line values to categorical codes. Categories are the menu's
+# values in menu order followed by values of priced lines that are only found in
+# snapshots (e.g. items since deleted).
+def _encode(values, menu_values, priced):
+    categories = list(menu_values)
+    code_of = {value: code for code, value in enumerate(categories)}
+    for value in sorted(set(compress(values, priced)).difference(code_of)):
+        code_of[value] = len(categories)
+        categories.append(value)
+    codes = np.fromiter(map(code_of.get, values, repeat(-1, len(values))), dtype=np.int32, count=len(values))
+    return codes, categories
+
+# Helper function to drop categorical dtypes from an aggregate's labels so charts
+# keep the aggregate's own order and only show observed values
+def _plain_labels(aggregate):
+    aggregate = aggregate.copy()
+    aggregate.index = pd.Index(aggregate.index.astype(object), name=aggregate.index.name)
+    if isinstance(aggregate, pd.DataFrame):
+        aggregate.columns = pd.Index(aggregate.columns.astype(object), name=aggregate.columns.name)
+    return aggregate
+
+# Reduce the row-per-item DataFrame to the series each chart is drawn from
+def compute_aggregates(df):
+    df = df.assign(
+        month=df['datetime'].dt.to_period('M'),
+        hour=df['datetime'].dt.hour.astype(int),
+        weekday=df['datetime'].dt.weekday.astype(int)
+    )
+    aggregates = {
+        "cuisine_counts": df['cuisine'].value_counts(),
+        "monthly_sales": df.groupby('month').size(),
+        "item_counts": df['item'].value_counts(),
+        "hourly_orders": df.groupby('hour').size(),
+        "weekday_orders": df.groupby('weekday').size(),
+        "profit_loss_by_item": df.groupby('item', observed=True)['profit_loss'].sum(),
+        "profit_loss_by_month": df.groupby('month')['profit_loss'].sum(),
+        "category_counts": df['category'].value_counts(),
+        "category_by_month": df.groupby(['month', 'category'], observed=True).size().unstack(fill_value=0)
+    }
+    for name in ("cuisine_counts", "item_counts", "category_counts"):
+        aggregates[name] = aggregates[name][aggregates[name] > 0]
+    aggregates = {name: _plain_labels(aggregate) for name, aggregate in aggregates.items()}
+    for name in ("monthly_sales", "profit_loss_by_month", "category_by_month"):
+        aggregates[name].index = aggregates[name].index.astype(str)
+    aggregates["profit_loss_by_item"] = aggregates["profit_loss_by_item"].sort_index()
+    return aggregates
+
+# Group keys and summed column of every aggregate, for per-order sums in order_squares
+AGGREGATE_KEYS = {
+    "cuisine_counts": (["cuisine"], "lines"),
+    "monthly_sales": (["month"], "lines"),
+    "item_counts": (["item"], "lines"),
+    "hourly_orders": (["hour"], "lines"),
+    "weekday_orders": (["weekday"], "lines"),
+    "profit_loss_by_item": (["item"], "profit_loss"),
+    "profit_loss_by_month": (["month"], "profit_loss"),
+    "category_counts": (["category"], "lines"),
+    "category_by_month": (["month", "category"], "lines")
+}
+
+# Sum over orders of the squared per-order contribution to every aggregate value, from a
+# frame with an "order" column; labelled like compute_aggregates. Orders are the sampling
+# unit in preview mode, so lines of one order are not independent draws.
+def order_squares(df):
+    df = df.assign(
+        month=df['datetime'].dt.to_period('M'),
+        hour=df['datetime'].dt.hour.astype(int),
+        weekday=df['datetime'].dt.weekday.astype(int),
+        lines=1
+    )
+    squares = {}
+    for name, (keys, column) in AGGREGATE_KEYS.items():
+        per_order = df.groupby(["order", *keys], observed=True)[column].sum() ** 2
+        square = per_order.groupby(level=keys, observed=True).sum()
+        if len(keys) > 1:
+            square = square.unstack(fill_value=0)
+        square = _plain_labels(square)
+        if "month" in keys:
+            square.index = square.index.astype(str)
+        squares[name] = square
+    return squares
+
+# Turn the incrementally maintained rollup documents into the same aggregates
+def aggregates_from_rollups(rollup_docs):
+    rollups = pd.DataFrame(rollup_docs, columns=["dimension", "key", "count", "profit_loss"])
+    if rollups.empty:
+        return None
+
+    def series(dimension, column="count"):
+        rows = rollups[rollups["dimension"] == dimension]
+        return pd.Series(rows[column].values, index=rows["key"].values).sort_index()
+
+    def ranked(dimension):
+        return series(dimension).sort_values(ascending=False, kind="stable")
+
+    month_category = rollups[rollups["dimension"] == "month_category"]
+    split_keys = month_category["key"].str.split("|", n=1, expand=True)
+    if split_keys.empty:
+        category_by_month = pd.DataFrame()
+    else:
+        category_by_month = pd.DataFrame({
+            "month": split_keys[0].values,
+            "category": split_keys[1].values,
+            "count": month_category["count"].values
+        }).pivot_table(index="month", columns="category", values="count", aggfunc="sum", fill_value=0)
+
+    return {
+        "cuisine_counts": ranked("cuisine"),
+        "monthly_sales": series("month"),
+        "item_counts": ranked("item"),
+        "hourly_orders": series("hour"),
+        "weekday_orders": series("weekday"),
+        "profit_loss_by_item": series("item", "profit_loss"),
+        "profit_loss_by_month": series("month", "profit_loss"),
+        "category_counts": ranked("category"),
+        "category_by_month": category_by_month
+    }
+
+# Slices of an aggregate that a chart draws, shared by the plot functions and chart_series()
+def top_items(item_counts):
+    return item_counts.head(10)
 
+def most_profitable_items(profit_loss_by_item):
+    return profit_loss_by_item.nlargest(5)
+
+def items_with_losses(profit_loss_by_item):
+    return profit_loss_by_item[profit_loss_by_item < 0].nsmallest(5)  # Top 5 items with losses (most negative)
+
+# Each chart is drawn on its own Figure so charts can render in separate processes.
+# Plot functions return None when there is nothing to draw.
+
+# 1. Cuisine Pie Chart
+def plot_cuisine_pie(cuisine_counts):
+    if cuisine_counts.empty:
+        logger.warning("No cuisine data to plot, skipping Cuisine Pie Chart")
+        return None
+    fig = Figure(figsize=(8, 8))
+    ax = fig.subplots()
+    ax.pie(cuisine_counts, labels=cuisine_counts.index, autopct='%1.1f%%', startangle=140)
+    ax.set_title("Distribution of Orders by Cuisine")
+    return fig
+
+# 2. Monthly Sales Graph
+def plot_monthly_sales(monthly_sales):
+    if monthly_sales.empty:
+        logger.warning("No monthly sales data to plot, skipping Monthly Sales Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=monthly_sales.values, y=monthly_sales.index.astype(str), hue=monthly_sales.index.astype(str), legend=False, ax=ax)
+    ax.set_title("Monthly Sales (Number of Orders)")
+    ax.set_xlabel("Number of Orders")
+    ax.set_ylabel("Month")
+    return fig
+
+# 3. Top Items Graph
+def plot_top_items(item_counts):
+    item_counts = top_items(item_counts)
+    if item_counts.empty:
+        logger.warning("No item data to plot, skipping Top Items Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=item_counts.values, y=item_counts.index, hue=item_counts.index, legend=False, ax=ax)
+    ax.set_title("Top 10 Most Ordered Items")
+    ax.set_xlabel("Number of Orders")
+    ax.set_ylabel("Item")
+    return fig
+
+# 4. Peak Hours Graph
+def plot_peak_hours(hourly_orders):
+    if hourly_orders.empty:
+        logger.warning("No hourly data to plot, skipping Peak Hours Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=hourly_orders.index, y=hourly_orders.values, hue=hourly_orders.index, legend=False, ax=ax)
+    ax.set_title("Orders by Hour of Day (Peak Hours)")
+    ax.set_xlabel("Hour of Day (0-23)")
+    ax.set_ylabel("Number of Orders")
+    ax.tick_params(axis='x', labelrotation=45)
+    return fig
+
+# 5. Profit and Loss by Item
+def plot_profit_loss_by_item(profit_loss_by_item):
+    if profit_loss_by_item.empty:
+        logger.warning("No profit/loss data to plot, skipping Profit and Loss by Item Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=profit_loss_by_item.values, y=profit_loss_by_item.index, hue=profit_loss_by_item.index, palette='RdYlGn', legend=False, ax=ax)
+    ax.set_title("Total Profit/Loss by Item")
+    ax.set_xlabel("Profit/Loss (₹)")
+    ax.set_ylabel("Item")
+    return fig
+
+# 6. Most Profitable Items
+def plot_most_profitable_items(profit_loss_by_item):
+    profit_by_item = most_profitable_items(profit_loss_by_item)
+    if profit_by_item.empty:
+        logger.warning("No profit data to plot, skipping Most Profitable Items Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=profit_by_item.values, y=profit_by_item.index, hue=profit_by_item.index, palette='Greens', legend=False, ax=ax)
+    ax.set_title("Top 5 Most Profitable Items")
+    ax.set_xlabel("Total Profit (₹)")
+    ax.set_ylabel("Item")
+    return fig
+
+# 7. Top Items with Losses
+def plot_loss_by_item(profit_loss_by_item):
+    loss_by_item = items_with_losses(profit_loss_by_item)
+    if loss_by_item.empty:
+        logger.warning("No loss data to plot, skipping Top Items with Losses Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=loss_by_item.values, y=loss_by_item.index, hue=loss_by_item.index, palette='Reds', legend=False, ax=ax)
+    ax.set_title("Top 5 Items with Losses")
+    ax.set_xlabel("Total Loss (₹)")
+    ax.set_ylabel("Item")
+    return fig
+
+# 8. Profit and Loss Over Time
+def plot_profit_loss_over_time(profit_loss_by_month):
+    if profit_loss_by_month.empty:
+        logger.warning("No profit/loss data to plot, skipping Profit and Loss Over Time Graph")
+        return None
+    if profit_loss_by_month.nunique() <= 1:
+        logger.warning("Profit/Loss data has no variation, skipping Profit and Loss Over Time Graph")
+        return None
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    profit_loss_by_month.plot(kind='line', marker='o', color='purple', ax=ax)
+    ax.set_title("Profit/Loss Over Time")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Profit/Loss (₹)")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
+    return fig
+
+# 9. Category Pie Chart
+def plot_category_pie(category_counts):
+    if category_counts.empty:
+        logger.warning("No category data to plot, skipping Category Pie Chart")
+        return None
+    fig = Figure(figsize=(8, 8))
+    ax = fig.subplots()
+    ax.pie(category_counts, labels=category_counts.index, autopct='%1.1f%%', startangle=140)
+    ax.set_title("Distribution of Orders by Category (Breakfast, Lunch, Dinner)")
+    return fig
+
+# 10. Orders by Category Over Time
+def plot_category_over_time(category_by_month):
+    if category_by_month.empty:
+        logger.warning("No category data to plot, skipping Orders by Category Over Time Graph")
+        return None
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    category_by_month.plot(kind='line', marker='o', ax=ax)
+    ax.set_title("Orders by Category Over Time")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Number of Orders")
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend(title="Category")
+    ax.grid(True)
+    return fig
+
+# Chart registry: output file, display name, plot function, aggregate it is drawn from
+CHARTS = [
+    ("cuisine_pie.png", "Cuisine Pie Chart", plot_cuisine_pie, "cuisine_counts"),
+    ("monthly_sales.png", "Monthly Sales Graph", plot_monthly_sales, "monthly_sales"),
+    ("top_items.png", "Top Items Graph", plot_top_items, "item_counts"),
+    ("peak_hours.png", "Peak Hours Graph", plot_peak_hours, "hourly_orders"),
+    ("profit_loss_by_item.png", "Profit and Loss by Item Graph", plot_profit_loss_by_item, "profit_loss_by_item"),
+    ("most_profitable_items.png", "Most Profitable Items Graph", plot_most_profitable_items, "profit_loss_by_item"),
+    ("loss_by_item.png", "Top Items with Losses Graph", plot_loss_by_item, "profit_loss_by_item"),
+    ("profit_loss_over_time.png", "Profit and Loss Over Time Graph", plot_profit_loss_over_time, "profit_loss_by_month"),
+    ("category_pie.png", "Category Pie Chart", plot_category_pie, "category_counts"),
+    ("category_over_time.png", "Orders by Category Over Time Graph", plot_category_over_time, "category_by_month")
+]
+CHARTS_BY_FILE = {filename: (label, plot) for filename, label, plot, _ in CHARTS}
+
+# What the frontend needs to draw each chart itself: chart type, titles and the slice
+# of the aggregate that is drawn ("hbar" puts labels on the y axis)
+CHART_DATA = {
+    "cuisine_pie.png": {"type": "pie", "title": "Distribution of Orders by Cuisine"},
+    "monthly_sales.png": {"type": "hbar", "title": "Monthly Sales (Number of Orders)", "x_label": "Number of Orders", "y_label": "Month"},
+    "top_items.png": {"type": "hbar", "title": "Top 10 Most Ordered Items", "x_label": "Number of Orders", "y_label": "Item", "select": top_items},
+    "peak_hours.png": {"type": "bar", "title": "Orders by Hour of Day (Peak Hours)", "x_label": "Hour of Day (0-23)", "y_label": "Number of Orders"},
+    "profit_loss_by_item.png": {"type": "hbar", "title": "Total Profit/Loss by Item", "x_label": "Profit/Loss (₹)", "y_label": "Item"},
+    "most_profitable_items.png": {"type": "hbar", "title": "Top 5 Most Profitable Items", "x_label": "Total Profit (₹)", "y_label": "Item", "select": most_profitable_items},
+    "loss_by_item.png": {"type": "hbar", "title": "Top 5 Items with Losses", "x_label": "Total Loss (₹)", "y_label": "Item", "select": items_with_losses},
+    "profit_loss_over_time.png": {"type": "line", "title": "Profit/Loss Over Time", "x_label": "Month", "y_label": "Profit/Loss (₹)"},
+    "category_pie.png": {"type": "pie", "title": "Distribution of Orders by Category (Breakfast, Lunch, Dinner)"},
+    "category_over_time.png": {"type": "line", "title": "Orders by Category Over Time", "x_label": "Month", "y_label": "Number of Orders"}
+}
+
+# Image outputs for /visualize: output suffix and savefig dpi (None keeps the figure's dpi)
+IMAGE_FORMATS = {
+    "png": (".png", None),
+    "svg": (".svg", None),
+    "thumb": (".thumb.png", int(os.getenv("THUMBNAIL_DPI", 40)))
+}
+
+# Helper function to turn aggregate values into compact JSON numbers
+def _json_values(values):
+    if np.issubdtype(values.dtype, np.floating):
+        return np.round(values.astype(np.float64), 2).tolist()
+    return values.tolist()
+
+# The series behind every chart as JSON-ready dicts, so clients can draw them without images.
+# Line charts built from a table carry one entry in "series" per column. With margins
+# (preview mode) every values list gets a parallel "margins" list of +/- errors.
+def chart_series(aggregates, margins=None):
+    charts = []
+    for filename, label, _, aggregate in CHARTS:
+        spec = CHART_DATA[filename]
+        data = aggregates[aggregate]
+        if "select" in spec:
+            data = spec["select"](data)
+        if data.empty:
+            continue
+        chart = {"id": os.path.splitext(filename)[0], "label": label, **{key: value for key, value in spec.items() if key != "select"}}
+        chart["labels"] = data.index.tolist()
+        error = None if margins is None else margins[aggregate].reindex_like(data).fillna(0)
+        if isinstance(data, pd.DataFrame):
+            chart["series"] = [{"name": str(column), "values": _json_values(data[column].to_numpy())} for column in data.columns]
+            if error is not None:
+                for series, column in zip(chart["series"], data.columns):
+                    series["margins"] = _json_values(error[column].to_numpy(dtype=np.float64))
+        else:
+            chart["values"] = _json_values(data.to_numpy())
+            if error is not None:
+                chart["margins"] = _json_values(error.to_numpy(dtype=np.float64))
+        charts.append(chart)
+    return charts
+
+# Render a single chart to disk; runs inside a worker process.
+# The file is written under a temporary name and renamed so readers never see a partial image.
+# The image format follows graph_path's extension; dpi=None keeps the figure's own dpi.
+def render_chart(filename, data, graph_path, dpi=None):
+    return render_chart_timed(filename, data, graph_path, dpi)[0]
+
+# Same as render_chart, also returning how long the plot and savefig phases took
+def render_chart_timed(filename, data, graph_path, dpi=None):
+    label, plot = CHARTS_BY_FILE[filename]
+    timings = {}
+    try:
         # Set consistent seaborn style for all plots
-        sns.set_style("whitegrid")
+        with sns.axes_style("whitegrid"):
+            started = time.perf_counter()
+            fig = plot(data)
+            timings["plot"] = time.perf_counter() - started
+            if fig is None:
+                return None, timings
+            tmp_path = f"{graph_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            started = time.perf_counter()
+            fig.savefig(tmp_path, format=os.path.splitext(graph_path)[1][1:], dpi=dpi or "figure", bbox_inches='tight')
+            timings["savefig"] = time.perf_counter() - started
+        os.replace(tmp_path, graph_path)
+        logger.info("Saved graph: %s", graph_path)
+        return os.path.basename(graph_path), timings
+    except Exception as e:
+        logger.error("Error generating %s: %s", label, e, exc_info=True)
+        return None, timings
 
-        # 1. Cuisine Pie Chart
-        try:
-            cuisine_counts = df['cuisine'].value_counts()
-            if cuisine_counts.empty:
-                logger.warning("No cuisine data to plot, skipping Cuisine Pie Chart")
-            else:
-                plt.figure(figsize=(8, 8))
-                plt.pie(cuisine_counts, labels=cuisine_counts.index, autopct='%1.1f%%', startangle=140)
-                plt.title("Distribution of Orders by Cuisine")
-                cuisine_graph_path = os.path.join(graph_dir, "cuisine_pie.png")
-                plt.savefig(cuisine_graph_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {cuisine_graph_path}")
-                graph_urls.append("cuisine_pie.png")
-        except Exception as e:
-            logger.error(f"Error generating Cuisine Pie Chart: {e}", exc_info=True)
-
-        # 2. Monthly Sales Graph
-        try:
-            df['month'] = df['datetime'].dt.to_period('M')
-            monthly_sales = df.groupby('month').size()
-            if monthly_sales.empty:
-                logger.warning("No monthly sales data to plot, skipping Monthly Sales Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                sns.barplot(x=monthly_sales.values, y=monthly_sales.index.astype(str), hue=monthly_sales.index.astype(str), legend=False)
-                plt.title("Monthly Sales (Number of Orders)")
-                plt.xlabel("Number of Orders")
-                plt.ylabel("Month")
-                monthly_sales_graph_path = os.path.join(graph_dir, "monthly_sales.png")
-                plt.savefig(monthly_sales_graph_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {monthly_sales_graph_path}")
-                graph_urls.append("monthly_sales.png")
-        except Exception as e:
-            logger.error(f"Error generating Monthly Sales Graph: {e}", exc_info=True)
-
-        # 3. Top Items Graph
-        try:
-            item_counts = df['item'].value_counts().head(10)
-            if item_counts.empty:
-                logger.warning("No item data to plot, skipping Top Items Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                sns.barplot(x=item_counts.values, y=item_counts.index, hue=item_counts.index, legend=False)
-                plt.title("Top 10 Most Ordered Items")
-                plt.xlabel("Number of Orders")
-                plt.ylabel("Item")
-                top_items_graph_path = os.path.join(graph_dir, "top_items.png")
-                plt.savefig(top_items_graph_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {top_items_graph_path}")
-                graph_urls.append("top_items.png")
-        except Exception as e:
-            logger.error(f"Error generating Top Items Graph: {e}", exc_info=True)
-
-        # 4. Peak Hours Graph
-        try:
-            df['hour'] = df['datetime'].dt.hour.astype(int)  # Ensure hour is numeric
-            hourly_orders = df.groupby('hour').size()
-            if hourly_orders.empty:
-                logger.warning("No hourly data to plot, skipping Peak Hours Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                sns.barplot(x=hourly_orders.index, y=hourly_orders.values, hue=hourly_orders.index, legend=False)
-                plt.title("Orders by Hour of Day (Peak Hours)")
-                plt.xlabel("Hour of Day (0-23)")
-                plt.ylabel("Number of Orders")
-                plt.xticks(rotation=45)
-                peak_hours_graph_path = os.path.join(graph_dir, "peak_hours.png")
-                plt.savefig(peak_hours_graph_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {peak_hours_graph_path}")
-                graph_urls.append("peak_hours.png")
-        except Exception as e:
-            logger.error(f"Error generating Peak Hours Graph: {e}", exc_info=True)
-
-        # 5. Profit and Loss by Item
-        try:
-            profit_loss_by_item = df.groupby('item')['profit_loss'].sum()
-            if profit_loss_by_item.empty:
-                logger.warning("No profit/loss data to plot, skipping Profit and Loss by Item Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                sns.barplot(x=profit_loss_by_item.values, y=profit_loss_by_item.index, hue=profit_loss_by_item.index, palette='RdYlGn', legend=False)
-                plt.title("Total Profit/Loss by Item")
-                plt.xlabel("Profit/Loss (₹)")
-                plt.ylabel("Item")
-                profit_loss_item_path = os.path.join(graph_dir, "profit_loss_by_item.png")
-                plt.savefig(profit_loss_item_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {profit_loss_item_path}")
-                graph_urls.append("profit_loss_by_item.png")
-        except Exception as e:
-            logger.error(f"Error generating Profit and Loss by Item Graph: {e}", exc_info=True)
-
-        # 6. Most Profitable Items
-        try:
-            profit_by_item = df.groupby('item')['profit_loss'].sum().nlargest(5)
-            if profit_by_item.empty:
-                logger.warning("No profit data to plot, skipping Most Profitable Items Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                sns.barplot(x=profit_by_item.values, y=profit_by_item.index, hue=profit_by_item.index, palette='Greens', legend=False)
-                plt.title("Top 5 Most Profitable Items")
-                plt.xlabel("Total Profit (₹)")
-                plt.ylabel("Item")
-                most_profitable_path = os.path.join(graph_dir, "most_profitable_items.png")
-                plt.savefig(most_profitable_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {most_profitable_path}")
-                graph_urls.append("most_profitable_items.png")
-        except Exception as e:
-            logger.error(f"Error generating Most Profitable Items Graph: {e}", exc_info=True)
-
-        # 7. Top Items with Losses
-        try:
-            loss_by_item = df.groupby('item')['profit_loss'].sum()
-            loss_by_item = loss_by_item[loss_by_item < 0].nsmallest(5, key=abs)  # Top 5 items with losses (most negative)
-            if loss_by_item.empty:
-                logger.warning("No loss data to plot, skipping Top Items with Losses Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                sns.barplot(x=loss_by_item.values, y=loss_by_item.index, hue=loss_by_item.index, palette='Reds', legend=False)
-                plt.title("Top 5 Items with Losses")
-                plt.xlabel("Total Loss (₹)")
-                plt.ylabel("Item")
-                loss_item_path = os.path.join(graph_dir, "loss_by_item.png")
-                plt.savefig(loss_item_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {loss_item_path}")
-                graph_urls.append("loss_by_item.png")
-        except Exception as e:
-            logger.error(f"Error generating Top Items with Losses Graph: {e}", exc_info=True)
-
-        # 8. Profit and Loss Over Time
-        try:
-            profit_loss_by_month = df.groupby('month')['profit_loss'].sum()
-            if profit_loss_by_month.empty:
-                logger.warning("No profit/loss data to plot, skipping Profit and Loss Over Time Graph")
-            elif profit_loss_by_month.nunique() <= 1:
-                logger.warning("Profit/Loss data has no variation, skipping Profit and Loss Over Time Graph")
-            else:
-                plt.figure(figsize=(10, 6))
-                profit_loss_by_month.plot(kind='line', marker='o', color='purple')
-                plt.title("Profit/Loss Over Time")
-                plt.xlabel("Month")
-                plt.ylabel("Profit/Loss (₹)")
-                plt.xticks(rotation=45)
-                plt.grid(True)
-                profit_loss_time_path = os.path.join(graph_dir, "profit_loss_over_time.png")
-                plt.savefig(profit_loss_time_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {profit_loss_time_path}")
-                graph_urls.append("profit_loss_over_time.png")
-        except Exception as e:
-            logger.error(f"Error generating Profit and Loss Over Time Graph: {e}", exc_info=True)
-
-        # 9. Category Pie Chart
-        try:
-            category_counts = df['category'].value_counts()
-            if category_counts.empty:
-                logger.warning("No category data to plot, skipping Category Pie Chart")
+# Helper function to read the number of chart worker processes from the environment
+def graph_workers_from_env():
+    return max(1, int(os.getenv("GRAPH_WORKERS", os.cpu_count() or 1)))
+
+_render_pool = None
+_render_pool_workers = 0
+_render_pool_lock = threading.Lock()
+_render_flights = SingleFlight()
+
+# Lazily start a persistent pool so the plotting stack is imported once per worker.
+# Workers are spawned rather than forked because the server process is multi-threaded.
+# With a single worker charts render on one background thread instead.
+def get_render_pool(workers):
+    global _render_pool, _render_pool_workers
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_workers != workers:
+            if _render_pool is not None:
+                _render_pool.shutdown(wait=False)
+            if workers <= 1:
+                _render_pool = ThreadPoolExecutor(max_workers=1)
             else:
-                plt.figure(figsize=(8, 8))
-                plt.pie(category_counts, labels=category_counts.index, autopct='%1.1f%%', startangle=140)
-                plt.title("Distribution of Orders by Category (Breakfast, Lunch, Dinner)")
-                category_graph_path = os.path.join(graph_dir, "category_pie.png")
-                plt.savefig(category_graph_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {category_graph_path}")
-                graph_urls.append("category_pie.png")
-        except Exception as e:
-            logger.error(f"Error generating Category Pie Chart: {e}", exc_info=True)
-
-        # 10. Orders by Category Over Time
-        try:
-            category_by_month = df.groupby(['month', 'category']).size().unstack(fill_value=0)
-            if category_by_month.empty:
-                logger.warning("No category data to plot, skipping Orders by Category Over Time Graph")
+                _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _render_pool_workers = workers
+            logger.info("Started chart render pool with %s workers", workers)
+        return _render_pool
+
+# Draw and encode a throwaway figure so fonts, the text layout engine and the PNG
+# writer are loaded before the first real chart
+def _warm_up_renderer():
+    with sns.axes_style("whitegrid"):
+        fig = Figure(figsize=(2, 2))
+        ax = fig.subplots()
+        ax.bar(["a", "b"], [1, 2])
+        ax.set_title("warm-up")
+        fig.savefig(io.BytesIO(), format="png", bbox_inches="tight")
+    return os.getpid()
+
+# Load the plotting stack and start the chart workers ahead of the first /visualize request
+def warm_up(workers=None):
+    _warm_up_renderer()
+    workers = min(workers or graph_workers_from_env(), len(CHARTS))
+    pool = get_render_pool(workers)
+    if workers > 1:
+        # Each spawned worker imports this module and renders once
+        pids = {future.result() for future in [pool.submit(_warm_up_renderer) for _ in range(workers)]}
+        logger.info("Warmed up %s chart workers", len(pids))
+
+# Submit one chart render; its timings are recorded once even if requests share the render
+def _start_render(pool, filename, data, graph_path, dpi):
+    future = pool.submit(render_chart_timed, filename, data, graph_path, dpi)
+    if metrics.METRICS_ENABLED:
+        def observe(done):
+            if done.exception() is None:
+                metrics.observe_chart(filename, done.result()[1])
+        future.add_done_callback(observe)
+    return future
+
+# Render every chart from precomputed aggregates and return the saved file names.
+# Charts are cached under a key derived from their input aggregate, so only charts
+# whose data changed are re-rendered, and concurrent requests share one render.
+# Only the small aggregate each chart needs is sent to its worker.
+# image_format is a key of IMAGE_FORMATS; it is part of the cache key and the file name.
+# name_prefix keeps charts of different scopes (e.g. outlets) apart when old versions are pruned.
+def render_graphs(aggregates, graph_dir, workers=None, image_format="png", name_prefix=""):
+    workers = workers or graph_workers_from_env()
+    pool = get_render_pool(min(workers, len(CHARTS)))
+    keep = int(os.getenv("GRAPH_CACHE_KEEP", 3))
+    suffix, dpi = IMAGE_FORMATS[image_format]
+    # PNGs keep their original keys so existing cached files stay valid
+    params = None if image_format == "png" else {"format": image_format, "dpi": dpi}
+
+    results = []
+    for filename, _, _, aggregate in CHARTS:
+        data = aggregates[aggregate]
+        output_name = name_prefix + os.path.splitext(filename)[0] + suffix
+        output = cached_filename(output_name, chart_key(filename, data, params))
+        graph_path = os.path.join(graph_dir, output)
+        cached = os.path.exists(graph_path)
+        if metrics.METRICS_ENABLED:
+            metrics.CHART_CACHE.inc(("hit" if cached else "miss",))
+        if cached:
+            logger.info("Using cached graph: %s", graph_path)
+            results.append((filename, output_name, None, output))
+            continue
+        future = _render_flights.submit(graph_path, lambda: _start_render(pool, filename, data, graph_path, dpi))
+        results.append((filename, output_name, future, None))
+
+    graph_urls = []
+    for filename, output_name, future, output in results:
+        if future is not None:
+            output, timings = future.result()
+            if metrics.METRICS_ENABLED:
+                metrics.record_chart_timings(filename, timings)
+            if output:
+                prune_versions(graph_dir, output_name, keep)
+        if output:
+            graph_urls.append(output)
+    return graph_urls
+
+# Translate /visualize filters into an index-backed order query and the menu items in scope.
+# start/end bound food_order.datetime (end is exclusive); cuisine and category select
+# menu items, and only order lines for those items are counted.
+def resolve_filters(menu_collection, filters=None):
+    filters = filters or {}
+    query = {}
+    if filters.get("start") or filters.get("end"):
+        query["datetime"] = {}
+        if filters.get("start"):
+            query["datetime"]["$gte"] = filters["start"]
+        if filters.get("end"):
+            query["datetime"]["$lt"] = filters["end"]
+
+    menu_query = {field: filters[field] for field in ("cuisine", "category") if filters.get(field)}
+    menu_items = list(menu_collection.find(menu_query))
+    item_names = None
+    if menu_query:
+        item_names = [item["name"] for item in menu_items if "name" in item]
+        query["items"] = {"$in": item_names}
+    return query, menu_items, item_names
+
+# Compute aggregates with a full scan of the matching orders and menu items
+def load_scan_aggregates(order_collection, menu_collection, filters=None):
+    with metrics.stage("fetch_menu"):
+        query, menu_items, item_names = resolve_filters(menu_collection, filters)
+    logger.info("Fetched %s menu items", len(menu_items))
+
+    try:
+        with metrics.stage("build_frame"):
+            df = build_order_frame(order_collection, menu_items, query, item_names=item_names)
+    except Exception as e:
+        logger.error("Failed to build order DataFrame: %s", e, exc_info=True)
+        return None
+
+    # If no data, return nothing
+    if df.empty:
+        logger.info("No data to generate visualizations")
+        return None
+    with metrics.stage("compute_aggregates"):
+        return compute_aggregates(df)
+
+# Read aggregates from the incrementally maintained rollup collection
+def load_rollup_aggregates(rollup_collection):
+    with metrics.stage("fetch_rollups"):
+        rollup_docs = fetch_rollups(rollup_collection)
+    logger.info("Fetched %s rollup documents", len(rollup_docs))
+    with metrics.stage("aggregates_from_rows"):
+        return aggregates_from_rollups(rollup_docs)
+
+# Compute aggregates with an aggregation pipeline so only grouped rows leave MongoDB
+def load_pipeline_aggregates(order_collection, menu_collection, filters=None):
+    with metrics.stage("fetch_menu"):
+        query, _, item_names = resolve_filters(menu_collection, filters)
+    with metrics.stage("run_pipeline"):
+        grouped = run_analytics_pipeline(order_collection, menu_collection.name, query, item_names)
+    with metrics.stage("aggregates_from_rows"):
+        return aggregates_from_rollups(grouped)
+
+# Compute chart aggregates from the requested source: "rollup", "pipeline" or "scan".
+# Rollups cover all history, so filtered requests are answered by the pipeline instead.
+def load_aggregates(order_collection, menu_collection, rollup_collection=None, source="rollup", filters=None):
+    if source not in ANALYTICS_SOURCES:
+        raise ValueError(f"Unknown analytics source: {source}")
+    if source == "rollup" and filters:
+        logger.info("Filters requested, using the aggregation pipeline instead of rollups")
+        source = "pipeline"
+    if source == "rollup":
+        if rollup_collection is not None and is_backfilled(rollup_collection):
+            return load_rollup_aggregates(rollup_collection)
+        logger.warning("Order rollups have not been backfilled, run `python rollups.py rebuild`; falling back to a full scan")
+    elif source == "pipeline":
+        return load_pipeline_aggregates(order_collection, menu_collection, filters)
+    return load_scan_aggregates(order_collection, menu_collection, filters)
+
+# Month sketch bounds ("YYYY-MM" or None) for a start/end range, or None when a bound
+# falls inside a month and the month sketches cannot answer it
+def _sketch_months(filters):
+    bounds = []
+    for field in ("start", "end"):
+        value = filters.get(field)
+        if value is not None and value != value.replace(day=1, hour=0, minute=0, second=0, microsecond=0):
+            return None
+        bounds.append(value.strftime("%Y-%m") if value is not None else None)
+    return bounds
+
+# Item counts from the month count-min sketches for the candidate item names, with the
+# sketch's one-sided overcount bound as the margin of every estimate
+def _sketch_item_counts(cms, names):
+    estimates = {name: cms.estimate(name) for name in names}
+    item_counts = pd.Series({name: count for name, count in sorted(estimates.items()) if count > 0}, dtype=np.int64)
+    item_counts = item_counts.sort_values(ascending=False, kind="stable")
+    return item_counts, pd.Series(cms.error_bound(), index=item_counts.index)
+
+# Approximate aggregates for mode=preview. Orders are drawn with $sample before the
+# filters are applied, so every order has the same chance f = sampled / total_orders of
+# being drawn and counts and sums are scaled by 1 / f. Their 95% margins are
+# z / f * sqrt((1 - f) * sum(y ** 2)) over sampled orders, y being an order's own
+# contribution to the value (see order_squares). When the month item
+# sketches cover the range, top items come from the count-min sketch and the number of
+# distinct items sold from HyperLogLog instead of the sample.
+# Returns (aggregates, margins, preview info); aggregates is None without data.
+def load_preview_aggregates(order_collection, menu_collection, rollup_collection=None, filters=None, sample_size=None):
+    filters = filters or {}
+    sample_size = sample_size or PREVIEW_SAMPLE_SIZE
+    with metrics.stage("fetch_menu"):
+        query, menu_items, item_names = resolve_filters(menu_collection, filters)
+    total_orders = order_collection.estimated_document_count()
+    drawn = min(sample_size, total_orders)
+    preview = {
+        "sample_size": drawn,
+        "sampled_orders": 0,
+        "total_orders": total_orders,
+        "confidence": PREVIEW_CONFIDENCE,
+        "top_items": "sample",
+        "sketch": None
+    }
+    if not drawn:
+        return None, None, preview
+
+    pipeline = [{"$sample": {"size": drawn}}]
+    if query:
+        pipeline.append({"$match": query})
+    pipeline.append({"$project": SCAN_PROJECTION})
+    with metrics.stage("sample_orders"):
+        orders = list(order_collection.aggregate(pipeline))
+    preview["sampled_orders"] = len(orders)
+    with metrics.stage("build_frame"):
+        df = frame_from_orders(orders, menu_items, item_names, order_positions=True)
+    if df.empty:
+        logger.info("No sampled orders matched the preview filters")
+        return None, None, preview
+
+    fraction = drawn / total_orders
+    with metrics.stage("compute_aggregates"):
+        sampled = compute_aggregates(df)
+        squares = order_squares(df)
+    aggregates, margins = {}, {}
+    for name, aggregate in sampled.items():
+        scaled = aggregate / fraction
+        if name.startswith("profit_loss"):
+            aggregates[name] = scaled
+        else:
+            aggregates[name] = np.rint(scaled).astype(np.int64)
+        margins[name] = PREVIEW_Z / fraction * np.sqrt((1 - fraction) * squares[name].astype(np.float64))
+
+    bounds = _sketch_months(filters)
+    if rollup_collection is not None and bounds is not None and has_sketches(rollup_collection):
+        with metrics.stage("fetch_sketches"):
+            cms, hll, months = fetch_item_sketches(rollup_collection, *bounds)
+        if months:
+            names = item_names if item_names is not None else sorted({item["name"] for item in menu_items if "name" in item} | set(sampled["item_counts"].index))
+            aggregates["item_counts"], margins["item_counts"] = _sketch_item_counts(cms, names)
+            preview["top_items"] = "sketch"
+            preview["sketch"] = {"months": months, "lines": cms.total, "top_items_error": round(cms.error_bound(), 2)}
+            if item_names is None:
+                preview["sketch"]["distinct_items"] = {"estimate": round(hll.count()), "relative_error": round(hll.relative_error, 4)}
+    return aggregates, margins, preview
+
+# Chart series with margins of error and the preview info for mode=preview
+def generate_preview_data(order_collection, menu_collection, rollup_collection=None, filters=None, sample_size=None):
+    aggregates, margins, preview = load_preview_aggregates(order_collection, menu_collection, rollup_collection, filters, sample_size)
+    if aggregates is None:
+        return [], preview
+    with metrics.stage("chart_series"):
+        return chart_series(aggregates, margins), preview
+
+# Grouped rows shaped like rollup documents for one outlet's database: its rollups when
+# they are backfilled and no filters apply, otherwise the aggregation pipeline
+def load_tenant_rows(db, source="rollup", filters=None):
+    rollup_collection = db[ROLLUP_COLLECTION]
+    if source == "rollup" and not filters and is_backfilled(rollup_collection):
+        return fetch_rollups(rollup_collection)
+    query, _, item_names = resolve_filters(db["restaurant_menu"], filters)
+    return run_analytics_pipeline(db["food_order"], "restaurant_menu", query, item_names)
+
+# Sum grouped rows from several outlets by (dimension, key)
+def merge_rollup_rows(row_lists):
+    merged = {}
+    for rows in row_lists:
+        for row in rows:
+            entry = merged.get((row["dimension"], row["key"]))
+            if entry is None:
+                merged[(row["dimension"], row["key"])] = dict(row)
             else:
-                plt.figure(figsize=(12, 6))
-                category_by_month.plot(kind='line', marker='o')
-                plt.title("Orders by Category Over Time")
-                plt.xlabel("Month")
-                plt.ylabel("Number of Orders")
-                plt.xticks(rotation=45)
-                plt.legend(title="Category")
-                plt.grid(True)
-                category_time_path = os.path.join(graph_dir, "category_over_time.png")
-                plt.savefig(category_time_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Saved graph: {category_time_path}")
-                graph_urls.append("category_over_time.png")
-        except Exception as e:
-            logger.error(f"Error generating Orders by Category Over Time Graph: {e}", exc_info=True)
-
-        if not graph_urls:
-            logger.warning("No graphs were generated due to lack of data")
-            return []
-
-        logger.info(f"Generated {len(graph_urls)} visualizations: {graph_urls}")
-        return graph_urls
+                entry["count"] += row["count"]
+                entry["profit_loss"] += row["profit_loss"]
+    return list(merged.values())
+
+# Chain-wide aggregates: every outlet is grouped inside its own MongoDB in parallel and
+# only the grouped rows are merged here, so outlets on separate mongod instances are
+# aggregated on their own cores. Scans are not mergeable and use the pipeline instead.
+def load_chain_aggregates(databases, source="rollup", filters=None, workers=None):
+    if source not in ANALYTICS_SOURCES:
+        raise ValueError(f"Unknown analytics source: {source}")
+    if source == "scan":
+        logger.info("Chain-wide analytics use the aggregation pipeline instead of a full scan")
+        source = "pipeline"
+    names = list(databases)
+    with metrics.stage("fetch_tenants"):
+        with ThreadPoolExecutor(max_workers=max(1, min(workers or len(names), len(names)))) as pool:
+            row_lists = list(pool.map(lambda name: load_tenant_rows(databases[name], source, filters), names))
+    for name, rows in zip(names, row_lists):
+        logger.info("Fetched %s grouped rows for tenant %s", len(rows), name)
+    with metrics.stage("merge_tenants"):
+        merged = merge_rollup_rows(row_lists)
+    with metrics.stage("aggregates_from_rows"):
+        return aggregates_from_rollups(merged)
+
+# Aggregates behind every chart as JSON-ready series, without rendering anything
+def generate_chart_data(order_collection, menu_collection, rollup_collection=None, source="rollup", filters=None):
+    return chart_data_from_aggregates(load_aggregates(order_collection, menu_collection, rollup_collection, source, filters))
+
+def chart_data_from_aggregates(aggregates):
+    if aggregates is None:
+        return []
+    with metrics.stage("chart_series"):
+        return chart_series(aggregates)
+
+def generate_graphs(order_collection, menu_collection, rollup_collection=None, source="rollup", filters=None, image_format="png", name_prefix=""):
+    try:
+        logger.info("Starting generate_graphs function with source: %s", source)
+        aggregates = load_aggregates(order_collection, menu_collection, rollup_collection, source, filters)
+        return graphs_from_aggregates(aggregates, image_format, name_prefix + filter_prefix(filters))
     except Exception as e:
-        logger.error(f"Error in generate_graphs: {e}", exc_info=True)
+        logger.error("Error in generate_graphs: %s", e, exc_info=True)
         raise
+
+# Render precomputed aggregates (e.g. from load_chain_aggregates) into the graph directory
+def graphs_from_aggregates(aggregates, image_format="png", name_prefix=""):
+    if aggregates is None:
+        return []
+    # Ensure the graphs directory exists
+    graph_dir = os.path.join(os.getcwd(), "graphs")
+    os.makedirs(graph_dir, exist_ok=True)
+    logger.info("Graph directory: %s", graph_dir)
+
+    with metrics.stage("render"):
+        graph_urls = render_graphs(aggregates, graph_dir, image_format=image_format, name_prefix=name_prefix)
+    if not graph_urls:
+        logger.warning("No graphs were generated due to lack of data")
+        return []
+
+    logger.info("Generated %s visualizations: %s", len(graph_urls), graph_urls)
+    return graph_urls
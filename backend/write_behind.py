@@ -0,0 +1,171 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from pymongo.errors import BulkWriteError, PyMongoError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+DUPLICATE_KEY = 11000
+
+# Bounded in-process queue of documents written to MongoDB in batches by a
+# background thread. submit() never blocks for long: when the queue stays full
+# for put_timeout seconds the caller is told to back off. Documents accepted
+# into the queue are lost if the process is killed before they are flushed.
+class WriteBehindWriter:
+    def __init__(self, db, max_queue=10000, batch_size=500, flush_interval=0.5, put_timeout=0.05, retries=3, on_flush=None):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.on_flush = on_flush or {}  # collection name -> callback(list of written docs)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "written": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            logger.info("Write-behind writer started (queue size %s, batch size %s)", self._queue.maxsize, self.batch_size)
+        return self
+
+    # Queue a document for insertion; returns False when the queue is full
+    def submit(self, collection_name, doc):
+        try:
+            self._queue.put((collection_name, doc), timeout=self.put_timeout)
+        except queue.Full:
+            self._bump("rejected")
+            return False
+        self._bump("enqueued")
+        return True
+
+    # Flush everything still queued and stop the background thread
+    def stop(self, timeout=30):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Write-behind writer did not drain within %ss, %s documents left", timeout, self._queue.qsize())
+        else:
+            logger.info("Write-behind writer drained and stopped")
+        self._thread = None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        stats["avg_flush_ms"] = stats.pop("total_flush_ms") / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+            if entry is _STOP:
+                self._drain_into(batch)
+                self._flush(batch)
+                return
+            if entry is not None:
+                batch.append(entry)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _drain_into(self, batch):
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not _STOP:
+                batch.append(entry)
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        by_collection = defaultdict(list)
+        for collection_name, doc in batch:
+            by_collection[collection_name].append(doc)
+        for collection_name, docs in by_collection.items():
+            written = self._insert(collection_name, docs)
+            callback = self.on_flush.get(collection_name)
+            if callback and written:
+                try:
+                    callback(written)
+                except Exception as e:
+                    logger.error("Write-behind flush callback failed for %s: %s", collection_name, e, exc_info=True)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+
+    # Insert with retries on transient errors; returns the documents that were written
+    def _insert(self, collection_name, docs):
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.db[collection_name].insert_many(docs, ordered=False)
+                self._bump("written", len(docs))
+                return docs
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                # On a retry, duplicate keys are documents the failed attempt already wrote
+                if attempt > 1:
+                    errors = [error for error in errors if error.get("code") != DUPLICATE_KEY]
+                failed = {error["index"] for error in errors}
+                written = [doc for i, doc in enumerate(docs) if i not in failed]
+                self._bump("written", len(written))
+                if failed:
+                    self._bump("failed", len(failed))
+                    logger.error("Write-behind insert into %s rejected %s documents", collection_name, len(failed))
+                return written
+            except PyMongoError as e:
+                logger.warning("Write-behind insert into %s failed (attempt %s/%s): %s", collection_name, attempt, self.retries, e)
+                time.sleep(min(2 ** attempt * 0.1, 2))
+        self._bump("failed", len(docs))
+        logger.error("Dropped %s documents for %s after %s attempts", len(docs), collection_name, self.retries)
+        return []
+
+# Helper function to build a writer from WRITE_BEHIND_* environment variables
+def write_behind_from_env(db, on_flush=None):
+    return WriteBehindWriter(
+        db,
+        max_queue=int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", 10000)),
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500)),
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5)),
+        on_flush=on_flush
+    )